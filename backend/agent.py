@@ -1,71 +1,124 @@
 """Agent 模块 - 多轮工具调用循环"""
 import json
-from openai import OpenAI
+import queue
+import threading
+import time
 
+from cancel import CancelToken
+from llm import LLMRouter
 from mcp_tools import MCPToolManager
+from tool_router import ToolRouter
+from tool_results import ToolResultStore, READ_TOOL_NAME, READ_TOOL_SCHEMA
 
 MAX_TOOL_ROUNDS = 10  # 最大工具调用轮数
 
 
 class Agent:
-    def __init__(self, client: OpenAI, tool_manager: MCPToolManager):
-        self.client = client
+    def __init__(self, llm: LLMRouter, tool_manager: MCPToolManager, tool_router: ToolRouter = None,
+                 tool_results: ToolResultStore = None):
+        self.llm = llm
         self.tool_manager = tool_manager
+        self.tool_router = tool_router
+        self.tool_results = tool_results
     
-    def run(self, model: str, messages: list, max_tokens: int = 200) -> str:
+    def _select_tools(self, messages: list, session_id: str):
+        """返回 (完整工具集, 本轮发送的工具子集)"""
+        all_tools = self.tool_manager.get_openai_tools()
+        if self.tool_router is None:
+            return all_tools, all_tools
+        return all_tools, self.tool_router.select(all_tools, messages, session_id)
+    
+    def _next_round_tools(self, tools, all_tools, message, called: list):
+        """记录本轮调用的工具，并确定下一轮发送的工具集"""
+        names = [tc.function.name for tc in message.tool_calls]
+        called.extend(names)
+        if self.tool_router is None:
+            return tools
+        return self.tool_router.expand(tools, all_tools, names)
+    
+    @staticmethod
+    def _with_reader(tools: list | None) -> list | None:
+        """有结果被截断后，后续轮次附带 read_tool_result 工具"""
+        if not tools or any(t["function"]["name"] == READ_TOOL_NAME for t in tools):
+            return tools
+        return [*tools, READ_TOOL_SCHEMA]
+    
+    def _finish_turn(self, session_id: str, called: list):
+        if self.tool_router is not None:
+            self.tool_router.record(session_id, called)
+    
+    def run(self, messages: list, endpoint: str = "/chat", session_id: str = "default") -> str:
         """
         Agent 循环：AI 自主决定调用哪些工具、调用顺序，直到生成最终回复
+        
+        工具轮使用 router 模型；最终回复使用 reply 模型，两者相同时直接沿用工具轮的回复
         """
-        tools = self.tool_manager.get_openai_tools()
+        all_tools, tools = self._select_tools(messages, session_id)
+        usage_tags = {"endpoint": endpoint, "session_id": session_id}
+        called = []
         round_count = 0
+        truncated = False
         
-        while round_count < MAX_TOOL_ROUNDS:
+        # 没有需要发送的工具时不进入工具轮
+        while tools and round_count < MAX_TOOL_ROUNDS:
             round_count += 1
             
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                tools=tools,
-            )
-            
+            response = self.llm.complete("router", messages, tools, usage_tags)
             message = response.choices[0].message
             
             # 如果没有工具调用，返回最终回复
             if not message.tool_calls:
-                return message.content or ""
+                self._finish_turn(session_id, called)
+                if self.llm.model_for("router") == self.llm.model_for("reply"):
+                    return message.content or ""
+                break
             
             # 执行工具调用
             print(f"[Agent 第{round_count}轮] 调用 {len(message.tool_calls)} 个工具")
-            self._process_tool_calls(messages, message)
+            tools = self._next_round_tools(tools, all_tools, message, called)
+            truncated = self._process_tool_calls(messages, message) or truncated
+            if truncated:
+                tools = self._with_reader(tools)
+        else:
+            self._finish_turn(session_id, called)
+            if round_count >= MAX_TOOL_ROUNDS:
+                # 超过最大轮数，强制生成回复
+                print(f"[Agent] 达到最大轮数 {MAX_TOOL_ROUNDS}，强制生成回复")
         
-        # 超过最大轮数，强制生成回复
-        print(f"[Agent] 达到最大轮数 {MAX_TOOL_ROUNDS}，强制生成回复")
-        response = self.client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=max_tokens,
-        )
+        response = self.llm.complete("reply", messages, usage_tags=usage_tags)
         return response.choices[0].message.content or ""
     
-    def run_until_ready_for_stream(self, model: str, messages: list, max_tokens: int = 200):
+    def run_until_ready_for_stream(self, messages: list, endpoint: str = "/chat/stream",
+                                   session_id: str = "default"):
         """
         执行工具调用直到准备好流式输出，返回 (messages, tool_called)
         """
-        tools = self.tool_manager.get_openai_tools()
+        events = self.iter_until_ready_for_stream(messages, endpoint, session_id)
+        while True:
+            try:
+                next(events)
+            except StopIteration as stop:
+                return stop.value
+    
+    def iter_until_ready_for_stream(self, messages: list, endpoint: str = "/chat/stream",
+                                    session_id: str = "default", cancel: CancelToken | None = None):
+        """
+        同 run_until_ready_for_stream，但在每轮开始、工具调用前后产出进度事件，
+        生成器结束时返回 (messages, tool_called)；取消时抛出 ChatCancelled
+        """
+        all_tools, tools = self._select_tools(messages, session_id)
+        usage_tags = {"endpoint": endpoint, "session_id": session_id}
+        called = []
         round_count = 0
         tool_called = False
+        truncated = False
         
-        while round_count < MAX_TOOL_ROUNDS:
+        # 没有需要发送的工具时直接进入流式回复
+        while tools and round_count < MAX_TOOL_ROUNDS:
             round_count += 1
+            yield {"type": "round_start", "round": round_count}
             
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                tools=tools,
-            )
-            
+            response = self.llm.complete("router", messages, tools, usage_tags, cancel)
             message = response.choices[0].message
             
             if not message.tool_calls:
@@ -73,12 +126,68 @@ class Agent:
             
             tool_called = True
             print(f"[Agent 第{round_count}轮] 调用 {len(message.tool_calls)} 个工具")
-            self._process_tool_calls(messages, message)
+            tools = self._next_round_tools(tools, all_tools, message, called)
+            truncated = (yield from self._iter_tool_calls(messages, message, cancel)) or truncated
+            if truncated:
+                tools = self._with_reader(tools)
         
+        self._finish_turn(session_id, called)
         return messages, tool_called
     
-    def _process_tool_calls(self, messages: list, message):
-        """处理工具调用"""
+    def _process_tool_calls(self, messages: list, message) -> bool:
+        """处理工具调用，返回是否有结果被截断"""
+        events = self._iter_tool_calls(messages, message)
+        while True:
+            try:
+                next(events)
+            except StopIteration as stop:
+                return stop.value
+    
+    def _call_tool(self, tool_name: str, arguments: dict, cancel: CancelToken | None,
+                   on_progress=None) -> tuple[str, str, bool]:
+        """执行工具，返回 (完整结果, 写入对话的内容, 是否被截断)"""
+        if self.tool_results is None:
+            result = self.tool_manager.call_tool(tool_name, arguments, cancel, on_progress)
+            return result, result, False
+        if tool_name == READ_TOOL_NAME:
+            result = self.tool_results.read(arguments)
+            return result, result, False
+        result = self.tool_manager.call_tool(tool_name, arguments, cancel, on_progress)
+        content, truncated = self.tool_results.fit(tool_name, result)
+        return result, content, truncated
+
+    def _iter_call_tool(self, tool_name: str, arguments: dict, cancel: CancelToken | None):
+        """
+        同 _call_tool；流式工具在后台线程中执行，期间产出 tool_progress 事件，
+        生成器结束时返回 _call_tool 的结果
+        """
+        if not self.tool_manager.streams(tool_name):
+            return self._call_tool(tool_name, arguments, cancel)
+
+        events = queue.Queue()
+        outcome = {}
+
+        def target():
+            try:
+                outcome["value"] = self._call_tool(tool_name, arguments, cancel, events.put)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                events.put(None)
+
+        threading.Thread(target=target, name=f"tool-{tool_name}", daemon=True).start()
+        while (event := events.get()) is not None:
+            yield {"type": "tool_progress", "name": tool_name, **event}
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["value"]
+    
+    def _iter_tool_calls(self, messages: list, message, cancel: CancelToken | None = None):
+        """
+        处理工具调用，每个工具执行前后产出 tool_start / tool_end 事件，
+        生成器结束时返回是否有结果因超出预算被截断
+        """
+        truncated = False
         # 添加 assistant 消息
         messages.append({
             "role": "assistant",
@@ -112,14 +221,40 @@ class Agent:
                         "tool_call_id": tool_call.id,
                         "content": f"参数解析失败: {str(e)}"
                     })
+                    yield {"type": "tool_end", "name": tool_name, "duration_ms": 0, "success": False}
                     continue
             
-            print(f"  [工具]: {tool_name}({json.dumps(arguments, ensure_ascii=False)[:200]})")
-            result = self.tool_manager.call_tool(tool_name, arguments)
+            args_summary = json.dumps(arguments, ensure_ascii=False)
+            yield {"type": "tool_start", "name": tool_name, "arguments": args_summary[:100]}
+            
+            print(f"  [工具]: {tool_name}({args_summary[:200]})")
+            started = time.perf_counter()
+            result, content, result_truncated = yield from self._iter_call_tool(tool_name, arguments, cancel)
+            truncated = truncated or result_truncated
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
             print(f"  [结果]: {result[:100]}..." if len(result) > 100 else f"  [结果]: {result}")
             
             messages.append({
                 "role": "tool",
                 "tool_call_id": tool_call.id,
-                "content": result
+                "content": content
             })
+            yield {
+                "type": "tool_end",
+                "name": tool_name,
+                "duration_ms": duration_ms,
+                "success": _tool_succeeded(result),
+            }
+        
+        return truncated
+
+
+def _tool_succeeded(result: str) -> bool:
+    """根据工具返回的 JSON 判断是否成功"""
+    try:
+        data = json.loads(result)
+    except json.JSONDecodeError:
+        return False
+    if isinstance(data, dict):
+        return "error" not in data and data.get("success", True) is not False
+    return True
@@ -0,0 +1,84 @@
+"""取消控制模块 - 贯穿 LLM 调用、工具调用和流式输出的取消信号"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+# 可取消调用使用的线程池：取消时不再等待结果，后台线程自行结束
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="cancellable")
+
+POLL_INTERVAL = 0.05
+
+
+class ChatCancelled(Exception):
+    """对话已被取消（用户打断、新消息抢占或客户端断开）"""
+
+
+class CancelToken:
+    """取消信号，可注册取消时执行的回调（如关闭上游连接）"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """触发取消，并执行已注册的回调"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[取消] 回调执行失败: {e}")
+
+    def on_cancel(self, callback):
+        """注册取消回调，已取消时立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise ChatCancelled()
+
+
+def run_cancellable(cancel: CancelToken | None, fn, *args, **kwargs):
+    """在线程池中执行阻塞调用，取消时立即抛出 ChatCancelled 不再等待"""
+    if cancel is None:
+        return fn(*args, **kwargs)
+    return run_with_timeout(cancel, None, fn, *args, **kwargs)
+
+
+def run_with_timeout(cancel: CancelToken | None, total_timeout: float | None, fn, *args, **kwargs):
+    """
+    同 run_cancellable，另外限制总耗时：超过 total_timeout 秒抛出 TimeoutError，
+    后台线程自行结束（由调用方设置的读超时兜底）
+    """
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+    future = _executor.submit(fn, *args, **kwargs)
+    deadline = time.monotonic() + total_timeout if total_timeout else None
+    while True:
+        try:
+            return future.result(timeout=POLL_INTERVAL)
+        except FutureTimeout:
+            if cancel is not None and cancel.cancelled:
+                future.cancel()
+                raise ChatCancelled()
+            if deadline is not None and time.monotonic() > deadline:
+                future.cancel()
+                raise TimeoutError(f"超过 {total_timeout} 秒未完成")
@@ -0,0 +1,104 @@
+"""熔断模块 - MCP 服务连续失败或持续变慢时暂停调用，后台探测恢复"""
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"        # 正常调用
+OPEN = "open"            # 熔断中，直接返回错误
+HALF_OPEN = "half_open"  # 冷却结束，正在探测健康检查接口
+
+
+class CircuitBreaker:
+    """
+    单个 MCP 服务的熔断器
+
+    连续失败 failure_threshold 次，或最近 window 次调用中慢调用（超过 slow_ms，
+    单次调用可按工具传入自己的阈值）占比达到 slow_ratio 时熔断；冷却 cooldown 秒后在后台调用 probe 探测，
+    成功则恢复，失败则冷却时间翻倍（不超过 max_cooldown）
+    """
+
+    def __init__(self, name: str, probe, failure_threshold: int = 3, slow_ms: float = 15000,
+                 slow_ratio: float = 0.5, window: int = 10, cooldown: float = 10, max_cooldown: float = 60):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.slow_ms = slow_ms
+        self.slow_ratio = slow_ratio
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        # 最近 window 次调用是否为慢调用
+        self._slow_calls = deque(maxlen=window)
+        self._cooldown = cooldown
+        self._opened_at = 0.0
+        self.reason = ""
+        self.stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        """是否允许调用；熔断冷却结束时启动后台探测，探测完成前仍拒绝调用"""
+        return self._check(count_rejected=True)
+
+    def available(self) -> bool:
+        """同 allow，但不计入拒绝次数（用于决定是否向模型提供该服务的工具）"""
+        return self._check(count_rejected=False)
+
+    def _check(self, count_rejected: bool) -> bool:
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self._cooldown:
+                self._state = HALF_OPEN
+                self.stats["probes"] += 1
+                threading.Thread(target=self._probe, name=f"probe-{self.name}", daemon=True).start()
+            if count_rejected:
+                self.stats["rejected"] += 1
+            return False
+
+    def record(self, ok: bool, elapsed_ms: float, slow_ms: float | None = None):
+        """记录一次调用结果；slow_ms 为该次调用的慢调用阈值，未指定时使用默认值"""
+        with self._lock:
+            if self._state != CLOSED:
+                return
+            self._slow_calls.append(elapsed_ms > (self.slow_ms if slow_ms is None else slow_ms))
+            self._failures = 0 if ok else self._failures + 1
+            if self._failures >= self.failure_threshold:
+                self._open(f"连续失败 {self._failures} 次")
+                return
+            if len(self._slow_calls) == self._slow_calls.maxlen:
+                slow = sum(self._slow_calls)
+                if slow / len(self._slow_calls) >= self.slow_ratio:
+                    self._open(f"最近 {len(self._slow_calls)} 次调用中 {slow} 次超过慢调用阈值")
+
+    def _open(self, reason: str):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.reason = reason
+        self.stats["opened"] += 1
+        print(f"[熔断] {self.name} 已熔断（{reason}），{self._cooldown:.0f} 秒后探测")
+
+    def _probe(self):
+        try:
+            healthy = self.probe()
+        except Exception:
+            healthy = False
+        with self._lock:
+            if healthy:
+                self._state = CLOSED
+                self._failures = 0
+                self._slow_calls.clear()
+                self._cooldown = self.base_cooldown
+                self.reason = ""
+                print(f"[熔断] {self.name} 已恢复")
+            else:
+                self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                self._open("健康检查失败")
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"state": self._state, "reason": self.reason, "failures": self._failures, **self.stats}
@@ -8,6 +8,61 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+# 流式输出时请求末尾附带 usage（部分兼容接口不支持时可关闭）
+OPENAI_STREAM_USAGE = os.getenv("OPENAI_STREAM_USAGE", "true").lower() == "true"
+
+
+def _model_role(role: str, max_tokens: int, timeout: float) -> dict:
+    """读取某类调用的模型配置，未配置的项沿用主模型设置"""
+    suffix = role.upper()
+    return {
+        "model": os.getenv(f"OPENAI_MODEL_{suffix}", OPENAI_MODEL),
+        "max_tokens": int(os.getenv(f"OPENAI_MAX_TOKENS_{suffix}", str(max_tokens))),
+        "timeout": float(os.getenv(f"OPENAI_TIMEOUT_{suffix}", str(timeout))),
+    }
+
+
+# 按调用类型配置模型：router 为工具选择轮，reply 为最终回复，
+# extraction 为记忆提取，summarization 为对话摘要；失败时自动回退到 OPENAI_MODEL
+MODEL_ROLES = {
+    "router": _model_role("router", 200, 30),
+    "reply": _model_role("reply", 200, OPENAI_TIMEOUT),
+    "extraction": _model_role("extraction", 200, 30),
+    "summarization": _model_role("summarization", 300, 30),
+}
+
+# 工具路由：每轮只发送与用户消息相关的 top-k 个工具定义
+TOOL_ROUTER_ENABLED = os.getenv("TOOL_ROUTER_ENABLED", "true").lower() == "true"
+TOOL_ROUTER_TOP_K = int(os.getenv("TOOL_ROUTER_TOP_K", "4"))
+TOOL_ROUTER_MIN_SCORE = float(os.getenv("TOOL_ROUTER_MIN_SCORE", "1.5"))
+
+# 本地意图快速通道：几点了、打开记事本、锁屏等简单指令不经过 LLM
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+# mcpserve 目录，用于读取应用映射表
+MCPSERVE_DIR = os.getenv("MCPSERVE_DIR", os.path.join(os.path.dirname(__file__), "..", "mcpserve"))
+
+# MCP 服务连接池：每个服务复用长连接（HTTP/2 需要额外安装 h2）
+MCP_POOL_MAX_CONNECTIONS = int(os.getenv("MCP_POOL_MAX_CONNECTIONS", "20"))
+MCP_POOL_MAX_KEEPALIVE = int(os.getenv("MCP_POOL_MAX_KEEPALIVE", "10"))
+MCP_POOL_KEEPALIVE_EXPIRY = float(os.getenv("MCP_POOL_KEEPALIVE_EXPIRY", "30"))
+MCP_HTTP2 = os.getenv("MCP_HTTP2", "false").lower() == "true"
+
+# MCP 服务熔断：连续失败或持续变慢时暂停调用并隐藏其工具，冷却后探测 /health 恢复
+MCP_BREAKER_FAILURES = int(os.getenv("MCP_BREAKER_FAILURES", "3"))
+MCP_BREAKER_SLOW_MS = float(os.getenv("MCP_BREAKER_SLOW_MS", "15000"))
+MCP_BREAKER_COOLDOWN = float(os.getenv("MCP_BREAKER_COOLDOWN", "10"))
+
+# 工具结果预算：超过 TOOL_RESULT_MAX_CHARS 字符的结果只内联摘要，完整内容分页读取（0 表示不限制）
+TOOL_RESULT_MAX_CHARS = int(os.getenv("TOOL_RESULT_MAX_CHARS", "4000"))
+TOOL_RESULT_PAGE_CHARS = int(os.getenv("TOOL_RESULT_PAGE_CHARS", "4000"))
+TOOL_RESULT_TTL = int(os.getenv("TOOL_RESULT_TTL", "3600"))
+
+# 输入预取：用户输入时提前检索记忆、预热连接，正式消息与预取输入足够相似时复用结果
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+PREFETCH_MIN_INTERVAL = float(os.getenv("PREFETCH_MIN_INTERVAL", "0.5"))
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "30"))
+PREFETCH_MIN_SIMILARITY = float(os.getenv("PREFETCH_MIN_SIMILARITY", "0.8"))
 
 # 系统提示词
 SYSTEM_PROMPT = """你是三月七，来自《崩坏：星穹铁道》的角色。
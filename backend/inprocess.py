@@ -0,0 +1,135 @@
+"""进程内工具传输 - 与后端部署在同一台机器的 MCP 服务直接调用其路由函数，省去本机 HTTP 往返"""
+import asyncio
+import importlib
+import importlib.util
+import inspect
+import os
+import sys
+import threading
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ValidationError
+
+
+class InProcessResponse:
+    """与 httpx.Response 用法一致的最小响应对象（status_code、json()）"""
+
+    def __init__(self, status_code: int, data):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+def _load_package(tools_dir: str):
+    """以独立包名加载 mcpserve/tools，避免与后端模块重名"""
+    name = "mcpserve_tools"
+    if name in sys.modules:
+        return name
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(tools_dir, "__init__.py"), submodule_search_locations=[tools_dir]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[name] = package
+    spec.loader.exec_module(package)
+    return name
+
+
+class InProcessTransport:
+    """
+    导入 mcpserve 的工具路由，按 (方法, 路径) 建立函数表直接调用
+
+    路由函数中的阻塞操作（遍历目录等）在调用方线程中执行，
+    每个线程复用一个事件循环来运行 async 路由函数
+    """
+
+    def __init__(self, mcpserve_dir: str, modules: list):
+        self.mcpserve_dir = os.path.abspath(mcpserve_dir)
+        self.modules = modules
+        self._routes = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def load(self):
+        """导入路由模块并建立函数表（首次调用时执行）"""
+        if self._routes is not None:
+            return
+        with self._lock:
+            if self._routes is not None:
+                return
+            package = _load_package(os.path.join(self.mcpserve_dir, "tools"))
+            routes = []
+            for module_name in self.modules:
+                module = importlib.import_module(f"{package}.{module_name}")
+                for route in module.router.routes:
+                    if isinstance(route, APIRoute):
+                        routes.append(route)
+                # 与 mcpserve 启动时一样在后台预热
+                if callable(getattr(module, "warm_up", None)):
+                    threading.Thread(target=module.warm_up, name=f"warmup-{module_name}", daemon=True).start()
+            self._routes = routes
+            print(f"[工具] 进程内加载 {len(routes)} 个路由: {', '.join(self.modules)}")
+
+    def _match(self, method: str, path: str):
+        for route in self._routes:
+            if method not in route.methods:
+                continue
+            matched = route.path_regex.match(path)
+            if matched:
+                path_params = {
+                    key: route.param_convertors[key].convert(value)
+                    for key, value in matched.groupdict().items()
+                }
+                return route, path_params
+        return None, {}
+
+    @staticmethod
+    def _build_kwargs(route: APIRoute, path_params: dict, arguments: dict) -> dict:
+        """按路由函数签名组装参数：pydantic 模型参数用请求体构造，其余按名称取值"""
+        kwargs = {}
+        for name, param in inspect.signature(route.endpoint).parameters.items():
+            annotation = param.annotation
+            if inspect.isclass(annotation) and issubclass(annotation, BaseModel):
+                kwargs[name] = annotation(**arguments)
+            elif inspect.isclass(annotation) and issubclass(annotation, Request):
+                # 进程内调用没有 HTTP 连接，路由函数据此跳过断开检测
+                kwargs[name] = None
+            elif name in path_params:
+                kwargs[name] = path_params[name]
+            elif name in arguments:
+                kwargs[name] = arguments[name]
+            elif param.default is inspect.Parameter.empty:
+                raise HTTPException(status_code=422, detail=f"缺少参数: {name}")
+        return kwargs
+
+    def _run(self, coro):
+        loop = getattr(self._local, "loop", None)
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            self._local.loop = loop
+        return loop.run_until_complete(coro)
+
+    def request(self, method: str, url: str, params: dict | None = None,
+                json: dict | None = None, timeout=None) -> InProcessResponse:
+        """与 httpx.Client.request 相同的调用方式（timeout 由调用方的总超时控制）"""
+        self.load()
+        route, path_params = self._match(method.upper(), url)
+        if route is None:
+            return InProcessResponse(404, {"detail": "Not Found"})
+
+        try:
+            kwargs = self._build_kwargs(route, path_params, params or json or {})
+            result = route.endpoint(**kwargs)
+            if inspect.iscoroutine(result):
+                result = self._run(result)
+            return InProcessResponse(200, jsonable_encoder(result))
+        except HTTPException as e:
+            return InProcessResponse(e.status_code, {"detail": e.detail})
+        except ValidationError as e:
+            return InProcessResponse(422, {"detail": jsonable_encoder(e.errors())})
+        except Exception as e:
+            print(f"[工具] 进程内调用 {method} {url} 失败: {e}")
+            return InProcessResponse(500, {"detail": str(e)})
@@ -0,0 +1,154 @@
+"""本地意图识别模块 - 简单指令直接调用工具，不经过 LLM"""
+import importlib.util
+import json
+import os
+import random
+import re
+import threading
+from datetime import datetime
+
+from mcp_tools import MCPToolManager
+
+# 三月七口吻的回复模板
+REPLY_TEMPLATES = {
+    "time": [
+        "现在是 {time} 哦~",
+        "看一眼~现在 {time} 啦！",
+    ],
+    "date": [
+        "今天是 {date}，{weekday}呀~",
+        "今天 {date}，{weekday}哦！",
+    ],
+    "open_app": [
+        "好哒，{app} 已经打开啦~",
+        "{app} 打开咯，快去看看吧！",
+    ],
+    "open_app_failed": [
+        "呜…没找到 {app} 呢，确认一下装了没有呀？",
+    ],
+    "lock": [
+        "好的，屏幕锁上啦，早点回来哦~",
+    ],
+    "failed": [
+        "哎呀，好像出了点问题，没能办到呢…",
+    ],
+}
+
+# 句首客套词和句尾语气词
+_PREFIX_RE = re.compile(r'^(三月七|小三月)?[，, ]*(请|麻烦|帮我|帮忙|给我)*')
+_SUFFIX_RE = re.compile(r'[吧呀啊呢哦嘛啦~～!！?？。.，, ]+$')
+
+_TIME_RE = re.compile(r'^(现在)?(几点了?|几点钟了?|什么时间了?|是什么时间)$')
+_DATE_RE = re.compile(r'^(今天)?(是)?(几号|几月几号|星期几|周几|礼拜几|什么日子)$')
+_OPEN_RE = re.compile(r'^(打开一下|启动一下|开一下|打开|启动|运行)(.+)$')
+_LOCK_RE = re.compile(r'^(锁屏|锁一下屏幕?|锁定(电脑|屏幕)|把(电脑|屏幕)锁上)$')
+
+# 打开的是文件、文件夹等需要搜索的对象时交给 Agent
+_OPEN_EXCLUDE = ("文件", "目录", "网页", "网站", "链接")
+
+
+def load_app_tables(mcpserve_dir: str) -> tuple[dict, dict]:
+    """读取 mcpserve/tools/apps.py 中的应用映射表，找不到时返回空表"""
+    path = os.path.join(mcpserve_dir, "tools", "apps.py")
+    if not os.path.exists(path):
+        print(f"[意图识别] 未找到应用映射表: {path}")
+        return {}, {}
+    spec = importlib.util.spec_from_file_location("mcpserve_apps", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.SYSTEM_APPS, module.APP_KEYWORDS
+
+
+def normalize(message: str) -> str:
+    """去掉称呼、客套词和语气词"""
+    text = message.strip().lower()
+    text = _SUFFIX_RE.sub("", text)
+    text = _PREFIX_RE.sub("", text)
+    return text.strip()
+
+
+class IntentMatcher:
+    """确定性意图匹配：只处理整句完全匹配的简单指令，其余交给 Agent"""
+
+    def __init__(self, tool_manager: MCPToolManager, system_apps: dict, app_keywords: dict):
+        self.tool_manager = tool_manager
+        self.app_names = set(system_apps)
+        for name, aliases in app_keywords.items():
+            self.app_names.add(name)
+            self.app_names.update(a.lower() for a in aliases)
+        self._lock = threading.Lock()
+        self.stats = {"total": 0, "hits": 0, "by_intent": {}}
+
+    def match(self, message: str) -> tuple[str, str, dict] | None:
+        """匹配意图，返回 (意图, 工具名, 参数)，不确定时返回 None"""
+        text = normalize(message)
+        if not text:
+            return None
+
+        if _TIME_RE.match(text):
+            return "time", "get_system_time", {}
+        if _DATE_RE.match(text):
+            return "date", "get_system_time", {}
+        if _LOCK_RE.match(text):
+            return "lock", "delayed_task", {"action": "lock", "delay_seconds": 0, "params": {}}
+
+        opened = _OPEN_RE.match(text)
+        if opened:
+            app = opened.group(2).strip()
+            if app in self.app_names and not any(word in app for word in _OPEN_EXCLUDE):
+                return "open_app", "open_application", {"app_name": app}
+
+        return None
+
+    def handle(self, message: str) -> tuple[str, str] | None:
+        """命中高置信度意图时直接执行工具并返回 (意图, 回复)，否则返回 None"""
+        matched = self.match(message)
+        with self._lock:
+            self.stats["total"] += 1
+            if matched:
+                self.stats["hits"] += 1
+                by_intent = self.stats["by_intent"]
+                by_intent[matched[0]] = by_intent.get(matched[0], 0) + 1
+        if not matched:
+            return None
+
+        intent, tool_name, arguments = matched
+        print(f"[快速通道] {intent}: {tool_name}({json.dumps(arguments, ensure_ascii=False)})")
+        try:
+            result = json.loads(self.tool_manager.call_tool(tool_name, arguments))
+        except json.JSONDecodeError:
+            result = {"error": "工具返回格式错误"}
+        return intent, self._render(intent, arguments, result)
+
+    def _render(self, intent: str, arguments: dict, result: dict) -> str:
+        """根据工具结果填充回复模板"""
+        if intent in ("time", "date"):
+            if "error" in result:
+                # 时间服务不可用时用本机时间兜底
+                now = datetime.now()
+                result = {
+                    "time": now.strftime("%H:%M:%S"),
+                    "date": now.strftime("%Y-%m-%d"),
+                    "weekday": ["周一", "周二", "周三", "周四", "周五", "周六", "周日"][now.weekday()],
+                }
+            values = {
+                "time": result["time"][:5],
+                "date": result["date"],
+                "weekday": result["weekday"],
+            }
+            return random.choice(REPLY_TEMPLATES[intent]).format(**values)
+
+        if intent == "open_app":
+            key = "open_app" if result.get("success") else "open_app_failed"
+            return random.choice(REPLY_TEMPLATES[key]).format(app=arguments["app_name"])
+
+        if "error" in result or result.get("success") is False:
+            return random.choice(REPLY_TEMPLATES["failed"])
+        return random.choice(REPLY_TEMPLATES[intent])
+
+    def get_stats(self) -> dict:
+        """快速通道命中统计"""
+        with self._lock:
+            stats = json.loads(json.dumps(self.stats))
+        stats["hit_rate"] = round(stats["hits"] / stats["total"], 3) if stats["total"] else 0
+        return stats
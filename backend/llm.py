@@ -0,0 +1,126 @@
+"""LLM 调用模块 - 按调用类型路由到不同模型"""
+import threading
+import time
+
+from cancel import CancelToken, ChatCancelled, run_cancellable
+from usage import usage_tracker, profile_prompt
+
+# 未指定来源时记到内部调用名下
+DEFAULT_USAGE_TAGS = {"endpoint": "internal", "session_id": "default"}
+
+
+class LLMRouter:
+    """
+    按调用类型（router / reply / extraction / summarization）选择模型、
+    max_tokens 和超时，调用失败时回退到主模型，并统一记录 token 用量
+    """
+
+    def __init__(self, client, roles: dict, primary_model: str,
+                 primary_timeout: float = 60, stream_usage: bool = True):
+        self.client = client
+        self.roles = roles
+        self.primary_model = primary_model
+        self.primary_timeout = primary_timeout
+        self.stream_usage = stream_usage
+        self._lock = threading.Lock()
+        self._last_warm_up = 0.0
+        self.stats = {role: {"calls": 0, "failures": 0, "fallbacks": 0} for role in roles}
+
+    def model_for(self, role: str) -> str:
+        return self.roles[role]["model"]
+
+    def _count(self, role: str, key: str):
+        with self._lock:
+            self.stats[role][key] += 1
+
+    def _create(self, role: str, **kwargs):
+        """按角色配置调用，失败时用主模型重试一次，返回 (实际模型, 响应)"""
+        cfg = self.roles[role]
+        self._count(role, "calls")
+        try:
+            response = self.client.chat.completions.create(
+                model=cfg["model"], max_tokens=cfg["max_tokens"], timeout=cfg["timeout"], **kwargs
+            )
+            return cfg["model"], response
+        except Exception as e:
+            self._count(role, "failures")
+            if cfg["model"] == self.primary_model:
+                raise
+            print(f"[模型路由] {role} 模型 {cfg['model']} 调用失败（{e}），回退到 {self.primary_model}")
+            self._count(role, "fallbacks")
+            response = self.client.chat.completions.create(
+                model=self.primary_model, max_tokens=cfg["max_tokens"], timeout=self.primary_timeout, **kwargs
+            )
+            return self.primary_model, response
+
+    def complete(self, role: str, messages: list, tools: list | None = None,
+                 usage_tags: dict | None = None, cancel: CancelToken | None = None):
+        """非流式调用，取消时不再等待响应"""
+        kwargs = {"messages": messages}
+        if tools:
+            kwargs["tools"] = tools
+        model, response = run_cancellable(cancel, self._create, role, **kwargs)
+        usage_tracker.record(
+            response.usage, call_type=role, model=model,
+            breakdown=profile_prompt(messages, tools), **{**DEFAULT_USAGE_TAGS, **(usage_tags or {})},
+        )
+        return response
+
+    def stream(self, role: str, messages: list, usage_tags: dict | None = None,
+               cancel: CancelToken | None = None):
+        """流式调用，产出文本片段，结束后记录用量；取消时关闭上游连接并抛出 ChatCancelled"""
+        kwargs = {"stream_options": {"include_usage": True}} if self.stream_usage else {}
+        model, stream = run_cancellable(cancel, self._create, role, messages=messages, stream=True, **kwargs)
+        if cancel is not None:
+            cancel.on_cancel(stream.close)
+
+        usage = None
+        try:
+            for chunk in stream:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                # include_usage 时最后一个 chunk 只有 usage，没有 choices
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except ChatCancelled:
+            raise
+        except Exception:
+            # 上游连接被取消回调关闭时的读取错误按取消处理
+            if cancel is not None and cancel.cancelled:
+                raise ChatCancelled()
+            raise
+        finally:
+            if cancel is not None:
+                cancel.remove_callback(stream.close)
+            stream.close()
+
+        usage_tracker.record(
+            usage, call_type=role, model=model,
+            breakdown=profile_prompt(messages), **{**DEFAULT_USAGE_TAGS, **(usage_tags or {})},
+        )
+
+    def warm_up(self, timeout: float = 5):
+        """预先建立到模型服务的连接（TLS 握手、连接池），失败不影响启动"""
+        try:
+            self.client.with_options(timeout=timeout, max_retries=0).models.list()
+        except Exception as e:
+            print(f"[模型路由] 预热连接失败: {e}")
+
+    def keep_warm(self, interval: float = 30):
+        """距上次预热超过 interval 秒时重新预热，避免空闲连接被服务端关闭"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_warm_up < interval:
+                return
+            self._last_warm_up = now
+        self.warm_up()
+
+    def get_stats(self) -> dict:
+        """各调用类型的模型与调用统计"""
+        with self._lock:
+            return {
+                role: {"model": self.roles[role]["model"], **stats}
+                for role, stats in self.stats.items()
+            }
@@ -1,10 +1,28 @@
 """FastAPI 应用启动入口"""
+import time
+
+# 在导入其他模块之前记录，用于统计启动耗时
+PROCESS_STARTED = time.perf_counter()
+
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+import services
 from routes import router
 
-app = FastAPI(title="三月七桌宠 API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 先开始接受请求，数据库、工具定义、模型连接等在后台预热
+    services.start_warm_up(PROCESS_STARTED)
+    yield
+    await services.shutdown()
+
+
+app = FastAPI(title="三月七桌宠 API", lifespan=lifespan)
 
 # CORS 配置
 app.add_middleware(
@@ -28,4 +46,9 @@ if __name__ == "__main__":
     log_config["formatters"]["access"]["fmt"] = '%(asctime)s - %(client_addr)s - "%(request_line)s" %(status_code)s'
     log_config["formatters"]["access"]["datefmt"] = "%H:%M:%S"
     
-    uvicorn.run(app, host="0.0.0.0", port=8001, log_config=log_config)
+    # 会话历史、用量统计和工具配置版本都在共享状态库中，可以开多个 worker
+    workers = int(os.getenv("BACKEND_WORKERS", "1"))
+    if workers > 1:
+        uvicorn.run("main:app", host="0.0.0.0", port=8001, log_config=log_config, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001, log_config=log_config)
@@ -1,63 +1,655 @@
 """MCP 工具管理模块"""
+import asyncio
+import importlib.util
 import json
 import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
 import httpx
 
+from cancel import CancelToken, ChatCancelled, run_with_timeout
+from circuit import CircuitBreaker
+from state import StateStore
+
+# 共享状态库中工具配置版本号的键，任一进程 reload 后其他进程据此刷新
+CONFIG_VERSION_KEY = "tools_config_version"
+
+# 参数放在查询字符串中的请求方法，其余方法使用 JSON 请求体
+QUERY_METHODS = ("GET", "DELETE")
+
+# 传输方式：http 通过 HTTP 调用；inprocess 在后端进程内直接调用 mcpserve 的路由函数
+HTTP = "http"
+INPROCESS = "inprocess"
+
+# 未在配置中指定时的超时（秒）：连接、读取、整次调用
+DEFAULT_TIMEOUT = {"connect": 3, "read": 60, "total": 120}
+
+_TYPE_NAMES = {
+    "string": "字符串",
+    "integer": "整数",
+    "number": "数字",
+    "boolean": "布尔值",
+    "object": "对象",
+    "array": "数组",
+}
+
+
+def _timeout(*configs) -> dict:
+    """合并默认值、服务级和工具级超时配置，数字表示读取和整次调用的超时"""
+    merged = dict(DEFAULT_TIMEOUT)
+    for config in configs:
+        if isinstance(config, (int, float)):
+            merged.update(read=config, total=config)
+        elif isinstance(config, dict):
+            merged.update(config)
+    return merged
+
+
+def _coerce(value, expected: str):
+    """按声明类型校验参数，能无损转换的（如 "10" -> 10）直接转换，否则抛出 ValueError"""
+    if expected == "string":
+        if isinstance(value, (dict, list)):
+            raise ValueError
+        return value if isinstance(value, str) else str(value)
+    if expected == "integer":
+        if isinstance(value, bool):
+            raise ValueError
+        if isinstance(value, int):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str):
+            return int(value.strip())
+        raise ValueError
+    if expected == "number":
+        if isinstance(value, bool):
+            raise ValueError
+        if isinstance(value, (int, float)):
+            return value
+        if isinstance(value, str):
+            return float(value.strip())
+        raise ValueError
+    if expected == "boolean":
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        raise ValueError
+    if expected == "object" and not isinstance(value, dict):
+        raise ValueError
+    if expected == "array" and not isinstance(value, list):
+        raise ValueError
+    return value
+
+
+class ToolRegistry:
+    """
+    由一份配置编译出的只读工具表：按名称 O(1) 查找，OpenAI 工具定义只构建一次。
+    配置变化时整体替换为新的实例，正在执行的调用继续使用旧实例
+    """
+
+    def __init__(self, config: dict, mtime: float = 0):
+        self.config = config
+        self.mtime = mtime
+        self.tools = {}
+        for server_name, server_config in config.get("mcpServers", {}).items():
+            for tool in server_config.get("tools", []):
+                if tool["name"] in self.tools:
+                    print(f"[工具] 工具名重复，{server_name} 中的 {tool['name']} 被忽略")
+                    continue
+                self.tools[tool["name"]] = self._compile(server_name, server_config, tool)
+
+        # 按名称排序，工具定义在每次请求中保持相同顺序，便于命中前缀缓存
+        self.openai_tools = [self.tools[name]["schema"] for name in sorted(self.tools)]
+
+    @staticmethod
+    def _compile(server_name: str, server_config: dict, tool: dict) -> dict:
+        properties = tool.get("parameters", {})
+        # 必填参数由配置中的 required 列出；未配置时除标记了 optional 的参数外都是必填
+        required = tool.get("required")
+        if required is None:
+            required = [name for name, spec in properties.items() if not spec.get("optional", False)]
+        transport = server_config.get("transport", HTTP)
+        if transport == INPROCESS:
+            base_url, url = f"inprocess://{server_name}", tool["endpoint"]
+        else:
+            base_url, url = server_config["baseUrl"], f"{server_config['baseUrl']}{tool['endpoint']}"
+        # 提供流式接口的工具（NDJSON）通过 HTTP 调用时逐行读取结果
+        stream_url = None
+        if tool.get("streamEndpoint") and transport == HTTP:
+            stream_url = f"{server_config['baseUrl']}{tool['streamEndpoint']}"
+        return {
+            "server": server_name,
+            "transport": transport,
+            "base_url": base_url,
+            "url": url,
+            "stream_url": stream_url,
+            "timeout": _timeout(server_config.get("timeout"), tool.get("timeout")),
+            # 熔断的慢调用阈值（毫秒），遍历磁盘等本来就慢的工具单独配置，未配置时使用默认值
+            "slow_ms": tool.get("slowMs"),
+            "method": tool.get("method", "GET").upper(),
+            "properties": properties,
+            "required": required,
+            "schema": {
+                "type": "function",
+                "function": {
+                    "name": tool["name"],
+                    "description": tool["description"],
+                    "parameters": {
+                        "type": "object",
+                        "properties": properties,
+                        "required": required,
+                    },
+                },
+            },
+        }
+
+    @staticmethod
+    def validate(tool: dict, arguments) -> tuple[dict, str | None]:
+        """按工具定义校验参数，返回 (清洗后的参数, 错误信息)"""
+        if not isinstance(arguments, dict):
+            return {}, "参数必须是 JSON 对象"
+
+        # 只有未传或为 null 才算缺少；空字符串是否允许由参数的 minLength 决定（如写入空文件）
+        missing = [name for name in tool["required"] if arguments.get(name) is None]
+        if missing:
+            return {}, f"缺少必填参数: {', '.join(missing)}"
+
+        cleaned = {}
+        for name, value in arguments.items():
+            spec = tool["properties"].get(name)
+            if spec is None:
+                # 模型偶尔会多传参数，直接丢弃
+                continue
+            if value is None:
+                continue
+            expected = spec.get("type")
+            try:
+                cleaned[name] = _coerce(value, expected) if expected else value
+            except ValueError:
+                return {}, f"参数 {name} 应为{_TYPE_NAMES.get(expected, expected)}"
+            min_length = spec.get("minLength", 0)
+            if isinstance(cleaned[name], str) and len(cleaned[name]) < min_length:
+                if min_length == 1:
+                    return {}, f"参数 {name} 不能为空"
+                return {}, f"参数 {name} 至少需要 {min_length} 个字符"
+        return cleaned, None
+
+
+class ConnectionPool:
+    """
+    每个 MCP 服务一个长期复用的 httpx 客户端（同步和异步各一个），
+    保持 keep-alive 连接，避免每次工具调用都重新建立连接
+    """
+
+    def __init__(self, max_connections: int = 20, max_keepalive: int = 10,
+                 keepalive_expiry: float = 30, http2: bool = False):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        if http2 and importlib.util.find_spec("h2") is None:
+            print("[工具] 未安装 h2，MCP 连接不使用 HTTP/2")
+            http2 = False
+        self.http2 = http2
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._async_clients = {}
+        self.stats = {}
+
+    def client(self, base_url: str) -> httpx.Client:
+        client = self._clients.get(base_url)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(base_url)
+                if client is None:
+                    client = httpx.Client(base_url=base_url, limits=self.limits, http2=self.http2)
+                    self._clients[base_url] = client
+        return client
+
+    def async_client(self, base_url: str) -> httpx.AsyncClient:
+        client = self._async_clients.get(base_url)
+        if client is None:
+            with self._lock:
+                client = self._async_clients.get(base_url)
+                if client is None:
+                    client = httpx.AsyncClient(base_url=base_url, limits=self.limits, http2=self.http2)
+                    self._async_clients[base_url] = client
+        return client
+
+    def record(self, base_url: str, elapsed_ms: float, ok: bool):
+        with self._lock:
+            stats = self.stats.setdefault(base_url, {"requests": 0, "errors": 0, "total_ms": 0.0})
+            stats["requests"] += 1
+            stats["total_ms"] += elapsed_ms
+            if not ok:
+                stats["errors"] += 1
+
+    @staticmethod
+    def _connections(client) -> int | None:
+        """当前连接池中的连接数（读取 httpcore 内部状态，取不到时返回 None）"""
+        try:
+            return len(client._transport._pool.connections)
+        except AttributeError:
+            return None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for base_url, stats in self.stats.items():
+                client = self._clients.get(base_url)
+                result[base_url] = {
+                    "requests": stats["requests"],
+                    "errors": stats["errors"],
+                    "avg_ms": round(stats["total_ms"] / stats["requests"], 2) if stats["requests"] else 0,
+                    "connections": self._connections(client) if client else None,
+                }
+        return {"http2": self.http2, "servers": result}
+
+    def close(self):
+        """关闭同步客户端；异步客户端需在事件循环中用 aclose 关闭"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    async def aclose(self):
+        """关闭所有客户端（同步和异步），应用关闭时调用"""
+        self.close()
+        with self._lock:
+            clients = list(self._async_clients.values())
+            self._async_clients.clear()
+        for client in clients:
+            await client.aclose()
+
 
 class MCPToolManager:
-    def __init__(self, config_path: str = None):
+    def __init__(self, config_path: str = None, state: StateStore = None, pool: ConnectionPool = None,
+                 breaker_settings: dict | None = None):
         if config_path is None:
             config_path = os.path.join(os.path.dirname(__file__), "mcpconfig.json")
         self.config_path = config_path
-        self.config = self._load_config()
-    
-    def _load_config(self) -> dict:
-        """加载 MCP 配置"""
-        if os.path.exists(self.config_path):
+        self.state = state
+        self.pool = pool or ConnectionPool()
+        self.breaker_settings = breaker_settings or {}
+        self.breakers = {}
+        self.transports = {}
+        self.version = state.get_value(CONFIG_VERSION_KEY, 0) if state else 0
+        self._checked = time.monotonic()
+        self._reload_lock = threading.Lock()
+        self.registry = self._compile() or ToolRegistry({"mcpServers": {}})
+        self._seen_mtime = self.registry.mtime
+
+    @property
+    def config(self) -> dict:
+        return self.registry.config
+
+    def _mtime(self) -> float:
+        try:
+            return os.stat(self.config_path).st_mtime
+        except OSError:
+            return 0
+
+    def _compile(self) -> ToolRegistry | None:
+        """读取并编译配置，配置文件不合法时返回 None（保留旧的工具表）"""
+        mtime = self._mtime()
+        if not mtime:
+            return ToolRegistry({"mcpServers": {}})
+        try:
             with open(self.config_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return {"mcpServers": {}}
-    
+                return ToolRegistry(json.load(f), mtime)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[工具] 配置加载失败，继续使用当前工具表: {e}")
+            return None
+
+    def _swap(self):
+        """编译新工具表并整体替换，不影响正在执行的调用"""
+        with self._reload_lock:
+            registry = self._compile()
+            if registry is not None:
+                self.registry = registry
+                print(f"[工具] 已加载 {len(registry.tools)} 个工具")
+
     def reload(self):
-        """重新加载配置"""
-        self.config = self._load_config()
-    
+        """重新加载配置，并通知其他进程"""
+        if self.state is None:
+            self._swap()
+            return
+        with self.state.lock("tools"):
+            self._swap()
+            self.version = self.state.bump_version(CONFIG_VERSION_KEY)
+
+    def _refresh(self):
+        """配置文件被修改或其他进程重新加载过配置时自动刷新（每秒最多检查一次）"""
+        now = time.monotonic()
+        if now - self._checked < 1:
+            return
+        self._checked = now
+
+        mtime = self._mtime()
+        if mtime != self._seen_mtime:
+            # 编辑中途的不合法配置只提示一次，修好后再次保存会重新加载
+            self._seen_mtime = mtime
+            print("[工具] 配置文件已修改，重新加载")
+            self._swap()
+        if self.state is not None:
+            version = self.state.get_value(CONFIG_VERSION_KEY, 0)
+            if version != self.version:
+                print(f"[工具] 配置版本 {self.version} -> {version}，重新加载")
+                self._swap()
+                self.version = version
+
+    def ping(self, timeout: float = 3) -> dict:
+        """探测各 MCP 服务是否可达，返回 {服务名: 是否可达}"""
+        status = {}
+        for server_name, server_config in self.config.get("mcpServers", {}).items():
+            try:
+                if server_config.get("transport", HTTP) == INPROCESS:
+                    # 进程内服务：预先导入路由模块
+                    self._inprocess(server_name).load()
+                else:
+                    # 走连接池，顺带预先建立长连接
+                    self.pool.client(server_config["baseUrl"]).get("/", timeout=timeout)
+                status[server_name] = True
+            except (httpx.HTTPError, ImportError) as e:
+                print(f"[工具] MCP 服务 {server_name} 不可达: {e}")
+                status[server_name] = False
+        return status
+
+    # ========== 熔断 ==========
+
+    def _breaker(self, server_name: str) -> CircuitBreaker:
+        breaker = self.breakers.get(server_name)
+        if breaker is None:
+            with self._reload_lock:
+                breaker = self.breakers.get(server_name)
+                if breaker is None:
+                    breaker = CircuitBreaker(server_name, lambda: self.check_health(server_name), **self.breaker_settings)
+                    self.breakers[server_name] = breaker
+        return breaker
+
+    def check_health(self, server_name: str, timeout: float = 2) -> bool:
+        """请求服务的健康检查接口（默认 /health），返回是否健康"""
+        server_config = self.config.get("mcpServers", {}).get(server_name)
+        if server_config is None:
+            return False
+        if server_config.get("transport", HTTP) == INPROCESS:
+            return True
+        try:
+            resp = self.pool.client(server_config["baseUrl"]).get(
+                server_config.get("healthPath", "/health"), timeout=timeout
+            )
+            return resp.status_code == 200 and resp.json().get("status") == "ok"
+        except (httpx.HTTPError, ValueError):
+            return False
+
+    # ========== 传输 ==========
+
+    def _inprocess(self, server_name: str):
+        """进程内传输（按服务配置的 mcpserve 目录和模块缓存）"""
+        from inprocess import InProcessTransport
+
+        server_config = self.config["mcpServers"][server_name]
+        path = os.path.join(os.path.dirname(os.path.abspath(self.config_path)), server_config.get("path", "../mcpserve"))
+        modules = server_config.get("modules", ["system", "file", "folder"])
+        key = (server_name, os.path.normpath(path), tuple(modules))
+        transport = self.transports.get(key)
+        if transport is None:
+            with self._reload_lock:
+                transport = self.transports.get(key)
+                if transport is None:
+                    transport = InProcessTransport(path, modules)
+                    self.transports[key] = transport
+        return transport
+
+    def _sender(self, tool: dict):
+        """返回发送请求的函数，调用方式与 httpx.Client.request 相同"""
+        if tool["transport"] == INPROCESS:
+            return self._inprocess(tool["server"]).request
+        return self.pool.client(tool["base_url"]).request
+
+    def _unavailable(self, tool: dict) -> str:
+        breaker = self._breaker(tool["server"])
+        return json.dumps({
+            "error": f"工具服务 {tool['server']} 暂时不可用（{breaker.reason}），请稍后再试，不要重复调用",
+            "unavailable": True,
+        }, ensure_ascii=False)
+
+    def _record(self, tool: dict, elapsed_ms: float, ok: bool, breaker: bool = True):
+        """记录调用结果；breaker 为 False 时只计入连接池统计，不影响熔断"""
+        self.pool.record(tool["base_url"], elapsed_ms, ok)
+        if breaker:
+            self._breaker(tool["server"]).record(ok, elapsed_ms, tool["slow_ms"])
+
+    # ========== 工具调用 ==========
+
     def get_openai_tools(self) -> list | None:
-        """将 MCP 配置转换为 OpenAI tools 格式"""
-        tools = []
-        for server_config in self.config.get("mcpServers", {}).values():
-            for tool in server_config.get("tools", []):
-                tools.append({
-                    "type": "function",
-                    "function": {
-                        "name": tool["name"],
-                        "description": tool["description"],
-                        "parameters": {
-                            "type": "object",
-                            "properties": tool.get("parameters", {}),
-                            "required": list(tool.get("parameters", {}).keys())
-                        }
-                    }
-                })
-        return tools if tools else None
-    
-    def call_tool(self, tool_name: str, arguments: dict) -> str:
-        """调用 MCP 工具"""
-        for server_config in self.config.get("mcpServers", {}).values():
-            for tool in server_config.get("tools", []):
-                if tool["name"] == tool_name:
-                    base_url = server_config["baseUrl"]
-                    endpoint = tool["endpoint"]
-                    method = tool.get("method", "GET").upper()
-                    
+        """获取 OpenAI tools 格式的工具定义（按名称排序），熔断中的服务的工具不提供给模型"""
+        self._refresh()
+        registry = self.registry
+        down = {name for name in registry.config.get("mcpServers", {}) if not self._breaker(name).available()}
+        if down:
+            tools = [t for t in registry.openai_tools if registry.tools[t["function"]["name"]]["server"] not in down]
+        else:
+            tools = registry.openai_tools
+        return list(tools) if tools else None
+
+    def _prepare(self, tool_name: str, arguments: dict) -> tuple[dict | None, dict, str | None]:
+        """查找工具并校验参数，返回 (工具, 参数, 错误结果)"""
+        self._refresh()
+        tool = self.registry.tools.get(tool_name)
+        if tool is None:
+            return None, {}, json.dumps({"error": f"工具 {tool_name} 未找到"}, ensure_ascii=False)
+
+        arguments, error = ToolRegistry.validate(tool, arguments)
+        if error:
+            return None, {}, json.dumps({"error": f"参数错误: {error}"}, ensure_ascii=False)
+
+        if not self._breaker(tool["server"]).allow():
+            return None, {}, self._unavailable(tool)
+        return tool, arguments, None
+
+    @staticmethod
+    def _request_kwargs(tool: dict, arguments: dict) -> dict:
+        timeout = tool["timeout"]
+        kwargs = {"params": arguments} if tool["method"] in QUERY_METHODS else {"json": arguments}
+        kwargs["timeout"] = httpx.Timeout(timeout["read"], connect=timeout["connect"])
+        return kwargs
+
+    def streams(self, tool_name: str) -> bool:
+        """工具是否通过流式接口调用（调用期间会产生进度）"""
+        tool = self.registry.tools.get(tool_name)
+        return tool is not None and tool["stream_url"] is not None
+
+    def call_tool(self, tool_name: str, arguments: dict, cancel: CancelToken | None = None,
+                  on_progress=None) -> str:
+        """调用 MCP 工具，取消时不再等待并抛出 ChatCancelled；流式工具的进度通过 on_progress(dict) 回调"""
+        tool, arguments, error = self._prepare(tool_name, arguments)
+        if error:
+            return error
+        if tool["stream_url"] is not None:
+            return self._call_stream(tool, arguments, cancel, on_progress)
+
+        total = tool["timeout"]["total"]
+        started = time.perf_counter()
+        try:
+            # 取消时不再等待响应，连接在请求结束后自动回到连接池
+            resp = run_with_timeout(
+                cancel, total, self._sender(tool), tool["method"], tool["url"], **self._request_kwargs(tool, arguments)
+            )
+        except ChatCancelled:
+            raise
+        except TimeoutError:
+            self._record(tool, (time.perf_counter() - started) * 1000, False)
+            return json.dumps({"error": f"工具调用超时（{total} 秒）"}, ensure_ascii=False)
+        except Exception as e:
+            if cancel is not None and cancel.cancelled:
+                raise ChatCancelled()
+            self._record(tool, (time.perf_counter() - started) * 1000, False)
+            return json.dumps({"error": str(e)}, ensure_ascii=False)
+        return self._finish(tool, resp, started)
+
+    def _call_stream(self, tool: dict, arguments: dict, cancel: CancelToken | None, on_progress) -> str:
+        """
+        逐行读取 NDJSON 流式结果：start 行给出结果列表字段，item 行为结果，progress 行为进度，
+        end 行为结束。结果超过 max_results、超过总超时或取消时停止读取并关闭连接，服务端随之停止搜索，
+        已读到的结果照常返回
+        """
+        timeout = tool["timeout"]
+        limit = arguments.get("max_results")
+        deadline = time.monotonic() + timeout["total"]
+        envelope, items, key = {}, [], "results"
+        ended = False
+        expired = threading.Event()
+        started = time.perf_counter()
+        try:
+            with self.pool.client(tool["base_url"]).stream(
+                tool["method"], tool["stream_url"], json=arguments,
+                timeout=httpx.Timeout(timeout["read"], connect=timeout["connect"]),
+            ) as resp:
+                if resp.status_code != 200:
+                    resp.read()
+                    return self._finish(tool, resp, started)
+                with self._closing(resp, cancel, deadline, expired):
+                    for line in resp.iter_lines():
+                        if cancel is not None and cancel.cancelled:
+                            raise ChatCancelled()
+                        if not line:
+                            continue
+                        event = json.loads(line)
+                        kind = event.pop("type", "")
+                        if kind == "start":
+                            key = event.pop("key", key)
+                            envelope.update(event)
+                        elif kind == "item":
+                            if limit and len(items) >= limit:
+                                # 已经够数，不再等待服务端的 end 行
+                                break
+                            items.append(event["data"])
+                        elif kind == "progress":
+                            if on_progress is not None:
+                                on_progress(event)
+                        elif kind == "error":
+                            self._record(tool, (time.perf_counter() - started) * 1000, True)
+                            return json.dumps({"success": False, **event}, ensure_ascii=False)
+                        elif kind == "end":
+                            envelope.update(event)
+                            ended = True
+                            break
+                        if time.monotonic() >= deadline:
+                            break
+        except ChatCancelled:
+            raise
+        except (httpx.HTTPError, httpx.StreamError, ValueError) as e:
+            if cancel is not None and cancel.cancelled:
+                raise ChatCancelled()
+            if expired.is_set():
+                # 超过总超时被关闭，已读到的结果照常返回
+                self._record(tool, (time.perf_counter() - started) * 1000, True)
+                return self._stream_result(key, envelope, items, truncated=True)
+            self._record(tool, (time.perf_counter() - started) * 1000, False)
+            if items:
+                # 已经读到的结果仍然返回
+                return self._stream_result(key, envelope, items, truncated=True)
+            return json.dumps({"error": str(e)}, ensure_ascii=False)
+
+        self._record(tool, (time.perf_counter() - started) * 1000, True)
+        return self._stream_result(key, envelope, items, truncated=not ended)
+
+    @staticmethod
+    @contextmanager
+    def _closing(resp, cancel: CancelToken | None, deadline: float, expired: threading.Event):
+        """
+        读取流期间，取消或超过总超时时立即关闭响应：服务端在两行之间长时间没有输出时，
+        阻塞的读取也会中断，而不是等到读超时
+        """
+        lock = threading.Lock()
+        finished = False
+
+        def abort():
+            with lock:
+                # 读取已结束时连接可能已回到连接池，不能再关闭
+                if finished:
+                    return
+                # 另一个线程中阻塞的 recv 不会因 close 返回，先 shutdown 底层 socket 使其立即结束
+                stream = resp.extensions.get("network_stream")
+                sock = stream.get_extra_info("socket") if stream is not None else None
+                if sock is not None:
                     try:
-                        with httpx.Client(timeout=120) as client:
-                            if method == "GET":
-                                resp = client.get(f"{base_url}{endpoint}", params=arguments)
-                            else:
-                                resp = client.post(f"{base_url}{endpoint}", json=arguments)
-                            return json.dumps(resp.json(), ensure_ascii=False)
-                    except Exception as e:
-                        return json.dumps({"error": str(e)}, ensure_ascii=False)
-        
-        return json.dumps({"error": f"工具 {tool_name} 未找到"}, ensure_ascii=False)
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+            resp.close()
+
+        def on_deadline():
+            expired.set()
+            abort()
+
+        timer = threading.Timer(max(deadline - time.monotonic(), 0), on_deadline)
+        timer.daemon = True
+        timer.start()
+        if cancel is not None:
+            cancel.on_cancel(abort)
+        try:
+            yield
+        finally:
+            with lock:
+                finished = True
+            timer.cancel()
+            if cancel is not None:
+                cancel.remove_callback(abort)
+
+    @staticmethod
+    def _stream_result(key: str, envelope: dict, items: list, truncated: bool) -> str:
+        """组装与非流式接口相同格式的结果；提前停止读取时标记 truncated 且没有续查标记"""
+        result = {"success": True, "count": len(items), key: items, **envelope}
+        if truncated:
+            result.update(truncated=True, cursor=envelope.get("cursor", ""))
+        return json.dumps(result, ensure_ascii=False)
+
+    async def acall_tool(self, tool_name: str, arguments: dict) -> str:
+        """异步调用 MCP 工具，供事件循环中的调用方使用"""
+        tool, arguments, error = self._prepare(tool_name, arguments)
+        if error:
+            return error
+
+        total = tool["timeout"]["total"]
+        kwargs = self._request_kwargs(tool, arguments)
+        if tool["transport"] == INPROCESS:
+            # 路由函数中有阻塞操作，放到线程中执行，不阻塞事件循环
+            request = asyncio.to_thread(self._sender(tool), tool["method"], tool["url"], **kwargs)
+        else:
+            request = self.pool.async_client(tool["base_url"]).request(tool["method"], tool["url"], **kwargs)
+        started = time.perf_counter()
+        try:
+            resp = await asyncio.wait_for(request, total)
+        except asyncio.TimeoutError:
+            self._record(tool, (time.perf_counter() - started) * 1000, False)
+            return json.dumps({"error": f"工具调用超时（{total} 秒）"}, ensure_ascii=False)
+        except Exception as e:
+            self._record(tool, (time.perf_counter() - started) * 1000, False)
+            return json.dumps({"error": str(e)}, ensure_ascii=False)
+        return self._finish(tool, resp, started)
+
+    def _finish(self, tool: dict, resp, started: float) -> str:
+        """
+        记录调用结果并返回工具结果 JSON。
+        5xx 计为服务故障；503 是 mcpserve 线程池排队已满时的主动拒绝，服务本身正常，不计入熔断
+        """
+        status = resp.status_code
+        self._record(tool, (time.perf_counter() - started) * 1000, status < 500, breaker=status != 503)
+        try:
+            return json.dumps(resp.json(), ensure_ascii=False)
+        except ValueError:
+            return json.dumps({"error": f"工具返回格式错误（HTTP {resp.status_code}）"}, ensure_ascii=False)
+
+    def get_stats(self) -> dict:
+        """连接池与熔断统计"""
+        return {
+            **self.pool.get_stats(),
+            "breakers": {name: breaker.status() for name, breaker in self.breakers.items()},
+        }
@@ -1,6 +1,7 @@
 """记忆系统模块"""
 import sqlite3
 import json
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
@@ -9,16 +10,33 @@ from typing import Optional
 DB_PATH = Path(__file__).parent / "memory.db"
 
 
-def get_db():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH)
+_db_ready = False
+_db_lock = threading.Lock()
+
+
+def _connect():
+    # 多个 worker 进程并发访问时等待锁而不是报错
+    conn = sqlite3.connect(DB_PATH, timeout=10)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def get_db():
+    """获取数据库连接，首次使用时才初始化数据库"""
+    global _db_ready
+    if not _db_ready:
+        with _db_lock:
+            if not _db_ready:
+                init_db()
+                _db_ready = True
+    return _connect()
+
+
 def init_db():
     """初始化数据库"""
-    conn = get_db()
+    conn = _connect()
+    # WAL 模式下读写互不阻塞，适合多进程部署
+    conn.execute("PRAGMA journal_mode=WAL")
     cursor = conn.cursor()
     
     # 长期记忆表
@@ -58,9 +76,6 @@ def init_db():
 class MemoryManager:
     """记忆管理器"""
     
-    def __init__(self):
-        init_db()
-    
     # ========== 长期记忆 ==========
     
     def save_memory(self, content: str, memory_type: str = "fact", 
@@ -212,30 +227,34 @@ class MemoryManager:
     
     # ========== 记忆上下文 ==========
     
-    def get_memory_context(self, user_message: str) -> str:
-        """获取记忆上下文（用于增强 system prompt）"""
+    def get_profile_context(self) -> str:
+        """用户档案上下文（名字、好感度），变化很少，放在提示词的固定前缀中"""
         parts = []
-        
-        # 用户档案
         profile = self.get_user_profile()
         if profile.get("nickname"):
             parts.append(f"主人的名字是「{profile['nickname']}」")
         if profile.get("affection"):
             level = self._affection_level(profile["affection"])
             parts.append(f"你对主人的好感度：{level}")
-        
-        # 相关记忆
+        return "\n".join(parts)
+    
+    def get_recall_context(self, user_message: str) -> str:
+        """与本轮消息相关的记忆，每轮都可能变化"""
         memories = self.search_memories(user_message, limit=3)
         
         # 如果没有匹配到，获取最近的重要记忆
         if not memories:
             memories = self.get_recent_memories(limit=3)
         
-        if memories:
-            memory_texts = [f"- {m['content']}" for m in memories]
-            parts.append("你记得的事情：\n" + "\n".join(memory_texts))
-        
-        return "\n".join(parts) if parts else ""
+        if not memories:
+            return ""
+        memory_texts = [f"- {m['content']}" for m in memories]
+        return "你记得的事情：\n" + "\n".join(memory_texts)
+    
+    def get_memory_context(self, user_message: str) -> str:
+        """获取记忆上下文（档案 + 相关记忆）"""
+        parts = [self.get_profile_context(), self.get_recall_context(user_message)]
+        return "\n".join(p for p in parts if p)
     
     def get_recent_memories(self, limit: int = 3) -> list:
         """获取最近的记忆"""
@@ -286,19 +305,20 @@ EXTRACT_PROMPT = """分析以下对话，提取值得记住的用户信息。
 只返回 JSON，不要其他内容。"""
 
 
-def extract_memory(client, model: str, user_message: str, assistant_reply: str) -> dict | None:
-    """使用 LLM 提取记忆"""
+def extract_memory(llm, user_message: str, assistant_reply: str,
+                   endpoint: str = "/chat", session_id: str = "default") -> dict | None:
+    """使用 LLM 提取记忆（extraction 模型）"""
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{
-                "role": "user",
-                "content": EXTRACT_PROMPT.format(
-                    user_message=user_message,
-                    assistant_reply=assistant_reply
-                )
-            }],
-            max_tokens=200,
+        messages = [{
+            "role": "user",
+            "content": EXTRACT_PROMPT.format(
+                user_message=user_message,
+                assistant_reply=assistant_reply
+            )
+        }]
+        response = llm.complete(
+            "extraction", messages,
+            usage_tags={"endpoint": endpoint, "session_id": session_id},
         )
         
         import json
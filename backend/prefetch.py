@@ -0,0 +1,108 @@
+"""预取模块 - 用户还在输入时提前完成记忆检索、预热缓存和上游连接"""
+import difflib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cancel import CancelToken, ChatCancelled
+from state import StateStore
+
+# 输入太短时检索结果没有参考价值
+MIN_CHARS = 2
+
+
+class Prefetcher:
+    """
+    按会话预取：每次输入变化时取消上一次未完成的预取，结果写入共享状态库，
+    正式消息与预取时的输入足够接近时直接复用，否则重新检索
+    """
+
+    def __init__(self, store: StateStore, prepare, min_interval: float = 0.5,
+                 ttl: float = 30, min_similarity: float = 0.8):
+        """prepare(text, cancel) -> dict，执行实际的预取工作"""
+        self.store = store
+        self.prepare = prepare
+        self.min_interval = min_interval
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._last_submit = {}
+        self.stats = {"submitted": 0, "throttled": 0, "cancelled": 0, "completed": 0, "hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"prefetch:{session_id}"
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def submit(self, session_id: str, text: str) -> str:
+        """提交一次预取，返回 scheduled / throttled / ignored"""
+        text = text.strip()
+        if len(text) < MIN_CHARS:
+            return "ignored"
+
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_submit.get(session_id, 0) < self.min_interval:
+                self.stats["throttled"] += 1
+                return "throttled"
+            self._last_submit[session_id] = now
+            previous = self._inflight.get(session_id)
+            cancel = CancelToken()
+            self._inflight[session_id] = cancel
+            self.stats["submitted"] += 1
+
+        # 输入已经变化，上一次的预取没有意义了
+        if previous is not None:
+            previous.cancel()
+        self._executor.submit(self._run, session_id, text, cancel)
+        return "scheduled"
+
+    def _run(self, session_id: str, text: str, cancel: CancelToken):
+        try:
+            cancel.raise_if_cancelled()
+            data = self.prepare(text, cancel)
+            cancel.raise_if_cancelled()
+            self.store.set_value(self._key(session_id), {"text": text, "data": data, "at": time.time()})
+            self._count("completed")
+        except ChatCancelled:
+            self._count("cancelled")
+        except Exception as e:
+            print(f"[预取] 失败: {e}")
+        finally:
+            with self._lock:
+                if self._inflight.get(session_id) is cancel:
+                    del self._inflight[session_id]
+
+    def cancel(self, session_id: str):
+        """取消会话中未完成的预取"""
+        with self._lock:
+            cancel = self._inflight.pop(session_id, None)
+        if cancel is not None:
+            cancel.cancel()
+
+    def take(self, session_id: str, message: str) -> dict | None:
+        """正式消息到达时取出预取结果，输入差异过大或已过期时返回 None"""
+        self.cancel(session_id)
+        entry = self.store.get_value(self._key(session_id))
+        if entry:
+            self.store.set_value(self._key(session_id), None)
+
+        matched = (
+            entry is not None
+            and time.time() - entry["at"] <= self.ttl
+            and difflib.SequenceMatcher(None, entry["text"], message.strip()).ratio() >= self.min_similarity
+        )
+        self._count("hits" if matched else "misses")
+        return entry["data"] if matched else None
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        taken = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / taken, 3) if taken else 0
+        return stats
@@ -0,0 +1,31 @@
+"""提示词组装模块 - 按稳定程度排列提示词内容，让模型服务的前缀缓存尽量命中"""
+
+# 分隔标记，usage.profile_prompt 据此把记忆部分单独计数
+PROFILE_MARKER = "【主人档案】"
+MEMORY_MARKER = "【记忆信息】"
+
+
+def build_system_message(persona: str, profile_context: str) -> dict:
+    """固定人设 + 主人档案（只有改名、好感度变化时才会变）"""
+    if profile_context:
+        return {"role": "system", "content": f"{persona}\n\n{PROFILE_MARKER}\n{profile_context}"}
+    return {"role": "system", "content": persona}
+
+
+def assemble_messages(persona: str, profile_context: str, history: list, recall_context: str) -> list:
+    """
+    按从稳定到易变的顺序组装消息：
+
+    人设 → 主人档案 → 历史对话（只追加）→ 本轮相关记忆 → 最新用户消息
+
+    每轮都会变化的相关记忆放在最新用户消息之前，前面的部分在相邻两轮之间保持不变，
+    可以命中 OpenAI 兼容服务的前缀缓存。工具定义按名称排序，同样保持稳定
+    """
+    messages = [build_system_message(persona, profile_context), *history]
+    if recall_context:
+        recall = {"role": "system", "content": f"{MEMORY_MARKER}\n{recall_context}"}
+        if history and history[-1]["role"] == "user":
+            messages.insert(len(messages) - 1, recall)
+        else:
+            messages.append(recall)
+    return messages
@@ -1,16 +1,27 @@
 """API 路由模块"""
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+import asyncio
+import json
+import time
+
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import iterate_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 from config import OPENAI_API_KEY
+from cancel import CancelToken
 import services
+from warmup import warmup_state
 
 router = APIRouter()
 
+# 流式响应中检查客户端是否断开的最小间隔（秒），避免每个 token 都轮询一次连接
+DISCONNECT_CHECK_INTERVAL = 0.5
+
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: str = "default"
 
 
 class ChatResponse(BaseModel):
@@ -37,6 +48,12 @@ async def root():
     return {"message": "三月七桌宠 API 运行中~"}
 
 
+@router.post("/chat/prefetch")
+async def chat_prefetch(request: ChatRequest):
+    """输入过程中的预取：提前检索记忆、预热连接，正式发送时复用"""
+    return {"status": services.prefetch(request.message, request.session_id)}
+
+
 @router.post("/chat")
 async def chat(request: ChatRequest):
     """普通聊天接口"""
@@ -44,27 +61,50 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=500, detail="OpenAI API Key 未配置")
     
     try:
-        reply = services.chat(request.message)
+        reply = services.chat(request.message, request.session_id)
         return ChatResponse(reply=reply)
     except Exception as e:
         print(f"[错误]: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def format_sse(item) -> str:
+    """文本片段编码为普通 data 行，进度事件编码为带 event 类型的 JSON"""
+    if isinstance(item, dict):
+        return f"event: {item['type']}\ndata: {json.dumps(item, ensure_ascii=False)}\n\n"
+    return f"data: {item}\n\n"
+
+
 @router.post("/chat/stream")
-async def chat_stream(request: ChatRequest):
-    """流式聊天接口"""
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """流式聊天接口，客户端断开时取消上游生成和工具调用"""
     if not OPENAI_API_KEY:
         raise HTTPException(status_code=500, detail="OpenAI API Key 未配置")
     
+    cancel = CancelToken()
+    
     async def generate():
         try:
-            for content in services.chat_stream(request.message):
-                yield f"data: {content}\n\n"
+            # 在线程池中迭代，工具调用阻塞时事件循环仍可及时推送进度事件
+            stream = services.chat_stream(request.message, request.session_id, cancel)
+            checked = time.monotonic()
+            async for item in iterate_in_threadpool(stream):
+                if cancel.cancelled:
+                    continue
+                if time.monotonic() - checked >= DISCONNECT_CHECK_INTERVAL:
+                    checked = time.monotonic()
+                    if await http_request.is_disconnected():
+                        print("\n[客户端已断开]")
+                        cancel.cancel()
+                        continue
+                yield format_sse(item)
             yield "data: [DONE]\n\n"
         except Exception as e:
             print(f"\n[错误]: {str(e)}")
             yield f"data: [ERROR] {str(e)}\n\n"
+        finally:
+            # 响应被中止（客户端断开）时也要通知后台停止
+            cancel.cancel()
     
     return StreamingResponse(
         generate(),
@@ -73,10 +113,66 @@ async def chat_stream(request: ChatRequest):
     )
 
 
+@router.websocket("/chat/ws")
+async def chat_ws(websocket: WebSocket):
+    """
+    WebSocket 聊天接口
+    
+    客户端发送 {"type": "chat", "message": "...", "session_id": "..."} 开始对话，
+    发送 {"type": "cancel"} 取消当前回复；新消息会抢占仍在生成的旧回复。
+    服务端推送 {"type": "token", "content": "..."}、进度事件，
+    以及结束时的 done / cancelled / error
+    """
+    await websocket.accept()
+    current = None  # (task, cancel)
+    
+    async def run_chat(message: str, session_id: str, cancel: CancelToken):
+        try:
+            stream = services.chat_stream(message, session_id, cancel, endpoint="/chat/ws")
+            async for item in iterate_in_threadpool(stream):
+                # 取消后继续消费到生成器结束，让它记录已输出的部分，但不再推送
+                if cancel.cancelled:
+                    continue
+                await websocket.send_json(item if isinstance(item, dict) else {"type": "token", "content": item})
+            await websocket.send_json({"type": "cancelled" if cancel.cancelled else "done"})
+        except WebSocketDisconnect:
+            cancel.cancel()
+        except Exception as e:
+            print(f"\n[错误]: {str(e)}")
+            if not cancel.cancelled:
+                await websocket.send_json({"type": "error", "message": str(e)})
+    
+    async def stop_current():
+        if current is not None:
+            task, cancel = current
+            cancel.cancel()
+            await task
+    
+    try:
+        while True:
+            data = await websocket.receive_json()
+            if data.get("type") == "cancel":
+                await stop_current()
+                current = None
+            elif data.get("type") == "chat":
+                if not OPENAI_API_KEY:
+                    await websocket.send_json({"type": "error", "message": "OpenAI API Key 未配置"})
+                    continue
+                await stop_current()
+                cancel = CancelToken()
+                task = asyncio.create_task(run_chat(data.get("message", ""), data.get("session_id", "default"), cancel))
+                current = (task, cancel)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if current is not None:
+            current[1].cancel()
+
+
 @router.delete("/chat/history")
-async def clear_history():
-    """清空对话历史"""
-    services.clear_history()
+async def clear_history(session_id: str | None = None):
+    """清空对话历史，不指定 session_id 时清空全部会话"""
+    services.clear_history(session_id)
     return {"message": "对话历史已清空"}
 
 
@@ -93,6 +189,34 @@ async def reload_tools():
     return {"message": "工具配置已重新加载", "tools": tools}
 
 
+# ========== 用量统计 API ==========
+
+@router.get("/usage")
+async def get_usage():
+    """获取 token 用量统计"""
+    return services.get_usage()
+
+
+@router.delete("/usage")
+async def reset_usage():
+    """清空 token 用量统计"""
+    services.reset_usage()
+    return {"message": "用量统计已清空"}
+
+
+@router.get("/ready")
+async def ready():
+    """就绪探针：后台预热完成前返回 503"""
+    status = warmup_state.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """运行指标"""
+    return services.get_metrics()
+
+
 # ========== 记忆系统 API ==========
 
 @router.get("/memory")
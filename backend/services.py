@@ -1,107 +1,318 @@
 """业务服务模块"""
-from openai import OpenAI
+import os
+import threading
+import time
 
-from config import OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_MODEL, SYSTEM_PROMPT
-from mcp_tools import MCPToolManager
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_MODEL, OPENAI_TIMEOUT, OPENAI_STREAM_USAGE, MODEL_ROLES, SYSTEM_PROMPT,
+    TOOL_ROUTER_ENABLED, TOOL_ROUTER_TOP_K, TOOL_ROUTER_MIN_SCORE, FAST_PATH_ENABLED, MCPSERVE_DIR,
+    TOOL_RESULT_MAX_CHARS, TOOL_RESULT_PAGE_CHARS, TOOL_RESULT_TTL,
+    PREFETCH_ENABLED, PREFETCH_MIN_INTERVAL, PREFETCH_TTL, PREFETCH_MIN_SIMILARITY,
+    MCP_POOL_MAX_CONNECTIONS, MCP_POOL_MAX_KEEPALIVE, MCP_POOL_KEEPALIVE_EXPIRY, MCP_HTTP2,
+    MCP_BREAKER_FAILURES, MCP_BREAKER_SLOW_MS, MCP_BREAKER_COOLDOWN,
+)
+from mcp_tools import MCPToolManager, ConnectionPool
+from tool_router import ToolRouter
+from tool_results import ToolResultStore
 from agent import Agent
+from llm import LLMRouter
+from cancel import CancelToken, ChatCancelled
+from intent import IntentMatcher, load_app_tables
 from memory import memory_manager, extract_memory
+from prompt import assemble_messages
+from prefetch import Prefetcher
+from usage import usage_tracker, profile_tools
+from state import state_store
+from warmup import warmup_state
 
-# 初始化
-client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
-tool_manager = MCPToolManager()
-agent = Agent(client, tool_manager)
+# ========== 延迟初始化 ==========
+# 重量级组件在第一次使用（或后台预热）时才创建，进程启动不再等待它们
 
-# 对话历史
-conversation_history = []
+_init_lock = threading.RLock()
+_UNSET = object()
 
 
-def build_system_prompt(user_message: str) -> str:
-    """构建带记忆的系统提示词"""
-    memory_context = memory_manager.get_memory_context(user_message)
-    if memory_context:
-        return f"{SYSTEM_PROMPT}\n\n【记忆信息】\n{memory_context}"
-    return SYSTEM_PROMPT
+def _lazy(factory):
+    """包装为首次调用时才构建的单例"""
+    instance = _UNSET
+    
+    def get():
+        nonlocal instance
+        if instance is _UNSET:
+            with _init_lock:
+                if instance is _UNSET:
+                    instance = factory()
+        return instance
+    
+    get.__doc__ = factory.__doc__
+    # 已创建时返回实例，否则返回 None（关闭时不会为了释放资源而创建组件）
+    get.peek = lambda: None if instance is _UNSET else instance
+    return get
+
+
+@_lazy
+def get_llm() -> LLMRouter:
+    """LLM 调用（首次使用时才导入 openai 并创建客户端）"""
+    from openai import OpenAI
+    client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+    return LLMRouter(client, MODEL_ROLES, OPENAI_MODEL, OPENAI_TIMEOUT, OPENAI_STREAM_USAGE)
+
+
+@_lazy
+def get_tool_manager() -> MCPToolManager:
+    """MCP 工具管理器"""
+    pool = ConnectionPool(MCP_POOL_MAX_CONNECTIONS, MCP_POOL_MAX_KEEPALIVE, MCP_POOL_KEEPALIVE_EXPIRY, MCP_HTTP2)
+    breaker_settings = {
+        "failure_threshold": MCP_BREAKER_FAILURES,
+        "slow_ms": MCP_BREAKER_SLOW_MS,
+        "cooldown": MCP_BREAKER_COOLDOWN,
+    }
+    return MCPToolManager(state=state_store, pool=pool, breaker_settings=breaker_settings)
+
+
+@_lazy
+def get_tool_router() -> ToolRouter | None:
+    """工具路由，未启用时为 None"""
+    return ToolRouter(TOOL_ROUTER_TOP_K, TOOL_ROUTER_MIN_SCORE) if TOOL_ROUTER_ENABLED else None
+
+
+@_lazy
+def get_tool_results() -> ToolResultStore | None:
+    """工具结果预算，未启用时为 None"""
+    if TOOL_RESULT_MAX_CHARS <= 0:
+        return None
+    return ToolResultStore(state_store, TOOL_RESULT_MAX_CHARS, TOOL_RESULT_PAGE_CHARS, TOOL_RESULT_TTL)
+
+
+@_lazy
+def get_agent() -> Agent:
+    """Agent"""
+    return Agent(get_llm(), get_tool_manager(), get_tool_router(), get_tool_results())
+
+
+@_lazy
+def get_intent_matcher() -> IntentMatcher | None:
+    """本地意图快速通道，未启用时为 None"""
+    if not FAST_PATH_ENABLED:
+        return None
+    return IntentMatcher(get_tool_manager(), *load_app_tables(MCPSERVE_DIR))
+
+
+def _prepare_prefetch(text: str, cancel: CancelToken) -> dict:
+    """预取：读取档案、检索相关记忆，并顺带预热工具索引和模型连接"""
+    profile = memory_manager.get_profile_context()
+    cancel.raise_if_cancelled()
+    recall = memory_manager.get_recall_context(text)
+    cancel.raise_if_cancelled()
+    tools = get_tool_manager().get_openai_tools()
+    tool_router = get_tool_router()
+    if tool_router and tools:
+        tool_router.score(tools, [])
+    get_llm().keep_warm()
+    return {"profile": profile, "recall": recall}
+
+
+@_lazy
+def get_prefetcher() -> Prefetcher | None:
+    """输入预取，未启用时为 None"""
+    if not PREFETCH_ENABLED:
+        return None
+    return Prefetcher(state_store, _prepare_prefetch, PREFETCH_MIN_INTERVAL, PREFETCH_TTL, PREFETCH_MIN_SIMILARITY)
+
+
+# 对话历史保存在共享状态库中，按会话区分，每个会话至少保留最近 20 条。
+# 历史增长到 2 倍后一次裁剪回 20 条，而不是每轮滑动丢弃最早的一条，
+# 这样在两次裁剪之间发送给模型的消息前缀保持不变，可以命中服务端的前缀缓存
+MAX_HISTORY = 20
+
+
+def build_messages(session_id: str, user_message: str) -> list:
+    """按稳定前缀顺序组装本轮发送给模型的消息，优先复用输入时预取的记忆"""
+    prefetcher = get_prefetcher()
+    prefetched = prefetcher.take(session_id, user_message) if prefetcher else None
+    if prefetched:
+        profile, recall = prefetched["profile"], prefetched["recall"]
+    else:
+        profile = memory_manager.get_profile_context()
+        recall = memory_manager.get_recall_context(user_message)
+    return assemble_messages(SYSTEM_PROMPT, profile, state_store.get_history(session_id, MAX_HISTORY * 2), recall)
+
+
+def prefetch(text: str, session_id: str = "default") -> str:
+    """用户输入过程中的预取请求"""
+    prefetcher = get_prefetcher()
+    return prefetcher.submit(session_id, text) if prefetcher else "disabled"
 
 
 def log_chat(role: str, content: str):
     print(f"[{role}]: {content}")
 
 
-def chat(message: str) -> str:
+def chat(message: str, session_id: str = "default") -> str:
     """普通聊天"""
     log_chat("用户", message)
-    conversation_history.append({"role": "user", "content": message})
+    state_store.append_history(session_id, "user", message, MAX_HISTORY)
     memory_manager.record_chat()
     
-    while len(conversation_history) > 20:
-        conversation_history.pop(0)
+    # 简单指令走本地快速通道
+    intent_matcher = get_intent_matcher()
+    fast = intent_matcher.handle(message) if intent_matcher else None
+    if fast:
+        reply = fast[1]
+        state_store.append_history(session_id, "assistant", reply, MAX_HISTORY)
+        log_chat("三月七", reply)
+        return reply
     
-    system_prompt = build_system_prompt(message)
-    messages = [{"role": "system", "content": system_prompt}, *conversation_history]
-    reply = agent.run(OPENAI_MODEL, messages)
+    messages = build_messages(session_id, message)
+    reply = get_agent().run(messages, endpoint="/chat", session_id=session_id)
     
-    conversation_history.append({"role": "assistant", "content": reply})
+    state_store.append_history(session_id, "assistant", reply, MAX_HISTORY)
     log_chat("三月七", reply)
     
     # 异步提取记忆
-    extract_memory(client, OPENAI_MODEL, message, reply)
+    extract_memory(get_llm(), message, reply, endpoint="/chat", session_id=session_id)
     
     return reply
 
 
-def chat_stream(message: str):
-    """流式聊天，返回生成器"""
+def chat_stream(message: str, session_id: str = "default", cancel: CancelToken | None = None,
+                endpoint: str = "/chat/stream"):
+    """
+    流式聊天，返回生成器
+    
+    产出 str 为回复文本片段，产出 dict 为进度事件（round_start、tool_start、
+    tool_end、thinking_done、fast_path、first_token），由路由层编码为带类型的 SSE 事件。
+    cancel 被触发时停止上游生成和工具调用，历史只记录已输出的部分，且不提取记忆
+    """
+    started = time.perf_counter()
     log_chat("用户", message)
-    conversation_history.append({"role": "user", "content": message})
+    state_store.append_history(session_id, "user", message, MAX_HISTORY)
     memory_manager.record_chat()
     
-    while len(conversation_history) > 20:
-        conversation_history.pop(0)
-    
-    system_prompt = build_system_prompt(message)
-    messages = [{"role": "system", "content": system_prompt}, *conversation_history]
-    
-    # Agent 处理工具调用
-    messages, tool_called = agent.run_until_ready_for_stream(OPENAI_MODEL, messages)
+    # 简单指令走本地快速通道
+    intent_matcher = get_intent_matcher()
+    fast = intent_matcher.handle(message) if intent_matcher else None
+    if fast:
+        intent, reply = fast
+        yield {"type": "fast_path", "intent": intent}
+        yield {"type": "first_token", "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+        yield reply
+        state_store.append_history(session_id, "assistant", reply, MAX_HISTORY)
+        log_chat("三月七", reply)
+        return
     
-    if tool_called:
-        yield "[思考完成]"
+    messages = build_messages(session_id, message)
+    usage_tags = {"endpoint": endpoint, "session_id": session_id}
     
-    # 流式生成
-    stream = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=messages,
-        max_tokens=200,
-        stream=True,
-    )
-
     full_reply = ""
-    print("[三月七]: ", end="", flush=True)
-    for chunk in stream:
-        if chunk.choices[0].delta.content:
-            content = chunk.choices[0].delta.content
+    try:
+        # Agent 处理工具调用，边执行边推送进度
+        messages, tool_called = yield from get_agent().iter_until_ready_for_stream(
+            messages, endpoint=endpoint, session_id=session_id, cancel=cancel
+        )
+        
+        if tool_called:
+            yield {"type": "thinking_done"}
+        
+        # 流式生成
+        print("[三月七]: ", end="", flush=True)
+        for content in get_llm().stream("reply", messages, usage_tags, cancel):
+            if not full_reply:
+                elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+                usage_tracker.record_ttft(endpoint, elapsed_ms)
+                yield {"type": "first_token", "elapsed_ms": elapsed_ms}
             full_reply += content
             print(content, end="", flush=True)
             yield content
-    print()
+        print()
+    except (ChatCancelled, GeneratorExit):
+        print("\n[已取消]")
+        if full_reply:
+            state_store.append_history(session_id, "assistant", full_reply, MAX_HISTORY)
+        return
     
-    conversation_history.append({"role": "assistant", "content": full_reply})
+    state_store.append_history(session_id, "assistant", full_reply, MAX_HISTORY)
     
     # 提取记忆
-    extract_memory(client, OPENAI_MODEL, message, full_reply)
+    extract_memory(get_llm(), message, full_reply, endpoint=endpoint, session_id=session_id)
 
 
-def clear_history():
-    """清空对话历史"""
-    conversation_history.clear()
+def clear_history(session_id: str | None = None):
+    """清空对话历史，不指定会话时清空全部"""
+    state_store.clear_history(session_id)
 
 
 def get_tools():
     """获取所有工具"""
-    return tool_manager.get_openai_tools()
+    return get_tool_manager().get_openai_tools()
 
 
 def reload_tools():
     """重新加载工具"""
-    tool_manager.reload()
-    return tool_manager.get_openai_tools()
+    get_tool_manager().reload()
+    return get_tool_manager().get_openai_tools()
+
+
+def get_usage() -> dict:
+    """获取 token 用量统计，附带每个工具定义的 token 估算"""
+    return {
+        **usage_tracker.summary(),
+        "tool_schemas": profile_tools(get_tool_manager().get_openai_tools()),
+    }
+
+
+def reset_usage():
+    """清空 token 用量统计"""
+    usage_tracker.reset()
+
+
+def get_metrics() -> dict:
+    """运行指标汇总"""
+    tool_router = get_tool_router()
+    intent_matcher = get_intent_matcher()
+    tool_results = get_tool_results()
+    prefetcher = get_prefetcher()
+    return {
+        "pid": os.getpid(),
+        "usage": usage_tracker.totals(),
+        "tool_router": tool_router.get_stats() if tool_router else None,
+        "fast_path": intent_matcher.get_stats() if intent_matcher else None,
+        "tool_results": tool_results.get_stats() if tool_results else None,
+        "prefetch": prefetcher.get_stats() if prefetcher else None,
+        "mcp_pool": get_tool_manager().get_stats(),
+        "models": get_llm().get_stats(),
+        "warmup": warmup_state.status(),
+    }
+
+
+# ========== 启动预热 ==========
+
+def warm_up_steps() -> list:
+    """后台预热步骤：提前建立连接、构建工具定义、读取数据库页"""
+    def tool_schemas():
+        tools = get_tool_manager().get_openai_tools()
+        tool_router = get_tool_router()
+        if tool_router and tools:
+            tool_router.score(tools, [])  # 构建关键词索引
+    
+    return [
+        ("state_db", lambda: state_store.get_history("default", MAX_HISTORY * 2)),
+        ("memory_db", lambda: (memory_manager.get_user_profile(), memory_manager.get_recent_memories())),
+        ("tool_schemas", tool_schemas),
+        ("intent_tables", get_intent_matcher),
+        ("agent", get_agent),
+        ("llm_connection", lambda: get_llm().warm_up()),
+        ("mcp_servers", lambda: get_tool_manager().ping()),
+    ]
+
+
+async def shutdown():
+    """应用关闭时释放 MCP 连接池中的连接"""
+    manager = get_tool_manager.peek()
+    if manager is not None:
+        await manager.pool.aclose()
+
+
+def start_warm_up(process_started: float):
+    """启动后台预热线程"""
+    warmup_state.start(warm_up_steps(), process_started)
@@ -0,0 +1,252 @@
+"""共享状态模块 - 多进程（uvicorn --workers N）共用的会话历史、版本号和计数器"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# 数据库路径
+STATE_DB_PATH = Path(os.getenv("STATE_DB_PATH", str(Path(__file__).parent / "state.db")))
+
+
+class FileLock:
+    """跨进程文件锁（Windows 用 msvcrt，其余平台用 fcntl）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._thread_lock = threading.Lock()
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        else:
+            import fcntl
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def release(self):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        finally:
+            self._fd = None
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class StateStore:
+    """基于 SQLite WAL 的共享状态，每个线程复用一个连接"""
+
+    def __init__(self, db_path: Path = STATE_DB_PATH):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        # 同名的文件锁共用一个实例，其中的线程锁才能在本进程的线程之间互斥
+        self._file_locks = {}
+        self._file_locks_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._ensure_schema(conn)
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        """首次连接时建表（延迟到第一次使用，不拖慢进程启动）"""
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if not self._schema_ready:
+                with self.lock("schema"):
+                    self._init_db(conn)
+                self._schema_ready = True
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _init_db(self, conn: sqlite3.Connection):
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_session ON history (session_id, id);
+
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS counters (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value INTEGER DEFAULT 0,
+                PRIMARY KEY (scope, key, field)
+            );
+
+            CREATE TABLE IF NOT EXISTS tool_results (
+                handle TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                content TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+
+    def lock(self, name: str) -> FileLock:
+        """按名称获取跨进程文件锁（同一名称返回同一实例，也在线程之间互斥）"""
+        with self._file_locks_lock:
+            lock = self._file_locks.get(name)
+            if lock is None:
+                lock = FileLock(f"{self.db_path}.{name}.lock")
+                self._file_locks[name] = lock
+            return lock
+
+    # ========== 会话历史 ==========
+
+    def append_history(self, session_id: str, role: str, content: str, keep: int = 20):
+        """
+        追加一条历史；超过 2 * keep 条时一次裁剪到最近 keep 条。
+        按大步长裁剪，两次裁剪之间历史只增不减，已有消息组成的前缀保持不变
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO history (session_id, role, content) VALUES (?, ?, ?)",
+                (session_id, role, content)
+            )
+            count = conn.execute("SELECT COUNT(*) FROM history WHERE session_id = ?", (session_id,)).fetchone()[0]
+            if count <= 2 * keep:
+                return
+            conn.execute("""
+                DELETE FROM history WHERE session_id = ? AND id NOT IN (
+                    SELECT id FROM history WHERE session_id = ? ORDER BY id DESC LIMIT ?
+                )
+            """, (session_id, session_id, keep))
+
+    def get_history(self, session_id: str, limit: int = 20) -> list:
+        """获取会话历史（OpenAI messages 格式，按时间顺序）"""
+        rows = self._conn().execute(
+            "SELECT role, content FROM history WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, limit)
+        ).fetchall()
+        return [{"role": row["role"], "content": row["content"]} for row in reversed(rows)]
+
+    def clear_history(self, session_id: str | None = None):
+        """清空指定会话的历史，不指定时清空全部"""
+        if session_id is None:
+            self._conn().execute("DELETE FROM history")
+        else:
+            self._conn().execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+
+    # ========== 键值与版本号 ==========
+
+    def get_value(self, key: str, default=None):
+        row = self._conn().execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return json.loads(row["value"]) if row else default
+
+    def set_value(self, key: str, value):
+        self._conn().execute(
+            "INSERT INTO kv (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value, ensure_ascii=False))
+        )
+
+    def bump_version(self, key: str) -> int:
+        """版本号加一并返回新版本，用于通知其他进程刷新缓存"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+            version = (json.loads(row["value"]) if row else 0) + 1
+            conn.execute(
+                "INSERT INTO kv (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(version))
+            )
+        return version
+
+    # ========== 计数器 ==========
+
+    def incr(self, scope: str, key: str, fields: dict):
+        """累加一组计数"""
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO counters (scope, key, field, value) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(scope, key, field) DO UPDATE SET value = value + excluded.value",
+                [(scope, key, field, int(value)) for field, value in fields.items()]
+            )
+
+    def get_counters(self, scope: str) -> dict:
+        """读取某个范围下的全部计数，返回 {key: {field: value}}"""
+        rows = self._conn().execute(
+            "SELECT key, field, value FROM counters WHERE scope = ?", (scope,)
+        ).fetchall()
+        result = {}
+        for row in rows:
+            result.setdefault(row["key"], {})[row["field"]] = row["value"]
+        return result
+
+    def reset_counters(self, scope_prefix: str):
+        self._conn().execute("DELETE FROM counters WHERE scope LIKE ?", (f"{scope_prefix}%",))
+
+    # ========== 工具结果 ==========
+
+    def put_tool_result(self, handle: str, tool: str, content: str, ttl: int):
+        """保存完整工具结果，顺带清理过期结果"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM tool_results WHERE expires_at < ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO tool_results (handle, tool, content, expires_at) VALUES (?, ?, ?, ?)",
+                (handle, tool, content, now + ttl)
+            )
+
+    def read_tool_result(self, handle: str, offset: int, length: int) -> tuple[str, int] | None:
+        """读取工具结果的一段，返回 (内容, 总字符数)，不存在或已过期时返回 None"""
+        row = self._conn().execute(
+            "SELECT substr(content, ?, ?) AS page, length(content) AS total "
+            "FROM tool_results WHERE handle = ? AND expires_at >= ?",
+            (offset + 1, length, handle, time.time())
+        ).fetchone()
+        return (row["page"], row["total"]) if row else None
+
+
+# 全局实例
+state_store = StateStore()
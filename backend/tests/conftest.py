@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 后端模块按扁平方式导入（与 python main.py 启动时一致）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,92 @@
+import threading
+
+from circuit import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def _breaker(probe=lambda: True, **kwargs) -> CircuitBreaker:
+    settings = {"failure_threshold": 3, "slow_ms": 100, "slow_ratio": 0.5, "window": 4, "cooldown": 0}
+    settings.update(kwargs)
+    return CircuitBreaker("test", probe, **settings)
+
+
+def _wait_probe(breaker: CircuitBreaker):
+    for thread in threading.enumerate():
+        if thread.name == f"probe-{breaker.name}":
+            thread.join(timeout=2)
+
+
+def test_opens_after_consecutive_failures():
+    breaker = _breaker()
+    breaker.record(False, 10)
+    breaker.record(False, 10)
+    assert breaker.state == CLOSED
+    breaker.record(False, 10)
+    assert breaker.state == OPEN
+
+
+def test_success_resets_failure_count():
+    breaker = _breaker()
+    for ok in (False, False, True, False, False):
+        breaker.record(ok, 10)
+    assert breaker.state == CLOSED
+
+
+def test_opens_when_slow_ratio_reached():
+    breaker = _breaker()
+    for elapsed in (200, 10, 200, 10):
+        breaker.record(True, elapsed)
+    assert breaker.state == OPEN
+
+
+def test_per_call_slow_threshold_overrides_default():
+    breaker = _breaker()
+    for _ in range(4):
+        breaker.record(True, 5000, slow_ms=120000)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_recovers():
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.record(False, 10)
+    assert not breaker.allow()
+    assert breaker.state in (HALF_OPEN, CLOSED)
+    _wait_probe(breaker)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_with_longer_cooldown():
+    breaker = _breaker(probe=lambda: False, cooldown=0.01, max_cooldown=1)
+    for _ in range(3):
+        breaker.record(False, 10)
+    breaker._opened_at -= 1
+    assert not breaker.allow()
+    _wait_probe(breaker)
+    assert breaker.state == OPEN
+    assert breaker.reason == "健康检查失败"
+    assert breaker._cooldown == 0.02
+
+
+def test_rejections_counted_only_by_allow():
+    breaker = _breaker(cooldown=60)
+    for _ in range(3):
+        breaker.record(False, 10)
+    breaker.available()
+    breaker.allow()
+    assert breaker.status()["rejected"] == 1
+
+
+def test_queue_full_503_does_not_trip_breaker():
+    import httpx
+    from mcp_tools import MCPToolManager
+
+    manager = MCPToolManager(breaker_settings={"failure_threshold": 2})
+    tool = manager.registry.tools["get_system_time"]
+    busy = httpx.Response(503, json={"detail": "服务繁忙（scan 队列已满），请稍后再试"})
+    for _ in range(5):
+        manager._finish(tool, busy, 0)
+    assert manager._breaker(tool["server"]).state == CLOSED
+    for _ in range(2):
+        manager._finish(tool, httpx.Response(500, json={}), 0)
+    assert manager._breaker(tool["server"]).state == OPEN
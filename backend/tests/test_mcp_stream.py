@@ -0,0 +1,75 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from cancel import CancelToken, ChatCancelled
+from mcp_tools import ConnectionPool, MCPToolManager, ToolRegistry
+
+
+class _StallingHandler(BaseHTTPRequestHandler):
+    """输出 start 和一条 item 后长时间不再输出"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for event in ({"type": "start", "key": "files"}, {"type": "item", "data": {"path": "/a"}}):
+            self.wfile.write((json.dumps(event) + "\n").encode())
+        self.wfile.flush()
+        time.sleep(5)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def manager():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StallingHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    manager = MCPToolManager()
+    manager.registry = ToolRegistry({"mcpServers": {"system": {"baseUrl": base_url, "tools": [{
+        "name": "search_file", "description": "搜索", "endpoint": "/file/search", "method": "POST",
+        "streamEndpoint": "/file/search/stream", "parameters": {}, "required": [],
+        "timeout": {"read": 30, "total": 30},
+    }]}}})
+    yield manager
+    server.shutdown()
+
+
+def test_cancel_interrupts_stalled_stream(manager):
+    cancel = CancelToken()
+    threading.Timer(0.3, cancel.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(ChatCancelled):
+        manager.call_tool("search_file", {}, cancel)
+    assert time.monotonic() - started < 2
+
+
+def test_total_timeout_returns_partial_results(manager):
+    manager.registry.tools["search_file"]["timeout"]["total"] = 0.3
+    started = time.monotonic()
+    result = json.loads(manager.call_tool("search_file", {}))
+    assert time.monotonic() - started < 2
+    assert result["files"] == [{"path": "/a"}]
+    assert result["truncated"] is True
+
+
+def test_pool_aclose_closes_sync_and_async_clients():
+    pool = ConnectionPool()
+
+    async def use_and_close():
+        async_client = pool.async_client("http://127.0.0.1:1")
+        sync_client = pool.client("http://127.0.0.1:1")
+        await pool.aclose()
+        return async_client, sync_client
+
+    async_client, sync_client = asyncio.run(use_and_close())
+    assert async_client.is_closed and sync_client.is_closed
+    assert pool._async_clients == {} and pool._clients == {}
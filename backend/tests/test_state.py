@@ -0,0 +1,52 @@
+import threading
+import time
+
+from state import StateStore
+
+
+def test_lock_returns_same_instance_per_name(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    assert store.lock("tools") is store.lock("tools")
+    assert store.lock("tools") is not store.lock("schema")
+
+
+def test_lock_excludes_threads(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    inside = []
+    overlaps = []
+
+    def worker():
+        for _ in range(20):
+            with store.lock("tools"):
+                inside.append(1)
+                if len(inside) > 1:
+                    overlaps.append(1)
+                time.sleep(0.001)
+                inside.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not overlaps
+
+
+def test_history_trims_in_large_steps(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    for i in range(6):
+        store.append_history("s", "user", str(i), keep=3)
+    # 不超过 2 * keep 条时只追加，不丢弃最早的消息
+    assert [m["content"] for m in store.get_history("s", 6)] == ["0", "1", "2", "3", "4", "5"]
+    store.append_history("s", "user", "6", keep=3)
+    assert [m["content"] for m in store.get_history("s", 6)] == ["4", "5", "6"]
+
+
+def test_history_prefix_stable_between_trims(tmp_path):
+    store = StateStore(tmp_path / "state.db")
+    for i in range(3):
+        store.append_history("s", "user", str(i), keep=3)
+    before = store.get_history("s", 6)
+    store.append_history("s", "assistant", "3", keep=3)
+    after = store.get_history("s", 6)
+    assert after[:len(before)] == before
@@ -0,0 +1,78 @@
+from mcp_tools import ToolRegistry
+
+
+def _registry(tool: dict) -> ToolRegistry:
+    return ToolRegistry({"mcpServers": {"system": {"baseUrl": "http://127.0.0.1:8002", "tools": [tool]}}})
+
+
+def _tool(**extra) -> dict:
+    return {
+        "name": "write_file",
+        "description": "写入文件",
+        "endpoint": "/file/write",
+        "method": "POST",
+        "parameters": {
+            "file_path": {"type": "string", "description": "文件路径"},
+            "mode": {"type": "string", "description": "写入模式，默认 overwrite"},
+            "max_size": {"type": "integer", "description": "可选，最大字节数"},
+        },
+        **extra,
+    }
+
+
+def test_required_comes_from_config():
+    tool = _registry(_tool(required=["file_path"])).tools["write_file"]
+    assert tool["required"] == ["file_path"]
+    assert tool["schema"]["function"]["parameters"]["required"] == ["file_path"]
+
+
+def test_description_wording_does_not_make_parameter_optional():
+    # 没有 required 列表时，描述中的"默认""可选"不影响是否必填，只看 optional 标记
+    config = _tool()
+    config["parameters"]["max_size"]["optional"] = True
+    tool = _registry(config).tools["write_file"]
+    assert tool["required"] == ["file_path", "mode"]
+    _, error = ToolRegistry.validate(tool, {"file_path": "/tmp/a.txt"})
+    assert error == "缺少必填参数: mode"
+
+
+def test_validate_coerces_and_drops_unknown():
+    tool = _registry(_tool(required=["file_path"])).tools["write_file"]
+    cleaned, error = ToolRegistry.validate(tool, {"file_path": "/tmp/a.txt", "max_size": "10", "extra": 1})
+    assert error is None
+    assert cleaned == {"file_path": "/tmp/a.txt", "max_size": 10}
+
+
+def test_validate_rejects_bad_types_and_missing():
+    tool = _registry(_tool(required=["file_path"])).tools["write_file"]
+    assert ToolRegistry.validate(tool, {"file_path": None})[1] == "缺少必填参数: file_path"
+    assert ToolRegistry.validate(tool, {"file_path": "a", "max_size": "ten"})[1] == "参数 max_size 应为整数"
+    assert ToolRegistry.validate(tool, ["a"])[1] == "参数必须是 JSON 对象"
+
+
+def test_shipped_config_lists_required_parameters():
+    import json
+    from pathlib import Path
+    config = json.loads((Path(__file__).resolve().parent.parent / "mcpconfig.json").read_text(encoding="utf-8"))
+    registry = ToolRegistry(config)
+    assert registry.tools["write_file"]["required"] == ["file_path", "content"]
+    assert registry.tools["read_file"]["required"] == ["file_path"]
+
+
+def test_empty_string_is_not_missing_unless_min_length():
+    config = _tool(required=["file_path", "mode"])
+    config["parameters"]["file_path"]["minLength"] = 1
+    tool = _registry(config).tools["write_file"]
+    cleaned, error = ToolRegistry.validate(tool, {"file_path": "/tmp/a.txt", "mode": ""})
+    assert error is None and cleaned["mode"] == ""
+    assert ToolRegistry.validate(tool, {"file_path": "", "mode": ""})[1] == "参数 file_path 不能为空"
+
+
+def test_shipped_write_file_accepts_empty_content():
+    import json
+    from pathlib import Path
+    config = json.loads((Path(__file__).resolve().parent.parent / "mcpconfig.json").read_text(encoding="utf-8"))
+    tool = ToolRegistry(config).tools["write_file"]
+    cleaned, error = ToolRegistry.validate(tool, {"file_path": "/tmp/a.txt", "content": ""})
+    assert error is None and cleaned["content"] == ""
+    assert ToolRegistry.validate(tool, {"file_path": "", "content": "x"})[1] == "参数 file_path 不能为空"
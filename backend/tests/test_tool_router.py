@@ -0,0 +1,53 @@
+from tool_router import ToolRouter
+
+
+def _tool(name: str, description: str) -> dict:
+    return {"type": "function", "function": {
+        "name": name, "description": description,
+        "parameters": {"type": "object", "properties": {}},
+    }}
+
+
+TOOLS = [
+    _tool("search_file", "搜索文件"),
+    _tool("open_file", "打开文件，路径不确定时先用 search_file 搜索"),
+    _tool("get_weather", "查询天气"),
+]
+
+
+def test_description_prior_does_not_grow_when_tool_list_changes():
+    router = ToolRouter()
+    for _ in range(5):
+        # 熔断隐藏某个服务的工具后又恢复，工具列表来回变化
+        router.score(TOOLS, [])
+        router.score(TOOLS[:2], [])
+    with router._lock:
+        assert router._related("open_file") == {"search_file": 1}
+    assert router.co_usage == {}
+
+
+def test_prior_is_rebuilt_when_mentioned_tool_disappears():
+    router = ToolRouter()
+    router.score(TOOLS, [])
+    router.score([TOOLS[1], TOOLS[2]], [])
+    with router._lock:
+        assert router._related("open_file") == {}
+
+
+def test_observed_usage_combines_with_prior():
+    router = ToolRouter()
+    router.score(TOOLS, [])
+    router.record("s", ["open_file", "search_file"])
+    router.record("s", ["open_file", "get_weather"])
+    with router._lock:
+        assert router._related("open_file") == {"search_file": 2, "get_weather": 1}
+    expanded = router.expand([TOOLS[0]], TOOLS, ["search_file"])
+    assert [t["function"]["name"] for t in expanded] == ["open_file", "search_file"]
+
+
+def test_score_uses_current_index():
+    router = ToolRouter()
+    scores = router.score(TOOLS, [{"role": "user", "content": "明天天气怎么样"}])
+    assert max(scores, key=scores.get) == "get_weather"
+    scores = router.score(TOOLS[:2], [{"role": "user", "content": "明天天气怎么样"}])
+    assert "get_weather" not in scores
@@ -0,0 +1,132 @@
+"""工具结果预算模块 - 限制内联到对话中的工具结果大小，完整结果分页读取"""
+import json
+import threading
+import uuid
+
+from state import StateStore
+
+# 内置的分页读取工具，由 Agent 在本地处理，不经过 MCP 服务
+READ_TOOL_NAME = "read_tool_result"
+
+READ_TOOL_SCHEMA = {
+    "type": "function",
+    "function": {
+        "name": READ_TOOL_NAME,
+        "description": "读取被截断的工具结果的后续内容。工具结果带有 truncated 和 handle 时，用 handle 和 next_offset 继续读取",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "handle": {"type": "string", "description": "被截断结果中的 handle"},
+                "offset": {"type": "integer", "description": "从第几个字符开始读取，第一次用 0，之后用上次返回的 next_offset"},
+            },
+            "required": ["handle", "offset"],
+        },
+    },
+}
+
+# 摘要中单个列表最多保留的条目数
+_MAX_LIST_ITEMS = 20
+# 截断说明等字段预留的字符数
+_ENVELOPE_CHARS = 300
+
+
+def _shrink(value, str_limit: int, list_limit: int):
+    """按长度上限裁剪 JSON 结构：长字符串截断、长列表只保留前几项"""
+    if isinstance(value, str):
+        if len(value) > str_limit:
+            return value[:str_limit] + f"…（共 {len(value)} 字）"
+        return value
+    if isinstance(value, list):
+        items = [_shrink(v, str_limit, list_limit) for v in value[:list_limit]]
+        if len(value) > list_limit:
+            items.append(f"…（共 {len(value)} 项，已省略 {len(value) - list_limit} 项）")
+        return items
+    if isinstance(value, dict):
+        return {k: _shrink(v, str_limit, list_limit) for k, v in value.items()}
+    return value
+
+
+def summarize(result: str, max_chars: int):
+    """生成不超过 max_chars 字符的结果摘要：JSON 保留结构，其余取开头部分"""
+    try:
+        data = json.loads(result)
+    except json.JSONDecodeError:
+        return result[:max_chars]
+
+    str_limit, list_limit = max_chars // 2, _MAX_LIST_ITEMS
+    while str_limit >= 20:
+        shrunk = _shrink(data, str_limit, list_limit)
+        if len(json.dumps(shrunk, ensure_ascii=False)) <= max_chars:
+            return shrunk
+        str_limit //= 2
+        list_limit = max(1, list_limit // 2)
+    return result[:max_chars]
+
+
+class ToolResultStore:
+    """
+    工具结果预算：超过 max_chars 的结果完整保存到共享状态库，
+    对话中只放摘要和 handle，模型需要时用 read_tool_result 分页读取
+    """
+
+    def __init__(self, store: StateStore, max_chars: int = 4000,
+                 page_chars: int = 4000, ttl: int = 3600):
+        self.store = store
+        self.max_chars = max_chars
+        self.page_chars = page_chars
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.stats = {"results": 0, "truncated": 0, "chars_in": 0, "chars_inlined": 0, "pages_read": 0}
+
+    def fit(self, tool_name: str, result: str) -> tuple[str, bool]:
+        """把工具结果裁剪到预算内，返回 (内联内容, 是否被截断)"""
+        truncated = len(result) > self.max_chars
+        if truncated:
+            handle = uuid.uuid4().hex[:12]
+            self.store.put_tool_result(handle, tool_name, result, self.ttl)
+            content = json.dumps({
+                "truncated": True,
+                "handle": handle,
+                "total_chars": len(result),
+                "summary": summarize(result, self.max_chars - _ENVELOPE_CHARS),
+                "hint": f"结果过长已截断，需要完整内容时调用 {READ_TOOL_NAME}(handle, offset=0) 分页读取",
+            }, ensure_ascii=False)
+            print(f"  [结果预算] {tool_name} 结果 {len(result)} 字，内联 {len(content)} 字，handle={handle}")
+        else:
+            content = result
+
+        with self._lock:
+            self.stats["results"] += 1
+            self.stats["chars_in"] += len(result)
+            self.stats["chars_inlined"] += len(content)
+            if truncated:
+                self.stats["truncated"] += 1
+        return content, truncated
+
+    def read(self, arguments: dict) -> str:
+        """处理 read_tool_result 调用，返回一页原始结果"""
+        handle = str(arguments.get("handle", ""))
+        try:
+            offset = max(0, int(arguments.get("offset", 0)))
+        except (TypeError, ValueError):
+            offset = 0
+
+        page = self.store.read_tool_result(handle, offset, self.page_chars)
+        if page is None:
+            return json.dumps({"error": f"结果 {handle} 不存在或已过期"}, ensure_ascii=False)
+
+        content, total = page
+        next_offset = offset + len(content)
+        with self._lock:
+            self.stats["pages_read"] += 1
+        return json.dumps({
+            "handle": handle,
+            "offset": offset,
+            "content": content,
+            "next_offset": next_offset if next_offset < total else None,
+            "total_chars": total,
+        }, ensure_ascii=False)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
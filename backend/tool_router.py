@@ -0,0 +1,207 @@
+"""工具路由模块 - 按相关性为每轮对话挑选需要发送的工具定义"""
+import math
+import re
+import threading
+from collections import deque
+
+# 工具描述里的套话和常见口语，不参与匹配
+STOP_TERMS = {
+    "当用", "用户", "户说", "时使", "使用", "等需", "需要", "要时", "一下", "帮我",
+    "我的", "什么", "可以", "一个", "如果", "或者", "支持", "默认", "可选", "指定",
+    "xxx", "the", "and",
+}
+
+_TERM_RE = re.compile(r'[\u4e00-\u9fff]+|[a-z0-9]+')
+
+
+def extract_terms(text: str) -> set:
+    """提取匹配用的词项：中文按字二元组切分，英文按单词"""
+    terms = set()
+    for token in _TERM_RE.findall(text.lower()):
+        if token.isascii():
+            if len(token) > 1:
+                terms.add(token)
+            continue
+        if len(token) == 1:
+            terms.add(token)
+        for i in range(len(token) - 1):
+            terms.add(token[i:i + 2])
+    return terms - STOP_TERMS
+
+
+class ToolRouter:
+    """
+    本地工具路由：用工具描述的关键词（IDF 加权）给工具打分，
+    结合同一轮对话中工具的共同使用统计，只发送 top-k 个工具定义
+    """
+
+    def __init__(self, top_k: int = 4, min_score: float = 1.5, history_weight: float = 0.5):
+        self.top_k = top_k
+        self.min_score = min_score
+        self.history_weight = history_weight
+        self._lock = threading.Lock()
+        self._index_key = None
+        self._tool_terms = {}
+        self._idf = {}
+        # 工具描述中提到的其他工具（先验），每次重建索引时整体替换，不累加到 co_usage
+        self._prior = {}
+        self.co_usage = {}
+        self.recent_tools = {}
+        self.stats = {"turns": 0, "tools_sent": 0, "no_tools": 0, "fallbacks": 0}
+
+    # ========== 索引 ==========
+
+    def _ensure_index(self, tools: list) -> tuple[dict, dict]:
+        """工具列表变化时重建关键词索引，返回 (各工具词项, IDF)"""
+        key = tuple(t["function"]["name"] + t["function"]["description"] for t in tools)
+        with self._lock:
+            if key == self._index_key:
+                return self._tool_terms, self._idf
+
+        tool_terms = {}
+        for tool in tools:
+            fn = tool["function"]
+            text = " ".join([
+                fn["name"].replace("_", " "),
+                fn["description"],
+                *(p.get("description", "") for p in fn["parameters"]["properties"].values()),
+            ])
+            tool_terms[fn["name"]] = extract_terms(text)
+
+        df = {}
+        for terms in tool_terms.values():
+            for term in terms:
+                df[term] = df.get(term, 0) + 1
+        n = len(tool_terms)
+        idf = {term: math.log(1 + n / count) for term, count in df.items()}
+
+        # 描述中提到其他工具名（如"先用 search_folder 搜索"）视为先验的共同使用关系
+        names = set(tool_terms)
+        prior = {}
+        for tool in tools:
+            name = tool["function"]["name"]
+            for other in names - {name}:
+                if other in tool["function"]["description"]:
+                    prior.setdefault(name, {})[other] = 1
+                    prior.setdefault(other, {})[name] = 1
+
+        # 在锁内一起替换，并发的 score() 不会读到新旧混合的索引
+        with self._lock:
+            self._tool_terms = tool_terms
+            self._idf = idf
+            self._prior = prior
+            self._index_key = key
+        return tool_terms, idf
+
+    def _add_co_usage(self, a: str, b: str, weight: int = 1):
+        self.co_usage.setdefault(a, {})
+        self.co_usage.setdefault(b, {})
+        self.co_usage[a][b] = self.co_usage[a].get(b, 0) + weight
+        self.co_usage[b][a] = self.co_usage[b].get(a, 0) + weight
+
+    def _related(self, name: str) -> dict:
+        """与 name 共同使用的工具及次数：实际统计加上描述中的先验（调用方持有锁）"""
+        related = dict(self._prior.get(name, {}))
+        for other, count in self.co_usage.get(name, {}).items():
+            related[other] = related.get(other, 0) + count
+        return related
+
+    # ========== 打分与选择 ==========
+
+    def score(self, tools: list, messages: list) -> dict:
+        """按最新用户消息（及较低权重的近期历史）给每个工具打分"""
+        tool_terms, idf = self._ensure_index(tools)
+
+        user_texts = [m.get("content") or "" for m in messages if m.get("role") == "user"]
+        if not user_texts:
+            return {}
+        current = extract_terms(user_texts[-1])
+        history = set()
+        for text in user_texts[-3:-1]:
+            history |= extract_terms(text)
+        history -= current
+
+        scores = {}
+        for name, terms in tool_terms.items():
+            score = sum(idf[t] for t in current & terms)
+            score += self.history_weight * sum(idf[t] for t in history & terms)
+            if score > 0:
+                scores[name] = score
+        return scores
+
+    def select(self, tools: list | None, messages: list, session_id: str = "default") -> list | None:
+        """挑选本轮要发送的工具定义，没有相关工具时返回 None"""
+        if not tools:
+            return tools
+
+        scores = self.score(tools, messages)
+
+        # 上一轮刚用过的工具的共同使用工具略微加分（如搜索后接着打开）
+        with self._lock:
+            recent = list(self.recent_tools.get(session_id, ()))
+            for name in recent:
+                for other, count in self._related(name).items():
+                    if other in scores:
+                        scores[other] += min(count, 5) * 0.2
+
+        ranked = sorted(
+            (name for name, score in scores.items() if score >= self.min_score),
+            key=lambda name: -scores[name],
+        )[:self.top_k]
+
+        with self._lock:
+            self.stats["turns"] += 1
+            self.stats["tools_sent"] += len(ranked)
+            if not ranked:
+                self.stats["no_tools"] += 1
+
+        if not ranked:
+            return None
+        return self.subset(tools, ranked)
+
+    def expand(self, tools: list | None, all_tools: list | None, called: list) -> list | None:
+        """
+        工具轮之后决定下一轮的工具集：模型请求了未发送的工具时回退到完整工具集，
+        否则补充本轮所调用工具的共同使用工具
+        """
+        if not all_tools:
+            return all_tools
+        sent = {t["function"]["name"] for t in tools or []}
+        if any(name not in sent for name in called):
+            with self._lock:
+                self.stats["fallbacks"] += 1
+            print("[工具路由] 模型请求了未发送的工具，回退到完整工具集")
+            return all_tools
+
+        names = set(sent)
+        with self._lock:
+            for name in called:
+                names.update(self._related(name))
+        return self.subset(all_tools, names)
+
+    def record(self, session_id: str, called: list):
+        """记录一轮对话中实际调用的工具，用于共同使用统计"""
+        if not called:
+            return
+        unique = list(dict.fromkeys(called))
+        with self._lock:
+            for i, a in enumerate(unique):
+                for b in unique[i + 1:]:
+                    self._add_co_usage(a, b)
+            self.recent_tools[session_id] = deque(unique, maxlen=5)
+
+    @staticmethod
+    def subset(tools: list, names) -> list:
+        """按名称筛选工具定义，并按名称排序保证顺序稳定"""
+        names = set(names)
+        return sorted(
+            (t for t in tools if t["function"]["name"] in names),
+            key=lambda t: t["function"]["name"],
+        )
+
+    def get_stats(self) -> dict:
+        """路由统计"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats["avg_tools_sent"] = round(stats["tools_sent"] / stats["turns"], 2) if stats["turns"] else 0
+        return stats
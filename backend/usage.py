@@ -0,0 +1,211 @@
+"""Token 用量统计模块"""
+import json
+import re
+import threading
+import time
+from collections import deque
+
+from prompt import PROFILE_MARKER, MEMORY_MARKER
+from state import StateStore, state_store
+
+# 中文及全角字符大约 1 字 1 token，其余字符大约 4 个 1 token
+_CJK_RE = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+BREAKDOWN_KEYS = ("system", "memory", "tools", "history", "tool_results")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def profile_prompt(messages: list, tools: list | None = None) -> dict:
+    """按来源拆分提示词的估算 token 数：人设、记忆、工具定义、历史、工具结果"""
+    breakdown = dict.fromkeys(BREAKDOWN_KEYS, 0)
+
+    for msg in messages:
+        role = msg.get("role")
+        content = msg.get("content") or ""
+
+        if role == "system":
+            # 人设之后的主人档案和相关记忆都计入 memory
+            persona, marker, memory = content.partition(PROFILE_MARKER)
+            if not marker:
+                persona, _, memory = content.partition(MEMORY_MARKER)
+            breakdown["system"] += estimate_tokens(persona)
+            breakdown["memory"] += estimate_tokens(memory)
+        elif role == "tool":
+            breakdown["tool_results"] += estimate_tokens(content)
+        elif role == "assistant" and msg.get("tool_calls"):
+            # 工具调用请求本身也属于工具轮次的开销
+            breakdown["tool_results"] += estimate_tokens(content)
+            breakdown["tool_results"] += estimate_tokens(
+                json.dumps(msg["tool_calls"], ensure_ascii=False)
+            )
+        else:
+            breakdown["history"] += estimate_tokens(content)
+
+    if tools:
+        breakdown["tools"] = estimate_tokens(json.dumps(tools, ensure_ascii=False))
+
+    return breakdown
+
+
+def profile_tools(tools: list | None) -> dict:
+    """估算每个工具定义占用的 token 数"""
+    per_tool = {}
+    for tool in tools or []:
+        per_tool[tool["function"]["name"]] = estimate_tokens(json.dumps(tool, ensure_ascii=False))
+    return {"total": sum(per_tool.values()), "per_tool": per_tool}
+
+
+def parse_usage(usage) -> dict | None:
+    """从 OpenAI 兼容的 usage 对象中提取 token 数"""
+    if usage is None:
+        return None
+
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+    # OpenAI 放在 prompt_tokens_details.cached_tokens，DeepSeek 使用 prompt_cache_hit_tokens
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", 0) if details else 0
+    if not cached_tokens:
+        cached_tokens = getattr(usage, "prompt_cache_hit_tokens", 0) or 0
+
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens or 0,
+        "total_tokens": getattr(usage, "total_tokens", 0) or prompt_tokens + completion_tokens,
+    }
+
+
+def _empty_totals() -> dict:
+    return {
+        "calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "total_tokens": 0,
+        "breakdown": dict.fromkeys(BREAKDOWN_KEYS, 0),
+    }
+
+
+def _flatten(stats: dict, breakdown: dict | None) -> dict:
+    """转换为计数器字段，breakdown 展开为 breakdown.xxx"""
+    fields = {"calls": 1, **stats}
+    for key, value in (breakdown or {}).items():
+        fields[f"breakdown.{key}"] = value
+    return fields
+
+
+def _unflatten(fields: dict) -> dict:
+    totals = _empty_totals()
+    for field, value in fields.items():
+        if field.startswith("breakdown."):
+            totals["breakdown"][field[len("breakdown."):]] = value
+        else:
+            totals[field] = value
+    return totals
+
+
+class UsageTracker:
+    """
+    按会话、接口、调用类型汇总 token 用量
+
+    汇总数据写入共享状态库，多个 worker 进程的统计合并在一起；
+    最近调用明细只保留在本进程内存中
+    """
+
+    SCOPES = ("session", "endpoint", "call_type")
+
+    def __init__(self, store: StateStore, max_recent: int = 100):
+        self.store = store
+        self._lock = threading.Lock()
+        self.recent = deque(maxlen=max_recent)
+
+    def record(self, usage, endpoint: str, session_id: str = "default",
+               call_type: str = "chat", model: str = "", breakdown: dict | None = None) -> dict | None:
+        """记录一次 LLM 调用的用量"""
+        stats = parse_usage(usage)
+        if stats is None:
+            return None
+
+        entry = {
+            "time": time.strftime("%H:%M:%S"),
+            "endpoint": endpoint,
+            "session_id": session_id,
+            "call_type": call_type,
+            "model": model,
+            **stats,
+            "breakdown": breakdown or {},
+        }
+
+        fields = _flatten(stats, breakdown)
+        for scope, key in zip(self.SCOPES, (session_id, endpoint, call_type)):
+            self.store.incr(f"usage:{scope}", key, fields)
+        with self._lock:
+            self.recent.append(entry)
+
+        print(f"[用量] {endpoint}/{call_type}: 输入 {stats['prompt_tokens']}"
+              f"（缓存 {stats['cached_tokens']}）输出 {stats['completion_tokens']}")
+        return entry
+
+    def record_ttft(self, endpoint: str, elapsed_ms: float):
+        """记录一次流式回复的首字延迟"""
+        self.store.incr("usage:latency", endpoint, {"first_tokens": 1, "ttft_ms": round(elapsed_ms)})
+
+    def latency(self) -> dict:
+        """各接口的平均首字延迟"""
+        result = {}
+        for endpoint, fields in self.store.get_counters("usage:latency").items():
+            count = fields.get("first_tokens", 0)
+            result[endpoint] = {
+                "first_tokens": count,
+                "avg_ttft_ms": round(fields.get("ttft_ms", 0) / count, 1) if count else 0,
+            }
+        return result
+
+    def _by(self, scope: str) -> dict:
+        return {key: _unflatten(fields) for key, fields in self.store.get_counters(f"usage:{scope}").items()}
+
+    def totals(self) -> dict:
+        """全部调用的总用量"""
+        total = _empty_totals()
+        for item in self._by("endpoint").values():
+            total["calls"] += item["calls"]
+            for key in ("prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens"):
+                total[key] += item[key]
+            for key, value in item["breakdown"].items():
+                total["breakdown"][key] = total["breakdown"].get(key, 0) + value
+        # 前缀缓存命中率：缓存命中的输入 token 占全部输入 token 的比例
+        prompt = total["prompt_tokens"]
+        total["cache_hit_rate"] = round(total["cached_tokens"] / prompt, 3) if prompt else 0
+        return total
+
+    def summary(self) -> dict:
+        """用量汇总"""
+        with self._lock:
+            recent = list(self.recent)
+        return {
+            "total": self.totals(),
+            "by_session": self._by("session"),
+            "by_endpoint": self._by("endpoint"),
+            "by_call_type": self._by("call_type"),
+            "latency": self.latency(),
+            "recent": recent,
+        }
+
+    def reset(self):
+        """清空统计"""
+        self.store.reset_counters("usage:")
+        with self._lock:
+            self.recent.clear()
+
+
+# 全局实例
+usage_tracker = UsageTracker(state_store)
@@ -0,0 +1,61 @@
+"""启动预热模块 - 进程启动后在后台线程中完成耗时的初始化"""
+import threading
+import time
+
+
+class WarmupState:
+    """记录后台预热进度，供 /ready 和 /metrics 查询"""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self.steps = {}
+        self.startup_ms = None
+        self.ready_ms = None
+
+    def start(self, steps: list, process_started: float):
+        """
+        启动后台预热线程
+
+        steps: [(名称, 无参函数), ...]，按顺序执行，单步失败不影响后续步骤
+        process_started: 进程启动时的 time.perf_counter()，用于统计启动耗时
+        """
+        self.startup_ms = round((time.perf_counter() - process_started) * 1000, 1)
+        print(f"[启动] 应用可接受请求，耗时 {self.startup_ms}ms，开始后台预热")
+        thread = threading.Thread(
+            target=self._run, args=(steps, process_started), name="warmup", daemon=True
+        )
+        thread.start()
+
+    def _run(self, steps: list, process_started: float):
+        for name, fn in steps:
+            started = time.perf_counter()
+            error = None
+            try:
+                fn()
+            except Exception as e:
+                error = str(e)
+                print(f"[启动] 预热 {name} 失败: {e}")
+            with self._lock:
+                self.steps[name] = {
+                    "ms": round((time.perf_counter() - started) * 1000, 1),
+                    "ok": error is None,
+                    "error": error,
+                }
+        self.ready_ms = round((time.perf_counter() - process_started) * 1000, 1)
+        self.ready.set()
+        print(f"[启动] 预热完成，进程启动到就绪共 {self.ready_ms}ms")
+
+    def status(self) -> dict:
+        with self._lock:
+            steps = dict(self.steps)
+        return {
+            "ready": self.ready.is_set(),
+            "startup_ms": self.startup_ms,
+            "ready_ms": self.ready_ms,
+            "steps": steps,
+        }
+
+
+# 全局实例
+warmup_state = WarmupState()
@@ -1,9 +1,49 @@
 """MCP Server 主入口"""
-from fastapi import FastAPI
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager
 
-from tools import system, file, folder
+from fastapi import FastAPI, Request
+
+from tools import system, file, folder, pools
+
+
+def _warm_up():
+    started = time.perf_counter()
+    try:
+        count = system.warm_up()
+        print(f"[启动] 应用目录预热完成，{count} 项，耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
+    except Exception as e:
+        print(f"[启动] 应用目录预热失败: {e}")
+    file.warm_up()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 后台预热，不阻塞服务启动
+    threading.Thread(target=_warm_up, name="warmup", daemon=True).start()
+    yield
+
+
+app = FastAPI(title="MCP Server", description="MCP 工具服务", lifespan=lifespan)
+
+# 正在处理的请求及开始时间，供健康检查判断服务是否卡住
+_inflight = {}
+_request_ids = itertools.count()
+# 有请求处理超过该秒数时健康检查返回 busy
+STUCK_SECONDS = 60
+
+
+@app.middleware("http")
+async def track_inflight(request: Request, call_next):
+    request_id = next(_request_ids)
+    _inflight[request_id] = (request.url.path, time.monotonic())
+    try:
+        return await call_next(request)
+    finally:
+        _inflight.pop(request_id, None)
 
-app = FastAPI(title="MCP Server", description="MCP 工具服务")
 
 # 注册路由
 app.include_router(system.router)
@@ -16,6 +56,21 @@ async def root():
     return {"message": "MCP Server is running"}
 
 
+@app.get("/health")
+async def health():
+    """健康检查：有请求长时间未完成时返回 busy，后端据此决定是否恢复调用"""
+    now = time.monotonic()
+    requests = [(path, now - started) for path, started in list(_inflight.values()) if path != "/health"]
+    oldest_path, oldest = max(requests, key=lambda r: r[1], default=("", 0))
+    return {
+        "status": "busy" if oldest > STUCK_SECONDS else "ok",
+        "inflight": len(requests),
+        "oldest_seconds": round(oldest, 1),
+        "oldest_path": oldest_path,
+        "pools": pools.get_stats(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8002)
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 与 python main.py 启动时一致，工具模块作为 tools 包导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
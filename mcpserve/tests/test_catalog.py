@@ -0,0 +1,103 @@
+import os
+import threading
+
+import pytest
+
+from tools import system
+from tools.catalog import AppCatalog
+
+
+def _desktop(directory, name: str, command: str):
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f"{name}.desktop").write_text(f"[Desktop Entry]\nName={name}\nExec={command} %U\n")
+
+
+def _catalog(tmp_path) -> AppCatalog:
+    apps = tmp_path / "applications"
+    _desktop(apps, "Firefox", "/usr/bin/firefox")
+    return AppCatalog(str(tmp_path / "catalog.json"), [str(apps)])
+
+
+def test_find_by_name_and_exec(tmp_path):
+    app_catalog = _catalog(tmp_path)
+    app_catalog.ensure_loaded()
+    expected = str(tmp_path / "applications" / "Firefox.desktop")
+    assert app_catalog.find("firefox") == expected
+    # Exec 中的程序名也可以查找
+    _desktop(tmp_path / "applications", "Visual Studio Code", "/usr/share/code/code")
+    app_catalog.refresh()
+    assert app_catalog.find("vscode").endswith("Visual Studio Code.desktop")
+
+
+def test_refresh_is_incremental_and_persisted(tmp_path):
+    app_catalog = _catalog(tmp_path)
+    app_catalog.ensure_loaded()
+    app_catalog.refresh()
+    assert app_catalog.stats["dirs_listed"] == 1
+    _desktop(tmp_path / "applications", "Telegram", "telegram-desktop")
+    app_catalog.refresh()
+    assert app_catalog.find("telegram").endswith("Telegram.desktop")
+    # 重启后从保存的文件加载，不再列出目录
+    reloaded = AppCatalog(app_catalog.path, app_catalog.roots)
+    reloaded.ensure_loaded()
+    assert reloaded.find("telegram").endswith("Telegram.desktop")
+    assert reloaded.stats["dirs_listed"] == 0
+
+
+def test_lookup_does_not_wait_for_running_refresh(tmp_path, monkeypatch):
+    app_catalog = _catalog(tmp_path)
+    app_catalog.ensure_loaded()
+    _desktop(tmp_path / "applications", "Telegram", "telegram-desktop")
+
+    scanning, release = threading.Event(), threading.Event()
+    scan_dir = AppCatalog._scan_dir
+
+    def slow_scan(*args):
+        scanning.set()
+        release.wait(5)
+        return scan_dir(*args)
+
+    monkeypatch.setattr(AppCatalog, "_scan_dir", staticmethod(slow_scan))
+    refresher = threading.Thread(target=app_catalog.refresh)
+    refresher.start()
+    try:
+        assert scanning.wait(2)
+        # 刷新进行中，已有的名称照常可查
+        assert app_catalog.find("firefox").endswith("Firefox.desktop")
+    finally:
+        release.set()
+        refresher.join(5)
+    assert app_catalog.find("telegram").endswith("Telegram.desktop")
+
+
+@pytest.fixture
+def launched(monkeypatch):
+    if os.name == "nt":
+        pytest.skip("Windows 下用 start 启动")
+    commands = []
+    monkeypatch.setattr(system.subprocess, "Popen", lambda command, **kwargs: commands.append(command))
+    monkeypatch.setattr(system.sys, "platform", "linux")
+    return commands
+
+
+def test_launch_desktop_entry_with_gio(launched, monkeypatch):
+    monkeypatch.setattr(system.shutil, "which", lambda name: f"/usr/bin/{name}")
+    system.launch_application("/usr/share/applications/firefox.desktop")
+    assert launched == [["gio", "launch", "/usr/share/applications/firefox.desktop"]]
+
+
+def test_launch_desktop_entry_falls_back_to_gtk_launch(launched, monkeypatch):
+    monkeypatch.setattr(system.shutil, "which", lambda name: "/usr/bin/gtk-launch" if name == "gtk-launch" else None)
+    system.launch_application("/usr/share/applications/firefox.desktop")
+    assert launched == [["gtk-launch", "firefox.desktop"]]
+
+
+def test_launch_executable_directly(launched):
+    system.launch_application("/usr/bin/htop")
+    assert launched == [["/usr/bin/htop"]]
+
+
+def test_launch_on_macos_uses_open(launched, monkeypatch):
+    monkeypatch.setattr(system.sys, "platform", "darwin")
+    system.launch_application("/usr/local/bin/code")
+    assert launched == [["open", "/usr/local/bin/code"]]
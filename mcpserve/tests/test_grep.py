@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+from tools import file, folder, grep, settings
+from tools.grep import Matcher
+
+
+def _run(root, query, **kwargs):
+    return grep.run([str(root)], Matcher(query, kwargs.pop("regex", False)), 50, **kwargs)
+
+
+def test_matches_with_line_numbers_and_context(tmp_path):
+    (tmp_path / "notes.txt").write_text("one\ntwo\nneedle here\nthree\nfour\n")
+    found = _run(tmp_path, "NEEDLE", context=1)
+    assert len(found["results"]) == 1
+    match = found["results"][0]
+    assert (match["line"], match["text"]) == (3, "needle here")
+    assert (match["before"], match["after"]) == (["two"], ["three"])
+
+
+def test_same_line_reported_once(tmp_path):
+    (tmp_path / "a.txt").write_text("x\nneedle needle needle\nneedle\n")
+    found = _run(tmp_path, "needle")
+    assert [match["line"] for match in found["results"]] == [2, 3]
+
+
+def test_binary_files_are_skipped(tmp_path):
+    (tmp_path / "data.bin").write_bytes(b"needle\x00\x01\x02")
+    (tmp_path / "a.txt").write_text("needle\n")
+    found = _run(tmp_path, "needle")
+    assert [match["name"] for match in found["results"]] == ["a.txt"]
+    assert found["skipped_files"] == 1
+
+
+def test_chinese_query_matches_gb18030_file(tmp_path):
+    (tmp_path / "gbk.txt").write_bytes("第一行\n会议纪要\n".encode("gb18030"))
+    found = _run(tmp_path, "会议")
+    assert [(match["line"], match["text"]) for match in found["results"]] == [(2, "会议纪要")]
+
+
+def test_file_pattern_and_regex(tmp_path):
+    (tmp_path / "a.md").write_text("id: 42\n")
+    (tmp_path / "a.txt").write_text("id: 42\n")
+    found = _run(tmp_path, r"id: \d+", regex=True, file_pattern="*.md")
+    assert [match["name"] for match in found["results"]] == ["a.md"]
+
+
+def test_find_counts_lines_across_chunks(monkeypatch):
+    monkeypatch.setattr(grep, "FIND_CHUNK", 16)
+    buf = b"".join(b"filler line %d\n" % i for i in range(100)) + b"needle\nneedle again\n"
+    matches = grep._find(buf, "x.txt", Matcher("needle").pattern("utf-8"), "utf-8", 0, 10, threading.Event())
+    assert [match["line"] for match in matches] == [101, 102]
+
+
+def test_find_stops_between_chunks_without_matches(monkeypatch):
+    monkeypatch.setattr(grep, "FIND_CHUNK", 16)
+    buf = b"".join(b"filler line %d\n" % i for i in range(100)) + b"needle\n"
+
+    class StopAfter:
+        """第 n 次检查时才报告已停止，模拟搜索途中被取消"""
+
+        def __init__(self, n: int):
+            self.calls = 0
+            self.n = n
+
+        def is_set(self) -> bool:
+            self.calls += 1
+            return self.calls >= self.n
+
+    stop = StopAfter(3)
+    matches = grep._find(buf, "x.txt", Matcher("needle").pattern("utf-8"), "utf-8", 0, 10, stop)
+    assert matches == []
+    assert stop.calls == 3
+
+
+def test_default_roots_come_from_settings(tmp_path, monkeypatch):
+    (tmp_path / "a.txt").write_text("needle\n")
+    monkeypatch.setattr(settings, "SEARCH_ROOTS", [str(tmp_path), str(tmp_path / "missing")])
+    found = asyncio.run(file.grep_content(file.GrepRequest(query="needle"), None))
+    assert found["success"]
+    assert found["searched_paths"] == [str(tmp_path)]
+    assert [match["name"] for match in found["matches"]] == ["a.txt"]
+
+
+def test_live_walk_and_grep_share_default_roots(tmp_path, monkeypatch):
+    inside, outside = tmp_path / "inside", tmp_path / "outside"
+    for root in (inside, outside):
+        (root / "needle_dir").mkdir(parents=True)
+        (root / "needle_dir" / "needle.txt").write_text("needle\n")
+    monkeypatch.setattr(settings, "SEARCH_ROOTS", [str(inside)])
+    # 索引不可用时走实时遍历
+    monkeypatch.setattr(settings, "INDEX_ENABLED", False)
+
+    grep_found = asyncio.run(file.grep_content(file.GrepRequest(query="needle"), None))
+    files_found = asyncio.run(file.search_file(file.SearchFileRequest(filename="needle"), None))
+    folders_found = asyncio.run(folder.search_folder(folder.SearchFolderRequest(folder_name="needle"), None))
+
+    assert grep_found["searched_paths"] == files_found["searched_paths"] == [str(inside)]
+    assert files_found["source"] == folders_found["source"] == "scan"
+    paths = [match["path"] for match in grep_found["matches"]]
+    paths += [entry["path"] for entry in files_found["files"] + folders_found["folders"]]
+    assert paths and all(path.startswith(str(inside)) for path in paths)
+    assert folders_found["count"] == 1 and files_found["count"] == 1
+
+
+def _collect(agen) -> list:
+    async def consume():
+        return [event async for event in agen]
+    return asyncio.run(consume())
+
+
+def test_stream_completes_without_disconnect_message(tmp_path, capsys):
+    (tmp_path / "a.txt").write_text("needle\n")
+    events = _collect(grep.stream([str(tmp_path)], "needle", 10, 10))
+    assert [event["type"] for event in events if event["type"] != "progress"] == ["item", "end"]
+    assert "客户端已断开" not in capsys.readouterr().out
@@ -0,0 +1,62 @@
+import os
+
+from tools.index import FileIndex
+
+
+def _index(tmp_path) -> tuple[FileIndex, str]:
+    home = tmp_path / "home"
+    for name in ("a", "ab"):
+        (home / name).mkdir(parents=True)
+        (home / name / f"budget_{name}.txt").write_text("x")
+    index = FileIndex(str(tmp_path / "index.db"), [str(home)])
+    index.scan_root(str(home))
+    return index, str(home)
+
+
+def test_search_finds_entries(tmp_path):
+    index, home = _index(tmp_path)
+    names = sorted(row["name"] for row in index.search("budget", False))
+    assert names == ["budget_a.txt", "budget_ab.txt"]
+
+
+def test_scoped_search_does_not_leak_into_sibling_prefix(tmp_path):
+    index, home = _index(tmp_path)
+    rows = index.search("budget", False, within=os.path.join(home, "a"))
+    assert [row["name"] for row in rows] == ["budget_a.txt"]
+
+
+def test_scoped_fuzzy_search_does_not_leak_into_sibling_prefix(tmp_path):
+    index, home = _index(tmp_path)
+    if not index.fts:
+        return
+    rows = index.search("budgt_a", False, within=os.path.join(home, "a"))
+    assert all(os.path.dirname(row["path"]) == os.path.join(home, "a") for row in rows)
+
+
+def test_incremental_rescan_picks_up_new_files(tmp_path):
+    index, home = _index(tmp_path)
+    (tmp_path / "home" / "a" / "budget_new.txt").write_text("x")
+    index.scan_root(home)
+    assert "budget_new.txt" in [row["name"] for row in index.search("budget_new", False)]
+
+
+def test_scope_applies_before_candidate_limit(tmp_path, monkeypatch):
+    from tools import index as index_module
+    home = tmp_path / "home"
+    # 范围外的同名文件层级更浅，先被扫描，SQL 按插入顺序返回时会占满候选数
+    (home / "other").mkdir(parents=True)
+    for i in range(20):
+        (home / "other" / f"report_{i}.txt").write_text("x")
+    # _ 在 LIKE 中是通配符，axb 不能算作 a_b 之下
+    for sibling in ("axb", "a_b"):
+        (home / "deep" / sibling).mkdir(parents=True)
+    for i in range(20):
+        (home / "deep" / "axb" / f"report_{i}.txt").write_text("x")
+    (home / "deep" / "a_b" / "report_target.txt").write_text("x")
+    index = FileIndex(str(tmp_path / "index.db"), [str(home)])
+    index.scan_root(str(home))
+    monkeypatch.setattr(index_module, "MAX_CANDIDATES", 5)
+    # 只检查子串查询本身，不让模糊匹配补回结果
+    monkeypatch.setattr(index, "_fuzzy", lambda *args: {})
+    rows = index.search("report", False, within=str(home / "deep" / "a_b"))
+    assert [row["name"] for row in rows] == ["report_target.txt"]
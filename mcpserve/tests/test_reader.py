@@ -0,0 +1,135 @@
+import pytest
+
+from tools import reader
+from tools.reader import BinaryFileError, LineIndex, read_text
+
+
+def _lines(count: int) -> bytes:
+    return b"".join(f"line {i}\n".encode() for i in range(1, count + 1))
+
+
+def _offsets(data: bytes) -> list:
+    offsets = [0]
+    for position, byte in enumerate(data):
+        if byte == ord("\n"):
+            offsets.append(position + 1)
+    return offsets
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # 小块让几百行就跨越多块，覆盖块内查找和 bisect
+    monkeypatch.setattr(reader, "BLOCK_SIZE", 16)
+
+
+def test_line_offset_matches_every_line(small_blocks):
+    data = _lines(300)
+    offsets = _offsets(data)
+    index = LineIndex(len(data))
+    for line in (0, 1, 2, 150, 299, 7, 298, 100):
+        assert index.line_offset(data, line) == offsets[line]
+    assert index.line_offset(data, 300) == len(data)
+    assert index.line_offset(data, 10_000) == len(data)
+
+
+def test_line_index_extends_only_as_needed(small_blocks):
+    data = _lines(300)
+    index = LineIndex(len(data))
+    index.line_offset(data, 5)
+    assert not index.complete
+    assert index.total_lines(data) is None
+    index.line_offset(data, 10_000)
+    assert index.complete
+    assert index.total_lines(data) == 300
+
+
+def test_total_lines_counts_last_line_without_newline(small_blocks):
+    data = _lines(40) + b"tail"
+    index = LineIndex(len(data))
+    index.line_offset(data, 10_000)
+    assert index.total_lines(data) == 41
+    assert data[index.line_offset(data, 40):] == b"tail"
+
+
+def test_read_lines_deep_in_file(tmp_path, small_blocks):
+    path = tmp_path / "big.txt"
+    path.write_bytes(_lines(5000))
+    result = read_text(str(path), "lines", start_line=4000, end_line=4002)
+    assert result["content"] == "line 4000\nline 4001\nline 4002\n"
+    assert (result["start_line"], result["end_line"]) == (4000, 4002)
+    # 只扫描到所需的块，总行数未知时不返回
+    assert "total_lines" not in result
+
+
+def test_read_lines_past_end(tmp_path):
+    path = tmp_path / "short.txt"
+    path.write_bytes(_lines(3))
+    result = read_text(str(path), "lines", start_line=10, end_line=12)
+    assert result["content"] == ""
+    assert result["end_line"] < result["start_line"]
+
+
+def test_read_lines_without_trailing_newline(tmp_path):
+    path = tmp_path / "no_newline.txt"
+    path.write_bytes(b"a\nb\nc")
+    result = read_text(str(path), "lines", start_line=2, end_line=5)
+    assert result["content"] == "b\nc"
+    assert (result["start_line"], result["end_line"]) == (2, 3)
+    assert result["total_lines"] == 3
+
+
+def test_head_clips_at_whole_lines(tmp_path):
+    path = tmp_path / "head.txt"
+    path.write_bytes(_lines(100))
+    result = read_text(str(path), max_bytes=20)
+    assert result["content"] == "line 1\nline 2\n"
+    assert result["truncated"]
+    assert result["next_offset"] == 14
+
+
+def test_tail_lines(tmp_path):
+    path = tmp_path / "tail.txt"
+    path.write_bytes(_lines(100))
+    assert read_text(str(path), "tail", lines=2)["content"] == "line 99\nline 100\n"
+    path.write_bytes(b"x\ny\nz")
+    assert read_text(str(path), "tail", lines=2)["content"] == "y\nz"
+
+
+def test_tail_over_max_bytes_starts_at_line_boundary(tmp_path):
+    path = tmp_path / "tail.txt"
+    path.write_bytes(_lines(100))
+    result = read_text(str(path), "tail", max_bytes=20)
+    assert result["content"] == "line 99\nline 100\n"
+    assert result["truncated"]
+
+
+def test_bytes_mode_and_offset_validation(tmp_path):
+    path = tmp_path / "bytes.txt"
+    path.write_bytes(b"0123456789")
+    result = read_text(str(path), "bytes", offset=3, length=4)
+    assert (result["content"], result["offset"], result["next_offset"]) == ("3456", 3, 7)
+    with pytest.raises(ValueError):
+        read_text(str(path), "bytes", offset=11)
+
+
+def test_gb18030_is_detected(tmp_path):
+    path = tmp_path / "gbk.txt"
+    path.write_bytes("第一行\n第二行\n".encode("gb18030"))
+    result = read_text(str(path), "lines", start_line=2, end_line=2)
+    assert result["content"] == "第二行\n"
+
+
+def test_utf16_reads_lines(tmp_path):
+    path = tmp_path / "utf16.txt"
+    path.write_bytes("一\n二\n三\n".encode("utf-16"))
+    result = read_text(str(path), "tail", lines=1)
+    assert result["encoding"] == "utf-16"
+    assert result["content"] == "三\n"
+    assert result["total_lines"] == 3
+
+
+def test_binary_file_is_rejected(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"\x7fELF\x00\x01\x02")
+    with pytest.raises(BinaryFileError):
+        read_text(str(path))
@@ -0,0 +1,127 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from tools.scheduler import Cron, CronError, Scheduler, _parse_field
+
+
+def _ts(*args) -> float:
+    return datetime(*args).timestamp()
+
+
+def test_parse_field_forms():
+    assert _parse_field("*", 0, 5) == {0, 1, 2, 3, 4, 5}
+    assert _parse_field("*/15", 0, 59) == {0, 15, 30, 45}
+    assert _parse_field("1-5", 0, 23) == {1, 2, 3, 4, 5}
+    assert _parse_field("10-20/5", 0, 59) == {10, 15, 20}
+    assert _parse_field("1,3,5", 0, 7) == {1, 3, 5}
+    # 单个值带步长表示从该值开始到上限
+    assert _parse_field("50/5", 0, 59) == {50, 55}
+
+
+@pytest.mark.parametrize("field", ["*/0", "a", "5-1", "60", "1-x", "*/x"])
+def test_parse_field_rejects_invalid(field):
+    with pytest.raises(CronError):
+        _parse_field(field, 0, 59)
+
+
+def test_cron_requires_five_fields():
+    with pytest.raises(CronError):
+        Cron("* * * *")
+
+
+def test_next_after_is_exclusive_and_rolls_over():
+    cron = Cron("30 9 * * *")
+    assert cron.next_after(_ts(2026, 3, 2, 9, 0)) == _ts(2026, 3, 2, 9, 30)
+    # 正好在触发时刻时取下一次
+    assert cron.next_after(_ts(2026, 3, 2, 9, 30)) == _ts(2026, 3, 3, 9, 30)
+    assert Cron("0 0 1 1 *").next_after(_ts(2026, 12, 31, 23, 59)) == _ts(2027, 1, 1, 0, 0)
+
+
+def test_weekday_sunday_is_zero_or_seven():
+    # 2026-03-01 是周日
+    after = _ts(2026, 2, 26, 12, 0)
+    assert Cron("0 8 * * 0").next_after(after) == _ts(2026, 3, 1, 8, 0)
+    assert Cron("0 8 * * 7").next_after(after) == _ts(2026, 3, 1, 8, 0)
+    # 周一到周五
+    assert Cron("0 8 * * 1-5").next_after(_ts(2026, 2, 27, 9, 0)) == _ts(2026, 3, 2, 8, 0)
+
+
+def test_day_and_weekday_match_either():
+    # 每月 15 日或每周一，取先到者
+    cron = Cron("0 0 15 * 1")
+    assert cron.next_after(_ts(2026, 3, 10, 0, 0)) == _ts(2026, 3, 15, 0, 0)
+    assert cron.next_after(_ts(2026, 3, 15, 0, 0)) == _ts(2026, 3, 16, 0, 0)
+
+
+def test_next_after_returns_none_when_no_match_within_a_year():
+    assert Cron("0 0 31 2 *").next_after(_ts(2026, 1, 1, 0, 0)) is None
+
+
+def _saved_task(db_path, action, run_at, interval=None, cron=None) -> str:
+    """直接写入数据库，模拟停机前保存的任务"""
+    scheduler = Scheduler(db_path, lambda *args: None)
+    task_id = f"{action[:4]}{int(run_at) % 10000}"
+    scheduler._save({"id": task_id, "action": action, "params": {}, "run_at": run_at,
+                     "interval": interval, "cron": cron, "created_at": run_at - 60, "last_run": None})
+    scheduler._conn.close()
+    return task_id
+
+
+def _start(db_path, misfire_grace=600):
+    executed = []
+    done = threading.Event()
+
+    def execute(task_id, action, params):
+        executed.append((task_id, action))
+        done.set()
+
+    scheduler = Scheduler(str(db_path), execute, misfire_grace)
+    scheduler.start()
+    return scheduler, executed, done
+
+
+def test_missed_task_within_grace_runs_once(tmp_path):
+    db_path = str(tmp_path / "tasks.db")
+    task_id = _saved_task(db_path, "notify", time.time() - 30)
+    scheduler, executed, done = _start(db_path)
+    assert done.wait(2)
+    assert executed == [(task_id, "notify")]
+    assert scheduler.get_stats()["caught_up"] == 1
+    # 一次性任务执行后从任务表删除
+    assert scheduler.list_tasks()[1] == 0
+
+
+def test_missed_task_beyond_grace_is_skipped_and_deleted(tmp_path):
+    db_path = str(tmp_path / "tasks.db")
+    _saved_task(db_path, "notify", time.time() - 3600)
+    scheduler, executed, done = _start(db_path, misfire_grace=600)
+    assert not done.wait(0.3)
+    assert scheduler.get_stats()["skipped"] == 1
+    assert scheduler.list_tasks()[1] == 0
+
+
+def test_power_actions_are_never_caught_up(tmp_path):
+    db_path = str(tmp_path / "tasks.db")
+    _saved_task(db_path, "shutdown", time.time() - 5)
+    scheduler, executed, done = _start(db_path)
+    assert not done.wait(0.3)
+    assert executed == []
+    assert scheduler.get_stats()["skipped"] == 1
+
+
+def test_skipped_interval_task_keeps_its_cadence(tmp_path):
+    db_path = str(tmp_path / "tasks.db")
+    run_at = time.time() - 3600 - 10
+    task_id = _saved_task(db_path, "restart", run_at, interval=600)
+    scheduler, executed, done = _start(db_path)
+    assert not done.wait(0.3)
+    tasks, total = scheduler.list_tasks()
+    assert total == 1 and tasks[0]["id"] == task_id
+    # 错过的多次只跳过，下一次对齐到原来的节奏
+    assert tasks[0]["run_at"] == run_at + 7 * 600
+    # 新的执行时间已写回数据库，再次重启不会重复跳过
+    restarted, _, _ = _start(db_path)
+    assert restarted.get_stats()["skipped"] == 0
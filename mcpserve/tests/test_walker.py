@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+
+from tools import walker
+
+
+def _tree(tmp_path):
+    (tmp_path / "a" / "b" / "c").mkdir(parents=True)
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "report.txt").write_text("x")
+    (tmp_path / "a" / "report_a.txt").write_text("x")
+    (tmp_path / "a" / "b" / "c" / "report_c.txt").write_text("x")
+    (tmp_path / "node_modules" / "report_nm.txt").write_text("x")
+    return tmp_path
+
+
+def test_breadth_first_order_and_pruning(tmp_path):
+    root = _tree(tmp_path)
+    state = walker.WalkState([str(root)], "REPORT", False, 12)
+    names = [item["name"] for item in walker.run(state, 10)]
+    assert names == ["report.txt", "report_a.txt", "report_c.txt"]
+    assert state.done
+
+
+def test_max_depth_limits_walk(tmp_path):
+    root = _tree(tmp_path)
+    state = walker.WalkState([str(root)], "report", False, 2)
+    assert [item["name"] for item in walker.run(state, 10)] == ["report.txt", "report_a.txt"]
+
+
+def test_expired_deadline_leaves_pending(tmp_path):
+    root = _tree(tmp_path)
+    state = walker.WalkState([str(root)], "report", False, 12)
+    assert walker.run(state, 10, deadline=time.monotonic() - 1) == []
+    assert state.pending
+
+
+def test_one_timer_per_search(tmp_path, monkeypatch):
+    root = _tree(tmp_path)
+    started = []
+    original = threading.Timer
+
+    class CountingTimer(original):
+        def start(self):
+            started.append(self)
+            super().start()
+
+    monkeypatch.setattr(walker.threading, "Timer", CountingTimer)
+    state = walker.WalkState([str(root)], "report", False, 12)
+    walker.run(state, 10, deadline=time.monotonic() + 30)
+    assert len(started) == 1
+    started[0].join(timeout=1)
+    assert not started[0].is_alive()
+
+
+def _collect(agen) -> list:
+    async def consume():
+        return [event async for event in agen]
+    return asyncio.run(consume())
+
+
+def test_stream_completes_without_disconnect_message(tmp_path, capsys):
+    root = _tree(tmp_path)
+    events = _collect(walker.stream([str(root)], "report", False, 10, 10))
+    assert [e["type"] for e in events if e["type"] != "progress"] == ["item", "item", "item", "end"]
+    assert "客户端已断开" not in capsys.readouterr().out
+
+
+def test_stream_close_stops_walk_and_reports_disconnect(tmp_path, capsys):
+    root = _tree(tmp_path)
+
+    async def consume_one():
+        agen = walker.stream([str(root)], "report", False, 10, 10)
+        await agen.__anext__()
+        await agen.aclose()
+
+    asyncio.run(consume_one())
+    assert "客户端已断开" in capsys.readouterr().out
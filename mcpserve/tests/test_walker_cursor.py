@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from tools import walker
+
+
+def _files(tmp_path, count: int = 30):
+    for i in range(count):
+        folder = tmp_path / f"d{i % 5}"
+        folder.mkdir(exist_ok=True)
+        (folder / f"note_{i}.txt").write_text("x")
+    return tmp_path
+
+
+def test_overflow_is_returned_first_on_resume(tmp_path):
+    root = _files(tmp_path)
+    state = walker.WalkState([str(root)], "note", False, 12)
+    first = walker.run(state, 4)
+    assert len(first) == 4
+    second = walker.run(state, 100)
+    paths = [item["path"] for item in first + second]
+    assert len(paths) == 30 == len(set(paths))
+    assert state.done
+
+
+def test_cursor_is_single_use(tmp_path):
+    state = walker.WalkState([str(tmp_path)], "note", False, 12)
+    token = walker.save_cursor(state)
+    assert walker.take_cursor(token) is state
+    assert walker.take_cursor(token) is None
+
+
+def test_cursor_expires(tmp_path, monkeypatch):
+    state = walker.WalkState([str(tmp_path)], "note", False, 12)
+    token = walker.save_cursor(state)
+    real = time.monotonic
+    monkeypatch.setattr(walker.time, "monotonic", lambda: real() + walker.CURSOR_TTL + 1)
+    assert walker.take_cursor(token) is None
+
+
+def test_search_pages_through_all_results_with_cursor(tmp_path):
+    root = _files(tmp_path)
+    seen, cursor = [], ""
+    for _ in range(20):
+        found = asyncio.run(walker.search(None, [str(root)], "note", False, 7, 10, cursor))
+        seen += [item["path"] for item in found["results"]]
+        cursor = found["cursor"]
+        if not found["truncated"]:
+            break
+    assert len(seen) == 30 == len(set(seen))
+
+
+def test_invalid_cursor_returns_none(tmp_path):
+    assert asyncio.run(walker.search(None, [str(tmp_path)], "note", False, 5, 10, "missing")) is None
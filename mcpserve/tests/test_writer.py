@@ -0,0 +1,162 @@
+import os
+import stat
+import threading
+
+import pytest
+
+from tools import writer
+from tools.writer import OffsetMismatchError
+
+
+def _leftovers(directory) -> list:
+    return [name for name in os.listdir(directory) if name.endswith(".tmp")]
+
+
+def test_write_atomic_replaces_and_keeps_mode(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("old")
+    os.chmod(path, 0o640)
+    assert writer.write_atomic(str(path), b"new") == 3
+    assert path.read_bytes() == b"new"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert _leftovers(tmp_path) == []
+
+
+def test_new_file_mode_follows_umask(tmp_path):
+    previous = os.umask(0o027)
+    try:
+        writer.write_atomic(str(tmp_path / "new.txt"), b"x")
+        (tmp_path / "plain.txt").write_text("x")
+    finally:
+        os.umask(previous)
+    assert stat.S_IMODE(os.stat(tmp_path / "new.txt").st_mode) == 0o640
+    assert os.stat(tmp_path / "new.txt").st_mode == os.stat(tmp_path / "plain.txt").st_mode
+
+
+def test_write_atomic_creates_parent(tmp_path):
+    path = tmp_path / "x" / "y" / "z.txt"
+    writer.write_atomic(str(path), b"data")
+    assert path.read_bytes() == b"data"
+
+
+@pytest.mark.skipif(os.name == "nt", reason="需要创建符号链接的权限")
+def test_write_atomic_follows_symlink(tmp_path):
+    target = tmp_path / "target.txt"
+    target.write_text("old")
+    link = tmp_path / "link.txt"
+    link.symlink_to(target)
+    writer.write_atomic(str(link), b"new")
+    assert link.is_symlink()
+    assert target.read_bytes() == b"new"
+
+
+def test_exclusive_does_not_overwrite(tmp_path):
+    path = tmp_path / "a.txt"
+    writer.write_atomic(str(path), b"first", exclusive=True)
+    with pytest.raises(FileExistsError):
+        writer.write_atomic(str(path), b"second", exclusive=True)
+    assert path.read_bytes() == b"first"
+    assert _leftovers(tmp_path) == []
+
+
+@pytest.mark.skipif(os.name == "nt", reason="需要创建符号链接的权限")
+def test_exclusive_treats_dangling_symlink_as_existing(tmp_path):
+    link = tmp_path / "link.txt"
+    link.symlink_to(tmp_path / "missing.txt")
+    with pytest.raises(FileExistsError):
+        writer.write_atomic(str(link), b"x", exclusive=True)
+    assert not (tmp_path / "missing.txt").exists()
+
+
+def test_write_direct_append_checks_offset(tmp_path):
+    path = str(tmp_path / "log.txt")
+    assert writer.write_direct(path, b"abc", append=True, offset=0) == 3
+    # 重发同一块时偏移已不一致，不会写入两次
+    with pytest.raises(OffsetMismatchError) as info:
+        writer.write_direct(path, b"abc", append=True, offset=0)
+    assert info.value.size == 3
+    assert writer.write_direct(path, b"def", append=True, offset=3) == 6
+    with open(path, "rb") as f:
+        assert f.read() == b"abcdef"
+
+
+def test_upload_resumes_from_offset_and_rejects_duplicates(tmp_path):
+    path = tmp_path / "big.bin"
+    upload = writer.start_upload(str(path), total_size=1024)
+    assert upload.write(0, b"aaaa") == 4
+    with pytest.raises(OffsetMismatchError) as info:
+        upload.write(0, b"aaaa")
+    assert info.value.size == 4
+    with pytest.raises(OffsetMismatchError):
+        upload.write(8, b"cccc")
+    # 查询后从已接收的位置续传
+    resumed = writer.get_upload(upload.id)
+    assert resumed is upload and resumed.received == 4
+    assert resumed.write(4, b"bbbb") == 8
+    assert not path.exists()
+    assert writer.finish_upload(resumed) == 8
+    # 预分配多出的部分已截掉
+    assert path.read_bytes() == b"aaaabbbb"
+    assert writer.get_upload(upload.id) is None
+    assert _leftovers(tmp_path) == []
+
+
+def test_exclusive_upload_fails_when_target_appears(tmp_path):
+    path = tmp_path / "a.txt"
+    upload = writer.start_upload(str(path), exclusive=True)
+    upload.write(0, b"upload")
+    path.write_text("someone else")
+    with pytest.raises(FileExistsError):
+        writer.finish_upload(upload)
+    assert path.read_text() == "someone else"
+    assert _leftovers(tmp_path) == []
+
+
+def test_expired_upload_is_removed(tmp_path, monkeypatch):
+    upload = writer.start_upload(str(tmp_path / "a.txt"))
+    upload.write(0, b"partial")
+    monkeypatch.setattr(writer.time, "monotonic", lambda: upload.expires + 1)
+    assert writer.get_upload(upload.id) is None
+    assert _leftovers(tmp_path) == []
+
+
+def test_abort_upload_removes_temp_file(tmp_path):
+    upload = writer.start_upload(str(tmp_path / "a.txt"))
+    upload.write(0, b"partial")
+    writer.abort_upload(upload)
+    assert writer.get_upload(upload.id) is None
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.skipif(os.name == "nt", reason="需要创建符号链接的权限")
+def test_symlink_and_target_share_one_lock(tmp_path):
+    target = tmp_path / "real" / "a.txt"
+    target.parent.mkdir()
+    target.write_text("x")
+    (tmp_path / "link.txt").symlink_to(target)
+    (tmp_path / "alias").symlink_to(tmp_path / "real")
+    lock = writer.path_lock(str(target))
+    assert writer.path_lock(str(tmp_path / "link.txt")) is lock
+    assert writer.path_lock(str(tmp_path / "alias" / "a.txt")) is lock
+
+
+@pytest.mark.skipif(os.name == "nt", reason="需要创建符号链接的权限")
+def test_append_through_symlink_waits_for_atomic_write_of_target(tmp_path):
+    target = tmp_path / "a.txt"
+    target.write_bytes(b"abc")
+    link = tmp_path / "link.txt"
+    link.symlink_to(target)
+    appended = threading.Event()
+
+    def append():
+        writer.write_direct(str(link), b"def", append=True, offset=3)
+        appended.set()
+
+    with writer.path_lock(str(target)):
+        thread = threading.Thread(target=append)
+        thread.start()
+        # 目标文件的锁被持有时，经由链接的追加必须等待
+        assert not appended.wait(0.2)
+    thread.join(2)
+    assert appended.is_set()
+    assert link.is_symlink() and target.read_bytes() == b"abcdef"
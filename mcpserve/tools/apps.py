@@ -0,0 +1,26 @@
+"""应用名称映射表（纯数据，后端的本地意图识别也会读取）"""
+
+# 系统内置应用
+SYSTEM_APPS = {
+    "notepad": "notepad.exe", "记事本": "notepad.exe",
+    "calculator": "calc.exe", "计算器": "calc.exe",
+    "explorer": "explorer.exe", "资源管理器": "explorer.exe",
+    "cmd": "cmd.exe", "命令提示符": "cmd.exe",
+    "powershell": "powershell.exe",
+    "paint": "mspaint.exe", "画图": "mspaint.exe",
+    "snipping": "snippingtool.exe", "截图": "snippingtool.exe",
+}
+
+# 关键词映射（包含中英文）
+APP_KEYWORDS = {
+    "微信": ["微信", "wechat", "weixin"], "wechat": ["微信", "wechat", "weixin"],
+    "qq": ["qq", "tencent"], "chrome": ["chrome", "google"],
+    "edge": ["msedge", "edge"], "firefox": ["firefox", "mozilla"],
+    "vscode": ["code", "vscode"], "idea": ["idea", "intellij"],
+    "pycharm": ["pycharm"], "钉钉": ["钉钉", "dingtalk"], 
+    "飞书": ["飞书", "feishu", "lark"], "feishu": ["飞书", "feishu", "lark"],
+    "网易云": ["网易云", "cloudmusic", "netease"], "spotify": ["spotify"],
+    "steam": ["steam"], "discord": ["discord"], "telegram": ["telegram"],
+    "word": ["winword", "word"], "excel": ["excel"],
+    "ppt": ["powerpnt", "powerpoint"], "outlook": ["outlook"],
+}
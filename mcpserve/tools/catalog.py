@@ -0,0 +1,270 @@
+"""应用目录 - 预先扫描快捷方式、安装目录和 .desktop 文件，按名称直接查找应用"""
+import json
+import os
+import re
+import threading
+import time
+
+from . import settings
+from .apps import SYSTEM_APPS, APP_KEYWORDS
+
+CATALOG_VERSION = 1
+# 安装目录中不作为应用入口的程序
+SKIP_EXE_WORDS = ("unins", "update", "crash", "setup")
+# 应用入口文件的类型，数字越小优先级越高（同名时开始菜单快捷方式优先于安装目录中的程序）
+ENTRY_PRIORITY = {".lnk": 0, ".desktop": 0, "": 1, ".exe": 2}
+# 查找不到时触发增量刷新的最小间隔（秒）
+MISS_REFRESH_INTERVAL = 10
+
+_DESKTOP_FIELD_CODE = re.compile(r"%[a-zA-Z]")
+_NAME_NOISE = re.compile(r"[\s\-_.()（）·]+")
+
+
+def normalize(name: str) -> str:
+    """统一大小写并去掉空格、标点，"Visual Studio Code" 与 "visual-studio-code" 视为同名"""
+    return _NAME_NOISE.sub("", name.lower())
+
+
+def _parse_desktop_file(path: str) -> tuple[list, bool]:
+    """读取 .desktop 文件中的名称和启动命令，返回 (名称列表, 是否应隐藏)"""
+    names, hidden, in_entry = [], False, False
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("["):
+                    in_entry = line == "[Desktop Entry]"
+                    continue
+                if not in_entry or "=" not in line:
+                    continue
+                key, value = line.split("=", 1)
+                if key == "Name" or key.startswith("Name[") or key == "GenericName":
+                    names.append(value)
+                elif key == "Exec":
+                    command = _DESKTOP_FIELD_CODE.sub("", value).split()
+                    # 跳过 env 和环境变量设置，取实际启动的程序名
+                    while command and (command[0] == "env" or "=" in command[0]):
+                        command = command[1:]
+                    if command:
+                        names.append(os.path.basename(command[0].strip('"')))
+                elif key in ("NoDisplay", "Hidden") and value.lower() == "true":
+                    hidden = True
+    except OSError:
+        return [], True
+    return names, hidden
+
+
+def _entry_names(path: str, root: str) -> list | None:
+    """应用入口文件的可查找名称；不是应用入口时返回 None"""
+    name = os.path.basename(path)
+    stem, ext = os.path.splitext(name)
+    ext = ext.lower()
+    if ext == ".lnk":
+        return [stem]
+    if ext == ".desktop":
+        names, hidden = _parse_desktop_file(path)
+        return None if hidden else [stem, *names]
+    if ext == ".exe":
+        if any(word in stem.lower() for word in SKIP_EXE_WORDS):
+            return None
+        # 安装目录下的程序也可以用所在的软件目录名查找（如 Tencent\WeChat\WeChat.exe 可用 tencent 查到）
+        parts = os.path.relpath(path, root).split(os.sep)
+        return [stem, *parts[:-1][:2]]
+    if os.name != "nt" and not ext and os.access(path, os.X_OK):
+        return [name]
+    return None
+
+
+class AppCatalog:
+    """
+    应用目录
+
+    按目录保存扫描结果和目录 mtime，持久化到 JSON 文件；刷新时只重新列出 mtime 变化的目录。
+    查找时先按规范化名称和 APP_KEYWORDS 别名精确匹配，再按名称包含关系匹配，不访问文件系统
+    """
+
+    def __init__(self, path: str, roots: list, max_depth: int = 4, refresh_interval: float = 300):
+        self.path = path
+        # 去重并保持顺序，靠前的根目录优先级更高
+        expanded = [os.path.abspath(os.path.expandvars(os.path.expanduser(root))) for root in roots]
+        self.roots = list(dict.fromkeys(expanded))
+        self.max_depth = max_depth
+        self.refresh_interval = refresh_interval
+        # _lock 只保护目录和名称表的替换，查找不会等待磁盘扫描；_refresh_lock 让刷新串行执行
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # 目录 -> {"mtime", "subdirs", "apps": [[路径, 名称列表, 优先级], ...]}
+        self._dirs = {}
+        self._names = {}
+        self._loaded = False
+        self._started = False
+        self._refreshed_at = 0.0
+        self.stats = {"refreshes": 0, "last_refresh_ms": 0, "dirs_listed": 0, "lookups": 0, "misses": 0}
+
+    # ========== 扫描 ==========
+
+    def start(self):
+        """加载并刷新目录，之后在后台定时增量刷新（重复调用无效）"""
+        if self._started:
+            return
+        self._started = True
+        self.ensure_loaded()
+        self.refresh()
+        threading.Thread(target=self._run, name="app-catalog", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[应用目录] 刷新失败: {e}")
+
+    def ensure_loaded(self):
+        """首次使用时从磁盘加载；没有保存过的目录时同步扫描一次"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == CATALOG_VERSION and data.get("roots") == self.roots:
+                    self._dirs = data["dirs"]
+            except (OSError, ValueError, KeyError):
+                pass
+            self._loaded = True
+            if self._dirs:
+                self._names = self._build_names(self._dirs)
+                return
+        self.refresh()
+
+    def refresh(self) -> int:
+        """增量刷新，返回应用数量；扫描在锁外进行，完成后再替换目录和名称表"""
+        with self._refresh_lock:
+            started = time.perf_counter()
+            previous = self._dirs
+            dirs = {}
+            listed = 0
+            for priority, root in enumerate(self.roots):
+                stack = [(root, 0)]
+                while stack:
+                    path, depth = stack.pop()
+                    state, changed = self._scan_dir(previous, path, root, priority, depth)
+                    if state is None:
+                        continue
+                    listed += changed
+                    dirs[path] = state
+                    if depth + 1 < self.max_depth:
+                        stack.extend((subdir, depth + 1) for subdir in state["subdirs"])
+            changed = listed > 0 or dirs.keys() != previous.keys()
+            if changed:
+                names = self._build_names(dirs)
+                with self._lock:
+                    self._dirs, self._names = dirs, names
+                self._save(dirs)
+            count = len(self._names)
+            self._refreshed_at = time.monotonic()
+            elapsed = round((time.perf_counter() - started) * 1000)
+            self.stats["refreshes"] += 1
+            self.stats["last_refresh_ms"] = elapsed
+            self.stats["dirs_listed"] += listed
+        if changed:
+            print(f"[应用目录] 已更新，{count} 个名称，列出 {listed} 个目录，耗时 {elapsed}ms")
+        return count
+
+    @staticmethod
+    def _scan_dir(previous: dict, path: str, root: str, priority: int, depth: int) -> tuple[dict | None, int]:
+        """返回 (目录状态, 是否重新列出)；mtime 与上次扫描结果 previous 中相同时沿用"""
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None, 0
+        old = previous.get(path)
+        if old is not None and old["mtime"] == mtime:
+            return old, 0
+
+        subdirs, apps = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        names = _entry_names(entry.path, root)
+                        if names:
+                            rank = ENTRY_PRIORITY.get(os.path.splitext(entry.name)[1].lower(), 1)
+                            apps.append([entry.path, names, [priority, rank, depth]])
+                    except OSError:
+                        continue
+        except OSError:
+            return None, 0
+        return {"mtime": mtime, "subdirs": subdirs, "apps": apps}, 1
+
+    @staticmethod
+    def _build_names(dirs: dict) -> dict:
+        """规范化名称 -> (优先级, 路径)，同名时保留优先级最高的"""
+        names = {}
+        for state in dirs.values():
+            for path, app_names, priority in state["apps"]:
+                key_priority = tuple(priority)
+                for name in app_names:
+                    key = normalize(name)
+                    if key and (key not in names or key_priority < names[key][0]):
+                        names[key] = (key_priority, path)
+        return names
+
+    def _save(self, dirs: dict):
+        data = {"version": CATALOG_VERSION, "roots": self.roots, "dirs": dirs}
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[应用目录] 保存失败: {e}")
+
+    # ========== 查找 ==========
+
+    def _lookup(self, keywords: list) -> str | None:
+        names = self._names
+        keys = [normalize(keyword) for keyword in keywords]
+        keys = [key for key in keys if key]
+        exact = [names[key] for key in keys if key in names]
+        if exact:
+            return min(exact)[1]
+        # 名称包含关键词（与原先按 *关键词* 匹配一致），同优先级时名称越短越接近
+        partial = [
+            (priority, len(name), path)
+            for name, (priority, path) in names.items()
+            if any(key in name for key in keys)
+        ]
+        return min(partial)[2] if partial else None
+
+    def find(self, app_name: str) -> str | None:
+        """按名称或别名查找应用，返回可启动的路径"""
+        app_lower = app_name.lower()
+        if app_lower in SYSTEM_APPS:
+            return SYSTEM_APPS[app_lower]
+        self.ensure_loaded()
+        self.stats["lookups"] += 1
+        keywords = APP_KEYWORDS.get(app_lower, [app_name, app_lower])
+        path = self._lookup(keywords)
+        if path is None:
+            self.stats["misses"] += 1
+        stale = path is None or not os.path.exists(path)
+        if stale and time.monotonic() - self._refreshed_at >= MISS_REFRESH_INTERVAL:
+            # 可能是刚安装或卸载的应用，增量刷新后再查一次
+            self.refresh()
+            path = self._lookup(keywords)
+        return path
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "names": len(self._names), "dirs": len(self._dirs), "roots": self.roots}
+
+
+# 全局实例
+app_catalog = AppCatalog(settings.APP_CATALOG_PATH, settings.APP_ROOTS, settings.APP_SCAN_DEPTH,
+                         settings.APP_REFRESH_INTERVAL)
@@ -1,10 +1,15 @@
 """文件工具 - 文件和文件夹搜索、打开"""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
 import subprocess
+import json
 import os
-import glob
+
+from . import grep, reader, settings, walker, writer
+from .index import file_index
+from .pools import offload, quick_pool
 
 router = APIRouter(prefix="/file", tags=["文件"])
 
@@ -13,6 +18,20 @@ class SearchFileRequest(BaseModel):
     filename: str
     search_path: str = ""
     max_results: int = 10
+    timeout: float = 0  # 实时遍历的时间预算（秒），0 表示使用默认值
+    cursor: str = ""  # 上次搜索返回的续查标记
+
+
+class GrepRequest(BaseModel):
+    query: str
+    search_path: str = ""
+    file_pattern: str = ""  # 只搜索文件名匹配的文件，如 *.md
+    regex: bool = False
+    case_sensitive: bool = False
+    context: int = 2  # 匹配行前后各返回几行
+    max_results: int = 20
+    max_per_file: int = 5  # 每个文件最多返回的匹配行数
+    timeout: float = 0  # 时间预算（秒），0 表示使用默认值
 
 
 class OpenFileRequest(BaseModel):
@@ -26,80 +45,205 @@ class CreateFileRequest(BaseModel):
 
 class ReadFileRequest(BaseModel):
     file_path: str
-    max_size: int = 102400  # 默认最大读取100KB
+    max_size: int = 102400  # 单次最多返回的字节数，默认100KB
+    mode: str = ""  # head、tail、lines、bytes，为空时读取全部（超过 max_size 时只返回开头）
+    offset: int = 0  # bytes 模式的起始字节
+    length: int = 0  # bytes 模式读取的字节数
+    start_line: int = 0  # lines 模式的起止行（从 1 开始，包含两端）
+    end_line: int = 0
+    lines: int = 0  # head / tail 模式的行数
 
 
 class WriteFileRequest(BaseModel):
     file_path: str
     content: str
     mode: str = "overwrite"  # overwrite 或 append
+    atomic: bool = True  # 覆盖写入时先写临时文件再替换，中途失败不会留下写了一半的文件
+    offset: int = -1  # 追加时要求文件当前大小等于 offset（断点续写），小于 0 时不检查
 
 
-def get_default_search_paths() -> list:
-    """获取默认搜索路径"""
-    user_profile = os.path.expandvars(r"%UserProfile%")
-    return [
-        os.path.join(user_profile, "Desktop"),
-        os.path.join(user_profile, "Documents"),
-        os.path.join(user_profile, "Downloads"),
-        os.path.join(user_profile, "Pictures"),
-        os.path.join(user_profile, "Videos"),
-        os.path.join(user_profile, "Music"),
-        user_profile,
-        "D:\\",
-        "E:\\",
-    ]
+class UploadChunkRequest(BaseModel):
+    file_path: str
+    content: str = ""
+    upload_id: str = ""  # 为空时开始新的上传
+    offset: int = 0  # 本块在文件中的字节偏移，必须等于已接收的字节数
+    total_size: int = 0  # 文件总字节数（可选），开始上传时预先分配空间
+    final: bool = False  # 最后一块，写完后替换目标文件
+    overwrite: bool = True  # 目标已存在时是否覆盖
 
 
-@router.post("/search")
-async def search_file(request: SearchFileRequest):
-    """搜索文件"""
-    filename = request.filename
-    max_results = request.max_results
-    
-    search_paths = [request.search_path] if request.search_path else get_default_search_paths()
-    
+def search_roots(search_path: str = "") -> list:
+    """实时遍历和内容搜索的范围：指定了 search_path 时只搜索该路径，否则为 SEARCH_ROOTS（与文件名索引相同）；不存在的目录跳过"""
+    paths = [search_path] if search_path else settings.SEARCH_ROOTS
+    return [path for path in paths if os.path.isdir(path)]
+
+
+def warm_up():
+    """启动文件名索引（首次扫描在后台进行，完成前搜索走实时遍历）"""
+    if settings.INDEX_ENABLED:
+        file_index.start()
+
+
+def search_index(name: str, is_dir: bool, search_path: str, max_results: int) -> list | None:
+    """
+    从文件名索引查找，返回仍然存在的条目
+
+    索引未启用、首次扫描未完成或不覆盖 search_path 时返回 None，由调用方实时遍历
+    """
+    if not settings.INDEX_ENABLED:
+        return None
+    if not file_index.covers(search_path or None):
+        return None
     results = []
-    searched_paths = []
-    
-    for base_path in search_paths:
-        if not os.path.exists(base_path):
-            continue
-        
-        searched_paths.append(base_path)
-        
-        try:
-            pattern = os.path.join(base_path, "**", f"*{filename}*")
-            for match in glob.glob(pattern, recursive=True):
-                if os.path.isfile(match):
-                    try:
-                        stat = os.stat(match)
-                        results.append({
-                            "path": match,
-                            "name": os.path.basename(match),
-                            "size": stat.st_size,
-                            "modified": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
-                        })
-                    except:
-                        pass
-                    if len(results) >= max_results:
-                        break
-        except Exception as e:
-            print(f"搜索 {base_path} 出错: {e}")
-        
+    for entry in file_index.search(name, is_dir, search_path or None, max_results * 2):
+        # 索引可能落后于磁盘，返回前确认一次
+        if os.path.isdir(entry["path"]) if is_dir else os.path.isfile(entry["path"]):
+            results.append(entry)
         if len(results) >= max_results:
             break
+    return results
+
+
+def _format_file(entry: dict) -> dict:
+    return {
+        "path": entry["path"],
+        "name": entry["name"],
+        "size": entry["size"],
+        "modified": datetime.fromtimestamp(entry["mtime"]).strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def _search_files_index(request: SearchFileRequest) -> list | None:
+    """从索引查找文件，大小和修改时间按磁盘上的最新信息返回；索引不可用时返回 None"""
+    indexed = search_index(request.filename, False, request.search_path, request.max_results)
+    if indexed is None:
+        return None
+    files = []
+    for entry in indexed:
+        try:
+            stat = os.stat(entry["path"])
+        except OSError:
+            continue
+        files.append(_format_file({**entry, "size": stat.st_size, "mtime": stat.st_mtime}))
+    return files
+
+
+async def index_events(items: list):
+    """索引查询结果对应的流式事件"""
+    for item in items:
+        yield {"type": "item", "data": item}
+    yield {"type": "end", "truncated": False, "cursor": ""}
+
+
+def stream_response(start: dict, events, format_item=None) -> StreamingResponse:
+    """
+    把搜索事件编码为 NDJSON 流：首行 {"type": "start", "key": 结果列表字段, ...}，
+    随后为 item / progress 事件，最后一行为 end（或 error）
+    """
+    async def body():
+        yield json.dumps({"type": "start", **start}, ensure_ascii=False) + "\n"
+        async for event in events:
+            if event["type"] == "item" and format_item is not None:
+                event = {"type": "item", "data": format_item(event["data"])}
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+@router.post("/search")
+async def search_file(request: SearchFileRequest, http_request: Request):
+    """搜索文件（优先查文件名索引，超时返回部分结果和续查标记）"""
+    filename = request.filename
+    max_results = request.max_results
+
+    files = None if request.cursor else await quick_pool.run(_search_files_index, request)
+    if files is not None:
+        return {
+            "success": True,
+            "count": len(files),
+            "files": files,
+            "searched_paths": [request.search_path] if request.search_path else file_index.covers(),
+            "source": "index",
+            "truncated": False,
+            "cursor": ""
+        }
     
+    searched_paths = search_roots(request.search_path)
+
+    found = await walker.search(http_request, searched_paths, filename, False, max_results,
+                                request.timeout, request.cursor)
+    if found is None:
+        return {"success": False, "message": "续查标记已过期，请重新搜索"}
+
+    results = [_format_file(entry) for entry in found["results"]]
+
     return {
         "success": True,
         "count": len(results),
         "files": results,
-        "searched_paths": searched_paths
+        "searched_paths": searched_paths,
+        "source": "scan",
+        "truncated": found["truncated"],
+        "cursor": found["cursor"]
+    }
+
+
+@router.post("/search/stream")
+async def search_file_stream(request: SearchFileRequest):
+    """流式搜索文件：边找边以 NDJSON 返回，参数与 /file/search 相同"""
+    files = None if request.cursor else await quick_pool.run(_search_files_index, request)
+    if files is not None:
+        searched_paths = [request.search_path] if request.search_path else file_index.covers()
+        return stream_response(
+            {"key": "files", "searched_paths": searched_paths, "source": "index"},
+            index_events(files),
+        )
+
+    searched_paths = search_roots(request.search_path)
+    return stream_response(
+        {"key": "files", "searched_paths": searched_paths, "source": "scan"},
+        walker.stream(searched_paths, request.filename, False, request.max_results, request.timeout, request.cursor),
+        _format_file,
+    )
+
+
+@router.post("/grep")
+async def grep_content(request: GrepRequest, http_request: Request):
+    """按内容搜索文件：在搜索路径下的文本文件中查找关键词或正则，返回匹配行及上下文"""
+    searched_paths = search_roots(request.search_path)
+
+    try:
+        found = await grep.search(http_request, searched_paths, request.query, request.max_results,
+                                  request.timeout, request.regex, request.case_sensitive,
+                                  request.file_pattern, request.context, request.max_per_file)
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
+
+    return {
+        "success": True,
+        "count": len(found["results"]),
+        "matches": found["results"],
+        "searched_paths": searched_paths,
+        "scanned_files": found.get("scanned_files", 0),
+        "truncated": found["truncated"],
+        "cursor": ""
     }
 
 
+@router.post("/grep/stream")
+async def grep_content_stream(request: GrepRequest):
+    """流式内容搜索：边找边以 NDJSON 返回，参数与 /file/grep 相同"""
+    searched_paths = search_roots(request.search_path)
+    return stream_response(
+        {"key": "matches", "searched_paths": searched_paths},
+        grep.stream(searched_paths, request.query, request.max_results, request.timeout, request.regex,
+                    request.case_sensitive, request.file_pattern, request.context, request.max_per_file),
+    )
+
+
 @router.post("/open")
-async def open_file(request: OpenFileRequest):
+@offload(quick_pool)
+def open_file(request: OpenFileRequest):
     """用默认程序打开文件"""
     file_path = request.file_path
     
@@ -119,108 +263,190 @@ async def open_file(request: OpenFileRequest):
 
 
 @router.post("/create")
-async def create_file(request: CreateFileRequest):
-    """创建文件"""
+@offload(quick_pool)
+def create_file(request: CreateFileRequest):
+    """创建文件（原子创建，已存在时不覆盖）"""
     file_path = request.file_path
-    
-    # 确保父目录存在
-    parent_dir = os.path.dirname(file_path)
-    if parent_dir and not os.path.exists(parent_dir):
-        try:
-            os.makedirs(parent_dir)
-        except Exception as e:
-            return {"success": False, "message": f"创建目录失败: {str(e)}"}
-    
-    # 检查文件是否已存在
-    if os.path.exists(file_path):
-        return {"success": False, "message": f"文件已存在: {file_path}"}
-    
+
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(request.content)
+        writer.write_atomic(file_path, request.content.encode("utf-8"), exclusive=True)
         return {
             "success": True,
             "message": f"已创建文件: {os.path.basename(file_path)}",
             "path": file_path
         }
+    except FileExistsError:
+        return {"success": False, "message": f"文件已存在: {file_path}"}
     except Exception as e:
         return {"success": False, "message": f"创建文件失败: {str(e)}"}
 
 
 @router.post("/read")
-async def read_file(request: ReadFileRequest):
-    """读取文件内容"""
+@offload(quick_pool)
+def read_file(request: ReadFileRequest):
+    """读取文件内容，支持按字节范围、行范围、开头或结尾读取大文件的一部分"""
     file_path = request.file_path
-    
-    if not os.path.exists(file_path):
+
+    try:
+        result = reader.read_text(
+            file_path, request.mode, request.max_size, request.offset, request.length,
+            request.start_line, request.end_line, request.lines,
+        )
+    except FileNotFoundError:
         return {"success": False, "message": f"文件不存在: {file_path}"}
-    
-    if not os.path.isfile(file_path):
+    except IsADirectoryError:
         return {"success": False, "message": f"不是文件: {file_path}"}
-    
-    try:
-        file_size = os.path.getsize(file_path)
-        
-        if file_size > request.max_size:
-            return {
-                "success": False,
-                "message": f"文件过大 ({file_size} bytes)，超过限制 ({request.max_size} bytes)"
-            }
-        
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        
-        return {
-            "success": True,
-            "path": file_path,
-            "name": os.path.basename(file_path),
-            "size": file_size,
-            "content": content
-        }
-    except UnicodeDecodeError:
+    except reader.BinaryFileError:
         return {"success": False, "message": "文件不是文本文件，无法读取"}
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
     except Exception as e:
         return {"success": False, "message": f"读取文件失败: {str(e)}"}
 
+    response = {
+        "success": True,
+        "path": file_path,
+        "name": os.path.basename(file_path),
+        **result,
+    }
+    if result["truncated"]:
+        response["message"] = "内容过长已截断，可用 mode=lines（start_line/end_line）、tail 或 bytes（offset）继续读取"
+    return response
 
 
 @router.post("/write")
-async def write_file(request: WriteFileRequest):
+@offload(quick_pool)
+def write_file(request: WriteFileRequest):
     """写入文件内容"""
     file_path = request.file_path
-    
-    # 确保父目录存在
-    parent_dir = os.path.dirname(file_path)
-    if parent_dir and not os.path.exists(parent_dir):
-        try:
-            os.makedirs(parent_dir)
-        except Exception as e:
-            return {"success": False, "message": f"创建目录失败: {str(e)}"}
-    
+    append = request.mode == "append"
+    data = request.content.encode("utf-8")
+
     try:
-        # 根据模式选择写入方式
-        if request.mode == "append":
-            write_mode = "a"
+        if append or not request.atomic:
+            file_size = writer.write_direct(file_path, data, append=append, offset=request.offset)
         else:
-            write_mode = "w"
-        
-        with open(file_path, write_mode, encoding="utf-8") as f:
-            f.write(request.content)
-        
-        file_size = os.path.getsize(file_path)
-        
+            file_size = writer.write_atomic(file_path, data)
+
         return {
             "success": True,
-            "message": f"已{'追加' if request.mode == 'append' else '写入'}文件: {os.path.basename(file_path)}",
+            "message": f"已{'追加' if append else '写入'}文件: {os.path.basename(file_path)}",
             "path": file_path,
             "size": file_size
         }
+    except writer.OffsetMismatchError as e:
+        return {"success": False, "message": str(e), "path": file_path, "size": e.size}
     except Exception as e:
         return {"success": False, "message": f"写入文件失败: {str(e)}"}
 
 
+def _upload_result(upload: writer.Upload, size: int | None = None) -> dict:
+    if size is None:
+        return {"success": True, "upload_id": upload.id, "path": upload.path, "received": upload.received}
+    return {
+        "success": True,
+        "message": f"已上传文件: {os.path.basename(upload.path)}",
+        "path": upload.path,
+        "size": size
+    }
+
+
+@router.post("/upload")
+@offload(quick_pool)
+def upload_chunk(request: UploadChunkRequest):
+    """
+    分块上传：第一块不带 upload_id，返回的 upload_id 用于后续各块；
+    每块的 offset 必须等于已接收的字节数，不一致时返回失败和 received，从该位置重新发送即可续传
+    """
+    try:
+        if request.upload_id:
+            upload = writer.get_upload(request.upload_id)
+            if upload is None:
+                return {"success": False, "message": "上传不存在或已过期，请重新上传"}
+        else:
+            if request.offset != 0:
+                return {"success": False, "message": "新的上传 offset 必须为 0"}
+            upload = writer.start_upload(request.file_path, request.total_size, exclusive=not request.overwrite)
+
+        upload.write(request.offset, request.content.encode("utf-8"))
+        if request.final:
+            return _upload_result(upload, writer.finish_upload(upload))
+        return _upload_result(upload)
+    except writer.OffsetMismatchError as e:
+        return {"success": False, "message": str(e), "upload_id": request.upload_id, "received": e.size}
+    except FileExistsError:
+        return {"success": False, "message": f"文件已存在: {request.file_path}"}
+    except Exception as e:
+        return {"success": False, "message": f"上传文件失败: {str(e)}"}
+
+
+@router.post("/upload/stream")
+async def upload_stream(http_request: Request, file_path: str = "", upload_id: str = "", offset: int = 0,
+                        total_size: int = 0, final: bool = True, overwrite: bool = True):
+    """
+    流式上传：请求体为文件的原始字节，边接收边写入临时文件，结束后原子替换目标文件。
+    带 upload_id 和 offset 时接在已上传的部分之后（可先用 /file/upload 开始上传以拿到 upload_id，
+    连接中断后用 GET /file/upload/{upload_id} 查询已接收的字节数再续传）
+    """
+    if upload_id:
+        upload = writer.get_upload(upload_id)
+        if upload is None:
+            return {"success": False, "message": "上传不存在或已过期，请重新上传"}
+    elif not file_path:
+        return {"success": False, "message": "缺少 file_path"}
+    else:
+        try:
+            upload = await quick_pool.run(writer.start_upload, file_path, total_size, not overwrite)
+        except Exception as e:
+            return {"success": False, "message": f"上传文件失败: {str(e)}"}
+
+    # 攒够一定大小再交给线程池写入，减少线程切换
+    buffer = bytearray()
+    try:
+        async for chunk in http_request.stream():
+            buffer += chunk
+            if len(buffer) >= writer.STREAM_BUFFER:
+                offset = await quick_pool.run(upload.write, offset, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            offset = await quick_pool.run(upload.write, offset, bytes(buffer))
+        if final:
+            return _upload_result(upload, await quick_pool.run(writer.finish_upload, upload))
+        return _upload_result(upload)
+    except writer.OffsetMismatchError as e:
+        return {"success": False, "message": str(e), "upload_id": upload.id, "received": e.size}
+    except FileExistsError:
+        return {"success": False, "message": f"文件已存在: {upload.path}"}
+    except Exception as e:
+        # 连接中断等：已写入的部分保留在上传中，可凭 upload_id 续传
+        print(f"[工具] 流式上传中断: {upload.path}, 已接收 {upload.received} 字节, {e}")
+        return {"success": False, "message": f"上传文件失败: {str(e)}", "upload_id": upload.id,
+                "received": upload.received}
+
+
+@router.get("/upload/{upload_id}")
+async def get_upload_status(upload_id: str):
+    """查询分块上传已接收的字节数"""
+    upload = writer.get_upload(upload_id)
+    if upload is None:
+        return {"success": False, "message": "上传不存在或已过期，请重新上传"}
+    return _upload_result(upload)
+
+
+@router.delete("/upload/{upload_id}")
+@offload(quick_pool)
+def cancel_upload(upload_id: str):
+    """取消分块上传并删除临时文件"""
+    upload = writer.get_upload(upload_id)
+    if upload is None:
+        return {"success": False, "message": "上传不存在或已过期"}
+    writer.abort_upload(upload)
+    return {"success": True, "message": "已取消上传", "upload_id": upload_id}
+
+
 @router.delete("/delete")
-async def delete_file(file_path: str):
+@offload(quick_pool)
+def delete_file(file_path: str):
     """删除文件"""
     if not os.path.exists(file_path):
         return {"success": False, "message": f"文件不存在: {file_path}"}
@@ -1,9 +1,12 @@
 """文件夹工具 - 文件夹搜索、打开"""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 import subprocess
 import os
-import glob
+
+from . import walker
+from .pools import offload, quick_pool
+from .file import index_events, search_index, search_roots, stream_response
 
 router = APIRouter(prefix="/folder", tags=["文件夹"])
 
@@ -12,6 +15,8 @@ class SearchFolderRequest(BaseModel):
     folder_name: str
     search_path: str = ""
     max_results: int = 10
+    timeout: float = 0  # 实时遍历的时间预算（秒），0 表示使用默认值
+    cursor: str = ""  # 上次搜索返回的续查标记
 
 
 class OpenFolderRequest(BaseModel):
@@ -22,59 +27,64 @@ class CreateFolderRequest(BaseModel):
     folder_path: str
 
 
-def get_default_search_paths() -> list:
-    """获取默认搜索路径"""
-    user_profile = os.path.expandvars(r"%UserProfile%")
-    return [
-        os.path.join(user_profile, "Desktop"),
-        os.path.join(user_profile, "Documents"),
-        os.path.join(user_profile, "Downloads"),
-        user_profile,
-        "C:\\",
-        "D:\\",
-        "E:\\",
-    ]
-
-
 @router.post("/search")
-async def search_folder(request: SearchFolderRequest):
-    """搜索文件夹"""
+async def search_folder(request: SearchFolderRequest, http_request: Request):
+    """搜索文件夹（优先查文件名索引，超时返回部分结果和续查标记）"""
     folder_name = request.folder_name
     max_results = request.max_results
+
+    indexed = None if request.cursor else await quick_pool.run(
+        search_index, folder_name, True, request.search_path, max_results
+    )
+    if indexed is not None:
+        return {
+            "success": True,
+            "count": len(indexed),
+            "folders": [{"path": entry["path"], "name": entry["name"]} for entry in indexed],
+            "source": "index",
+            "truncated": False,
+            "cursor": ""
+        }
     
-    search_paths = [request.search_path] if request.search_path else get_default_search_paths()
-    
-    results = []
-    
-    for base_path in search_paths:
-        if not os.path.exists(base_path):
-            continue
-        
-        try:
-            pattern = os.path.join(base_path, "**", f"*{folder_name}*")
-            for match in glob.glob(pattern, recursive=True):
-                if os.path.isdir(match):
-                    results.append({
-                        "path": match,
-                        "name": os.path.basename(match)
-                    })
-                    if len(results) >= max_results:
-                        break
-        except Exception as e:
-            print(f"搜索 {base_path} 出错: {e}")
-        
-        if len(results) >= max_results:
-            break
-    
+    found = await walker.search(http_request, search_roots(request.search_path), folder_name, True,
+                                max_results, request.timeout, request.cursor)
+    if found is None:
+        return {"success": False, "message": "续查标记已过期，请重新搜索"}
+
+    results = [{"path": entry["path"], "name": entry["name"]} for entry in found["results"]]
+
     return {
         "success": True,
         "count": len(results),
-        "folders": results
+        "folders": results,
+        "source": "scan",
+        "truncated": found["truncated"],
+        "cursor": found["cursor"]
     }
 
 
+@router.post("/search/stream")
+async def search_folder_stream(request: SearchFolderRequest):
+    """流式搜索文件夹：边找边以 NDJSON 返回，参数与 /folder/search 相同"""
+    indexed = None if request.cursor else await quick_pool.run(
+        search_index, request.folder_name, True, request.search_path, request.max_results
+    )
+    if indexed is not None:
+        return stream_response(
+            {"key": "folders", "source": "index"},
+            index_events([{"path": entry["path"], "name": entry["name"]} for entry in indexed]),
+        )
+
+    return stream_response(
+        {"key": "folders", "source": "scan"},
+        walker.stream(search_roots(request.search_path), request.folder_name, True, request.max_results, request.timeout, request.cursor),
+        lambda entry: {"path": entry["path"], "name": entry["name"]},
+    )
+
+
 @router.post("/open")
-async def open_folder(request: OpenFolderRequest):
+@offload(quick_pool)
+def open_folder(request: OpenFolderRequest):
     """在资源管理器中打开文件夹"""
     folder_path = request.folder_path
     
@@ -97,7 +107,8 @@ async def open_folder(request: OpenFolderRequest):
 
 
 @router.post("/create")
-async def create_folder(request: CreateFolderRequest):
+@offload(quick_pool)
+def create_folder(request: CreateFolderRequest):
     """创建文件夹"""
     folder_path = request.folder_path
     
@@ -0,0 +1,348 @@
+"""内容搜索 - 在搜索路径下的文本文件中并行查找关键词或正则，返回匹配行及上下文"""
+import asyncio
+import fnmatch
+import mmap
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from fastapi import HTTPException
+
+from . import reader, settings
+from .pools import scan_pool
+
+# 搜索文件内容的线程池（各次搜索共用）
+_pool = ThreadPoolExecutor(max_workers=settings.GREP_WORKERS, thread_name_prefix="grep")
+
+# 读取文件开头多少字节判断是否为二进制、识别编码；不超过该大小的文件不再 mmap
+SNIFF_SIZE = 8192
+# 大文件分块匹配，每块之间检查是否停止（匹配很少的大文件也能及时响应取消和超时）
+FIND_CHUNK = 1024 * 1024
+# 每次搜索同时在线程池中的文件数
+MAX_INFLIGHT = settings.GREP_WORKERS * 4
+# 匹配行最多返回的字符数（超出时截取匹配位置附近）
+MAX_LINE_CHARS = 300
+# 上下文行数上限
+MAX_CONTEXT = 5
+# 流式搜索进度事件的最小间隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+# 这些编码下中文等非 ASCII 字符的字节与 UTF-8 不同，关键词按文件编码另行编码后匹配
+_LEGACY_ENCODINGS = ("gb18030", "gbk", "gb2312", "big5")
+
+
+class Matcher:
+    """编译好的匹配规则：在文件的原始字节上匹配，不需要先解码整个文件"""
+
+    def __init__(self, query: str, regex: bool = False, case_sensitive: bool = False):
+        self.query = query
+        self.regex = regex
+        self.flags = 0 if case_sensitive else re.IGNORECASE
+        # 按编码缓存的字节模式
+        self._patterns = {}
+        # 正则无效时抛出 re.error
+        self.pattern("utf-8")
+
+    def pattern(self, encoding: str) -> re.Pattern:
+        """按文件编码取字节模式；正则只按 UTF-8 编码（其他编码的字节可能与正则元字符冲突）"""
+        key = encoding if not self.regex and encoding in _LEGACY_ENCODINGS else "utf-8"
+        compiled = self._patterns.get(key)
+        if compiled is None:
+            try:
+                source = self.query.encode(key)
+            except UnicodeEncodeError:
+                source = self.query.encode("utf-8")
+            compiled = re.compile(source if self.regex else re.escape(source), self.flags)
+            self._patterns[key] = compiled
+        return compiled
+
+
+def _line_text(data: bytes, encoding: str, start: int = 0) -> str:
+    """解码一行并去掉行尾的 \r；过长的行（如压缩过的代码）只解码匹配位置 start 附近"""
+    if len(data) <= MAX_LINE_CHARS * 4:
+        text = data.decode(encoding, errors="replace").rstrip("\r")
+        if len(text) <= MAX_LINE_CHARS:
+            return text
+    begin = max(start - MAX_LINE_CHARS // 3, 0)
+    text = data[begin:begin + MAX_LINE_CHARS * 4].decode(encoding, errors="replace")[:MAX_LINE_CHARS]
+    return ("…" if begin else "") + text + "…"
+
+
+def _context(buf, line_start: int, line_end: int, lines: int, encoding: str) -> tuple[list, list]:
+    """匹配行前后各 lines 行"""
+    before, position = [], line_start
+    for _ in range(lines):
+        if position == 0:
+            break
+        previous = buf.rfind(b"\n", 0, position - 1) + 1
+        before.insert(0, _line_text(buf[previous:position - 1], encoding))
+        position = previous
+    after, position = [], line_end
+    for _ in range(lines):
+        if position + 1 >= len(buf):
+            break
+        following = buf.find(b"\n", position + 1)
+        following = len(buf) if following < 0 else following
+        after.append(_line_text(buf[position + 1:following], encoding))
+        position = following
+    return before, after
+
+
+def grep_file(path: str, matcher: Matcher, context: int, max_matches: int,
+              stop: threading.Event) -> list | None:
+    """
+    在一个文件中查找，返回匹配行列表（同一行只返回一次，最多 max_matches 个）；
+    二进制文件返回 None。小文件直接用读到的开头，大文件 mmap 后匹配
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_SIZE)
+            try:
+                encoding = reader.detect_encoding(head)
+            except reader.BinaryFileError:
+                return None
+            if encoding in ("utf-16", "utf-32"):
+                # 换行不是单字节，按字节匹配不适用
+                return None
+            if len(head) < SNIFF_SIZE:
+                return _find(head, path, matcher.pattern(encoding), encoding, context, max_matches, stop)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _find(mm, path, matcher.pattern(encoding), encoding, context, max_matches, stop)
+    except (OSError, ValueError):
+        return []
+
+
+def _chunk_end(buf, position: int) -> int:
+    """从 position 开始的一块的结束位置：约 FIND_CHUNK 字节，延伸到行尾，不把一行切开"""
+    limit = position + FIND_CHUNK
+    if limit >= len(buf):
+        return len(buf)
+    newline = buf.find(b"\n", limit)
+    return len(buf) if newline < 0 else newline + 1
+
+
+def _find(buf, path: str, pattern: re.Pattern, encoding: str, context: int, max_matches: int,
+          stop: threading.Event) -> list:
+    matches = []
+    line_no, counted = 1, 0
+    line_end = -1
+    position = 0
+    while position < len(buf) and not stop.is_set():
+        chunk_end = _chunk_end(buf, position)
+        for match in pattern.finditer(buf, position, chunk_end):
+            start = match.start()
+            if start <= line_end:
+                # 同一行中的后续匹配
+                continue
+            line_start = buf.rfind(b"\n", 0, start) + 1
+            line_no += buf[counted:line_start].count(b"\n")
+            counted = line_start
+            line_end = buf.find(b"\n", start)
+            line_end = len(buf) if line_end < 0 else line_end
+            before, after = _context(buf, line_start, line_end, context, encoding)
+            matches.append({
+                "path": path,
+                "name": os.path.basename(path),
+                "line": line_no,
+                "text": _line_text(buf[line_start:line_end], encoding, start - line_start),
+                "before": before,
+                "after": after,
+            })
+            if len(matches) >= max_matches or stop.is_set():
+                return matches
+        position = chunk_end
+    return matches
+
+
+def run(roots: list, matcher: Matcher, max_results: int, file_pattern: str = "", context: int = 2,
+        max_per_file: int = 5, deadline: float | None = None, cancel: threading.Event | None = None,
+        on_progress=None) -> dict:
+    """
+    广度优先列出 roots 下的文件（与文件名搜索相同的跳过规则），交给线程池并行查找内容。
+    凑够 max_results、到达 deadline、读取的字节数超过 GREP_MAX_BYTES 或 cancel 被设置时停止。
+    on_progress(新匹配, 统计) 在每查完一个文件后调用，新匹配不超过 max_results。
+    返回 {"results", "truncated", "scanned_files", "skipped_files", "scanned_bytes"}
+    """
+    stop = cancel if cancel is not None else threading.Event()
+    timer = None
+    if deadline is not None:
+        timer = threading.Timer(max(deadline - time.monotonic(), 0), stop.set)
+        timer.daemon = True
+        timer.start()
+
+    pattern = file_pattern.lower()
+    results = []
+    stats = {"scanned_dirs": 0, "scanned_files": 0, "skipped_files": 0, "scanned_bytes": 0}
+    pending = deque()
+    visited = set()
+    inflight = set()
+    exhausted = False
+
+    def add_dir(path: str, depth: int):
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in visited:
+            visited.add(key)
+            pending.append((path, depth))
+
+    def collect(block: bool):
+        done, _ = wait(inflight, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            inflight.discard(future)
+            matches = future.result()
+            if matches is None:
+                stats["skipped_files"] += 1
+                continue
+            stats["scanned_files"] += 1
+            new = matches[:max(max_results - len(results), 0)]
+            results.extend(new)
+            if len(results) >= max_results:
+                stop.set()
+            if on_progress is not None:
+                on_progress(new, dict(stats, found=len(results)))
+
+    for root in roots:
+        if os.path.isdir(root):
+            add_dir(root, 0)
+    try:
+        while pending and not stop.is_set():
+            path, depth = pending.popleft()
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if stop.is_set():
+                            break
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if (depth + 1 < settings.MAX_DEPTH and not entry.is_symlink()
+                                        and not settings.is_pruned(entry.name)):
+                                    add_dir(entry.path, depth + 1)
+                                continue
+                            if not entry.is_file(follow_symlinks=False) or settings.is_ignored(entry.name):
+                                continue
+                            if pattern and not fnmatch.fnmatchcase(entry.name.lower(), pattern):
+                                continue
+                            size = entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            continue
+                        if size == 0 or size > settings.GREP_MAX_FILE_SIZE:
+                            stats["skipped_files"] += 1
+                            continue
+                        if stats["scanned_bytes"] + size > settings.GREP_MAX_BYTES:
+                            exhausted = True
+                            stop.set()
+                            break
+                        stats["scanned_bytes"] += size
+                        while len(inflight) >= MAX_INFLIGHT:
+                            collect(block=True)
+                        inflight.add(_pool.submit(grep_file, entry.path, matcher, context, max_per_file, stop))
+            except OSError:
+                # 没有权限、目录已删除等
+                pass
+            stats["scanned_dirs"] += 1
+            if inflight:
+                collect(block=False)
+        # 停止后正在查找的文件很快返回
+        while inflight:
+            collect(block=True)
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+    return {
+        "results": results[:max_results],
+        "truncated": exhausted or stop.is_set(),
+        **stats,
+    }
+
+
+def _prepare(query: str, regex: bool, case_sensitive: bool, timeout: float) -> tuple[Matcher, float]:
+    """编译匹配规则（为空或正则无效时抛出 ValueError），返回 (匹配规则, 截止时间)"""
+    if not query:
+        raise ValueError("缺少搜索内容")
+    try:
+        matcher = Matcher(query, regex, case_sensitive)
+    except re.error as e:
+        raise ValueError(f"正则表达式无效: {e}")
+    budget = min(timeout, settings.SEARCH_MAX_TIMEOUT) if timeout > 0 else settings.SEARCH_TIMEOUT
+    return matcher, time.monotonic() + budget
+
+
+async def search(http_request, roots: list, query: str, max_results: int, timeout: float,
+                 regex: bool = False, case_sensitive: bool = False, file_pattern: str = "",
+                 context: int = 2, max_per_file: int = 5) -> dict:
+    """
+    带时间预算的内容搜索，在 scan 线程池中执行；客户端断开或请求被取消时停止。
+    返回 run() 的结果，正则无效时抛出 ValueError
+    """
+    matcher, deadline = _prepare(query, regex, case_sensitive, timeout)
+    context = min(max(context, 0), MAX_CONTEXT)
+    cancel = threading.Event()
+    future = scan_pool.submit(run, roots, matcher, max_results, file_pattern, context, max_per_file,
+                              deadline, cancel)
+    try:
+        while True:
+            done, _ = await asyncio.wait({future}, timeout=0.2)
+            if done:
+                break
+            if http_request is not None and await http_request.is_disconnected():
+                cancel.set()
+                print(f"[搜索] 客户端已断开，停止内容搜索: {query}")
+                return {"results": [], "truncated": True}
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+    return future.result()
+
+
+async def stream(roots: list, query: str, max_results: int, timeout: float, regex: bool = False,
+                 case_sensitive: bool = False, file_pattern: str = "", context: int = 2,
+                 max_per_file: int = 5):
+    """
+    与 search 相同的搜索，边查找边产出事件：{"type": "item", "data": 匹配行}、
+    {"type": "progress", "scanned_dirs", "scanned_files", "found"}（至多每 PROGRESS_INTERVAL 秒一次），
+    最后为 {"type": "end", "truncated", "cursor"}（内容搜索不支持续查，cursor 始终为空）
+    """
+    try:
+        matcher, deadline = _prepare(query, regex, case_sensitive, timeout)
+    except ValueError as e:
+        yield {"type": "error", "message": str(e)}
+        return
+    context = min(max(context, 0), MAX_CONTEXT)
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def on_progress(matches: list, progress: dict):
+        loop.call_soon_threadsafe(queue.put_nowait, (matches, progress))
+
+    cancel = threading.Event()
+    try:
+        future = scan_pool.submit(run, roots, matcher, max_results, file_pattern, context, max_per_file,
+                                  deadline, cancel, on_progress)
+    except HTTPException as e:
+        yield {"type": "error", "message": e.detail}
+        return
+    future.add_done_callback(lambda _: queue.put_nowait(None))
+    reported = time.monotonic()
+    try:
+        while (item := await queue.get()) is not None:
+            matches, progress = item
+            for match in matches:
+                yield {"type": "item", "data": match}
+            if time.monotonic() - reported >= PROGRESS_INTERVAL:
+                reported = time.monotonic()
+                yield {"type": "progress", "scanned_dirs": progress["scanned_dirs"],
+                       "scanned_files": progress["scanned_files"], "found": progress["found"]}
+        result = future.result()
+    except (GeneratorExit, asyncio.CancelledError):
+        # 客户端断开时响应体生成器被关闭
+        print(f"[搜索] 客户端已断开，停止内容搜索: {query}")
+        raise
+    finally:
+        # 出错或被关闭时停止仍在进行的搜索
+        if not future.done():
+            cancel.set()
+    yield {"type": "end", "truncated": result["truncated"], "cursor": ""}
@@ -0,0 +1,425 @@
+"""文件名索引 - 持久化的文件/文件夹名索引，支持子串和模糊查找"""
+import difflib
+import os
+import sqlite3
+import threading
+import time
+
+from . import settings
+
+# 一次查询最多取出的候选条目数（之后在内存中精确匹配和排序）
+MAX_CANDIDATES = 5000
+# 每处理多少个目录提交一次事务
+COMMIT_EVERY = 200
+# 文件变化事件合并处理的间隔（秒）
+WATCH_FLUSH_SECONDS = 2
+
+
+def _subtree_range(path: str) -> tuple[str, str]:
+    """目录下所有路径在字典序上的范围"""
+    prefix = path.rstrip("\\/") + os.sep
+    return prefix, prefix + "\U0010ffff"
+
+
+def _is_under(path: str, root: str) -> bool:
+    """path 是否为 root 本身或位于 root 之下"""
+    try:
+        relative = os.path.relpath(path, root)
+    except ValueError:
+        # Windows 下不同盘符
+        return False
+    return relative == "." or not relative.startswith("..")
+
+
+def _has_prefix(path: str, prefix: str) -> bool:
+    """path（已 normcase）是否为目录 prefix 本身或位于其下；只在路径分隔处匹配，/a 不包含 /ab"""
+    return path == prefix or path.startswith(prefix.rstrip("\\/") + os.sep)
+
+
+def _scope(within: str | None) -> tuple[str, tuple]:
+    """
+    把搜索范围限制为 SQL 条件（在 LIMIT 之前筛选，范围外的常见名称不会占满候选数）。
+    LIKE 对 ASCII 不区分大小写，结果再用 _has_prefix 精确比对
+    """
+    if not within:
+        return "", ()
+    prefix = os.path.abspath(within)
+    escaped = prefix.rstrip("\\/").replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    escaped_sep = os.sep.replace("\\", "\\\\")
+    return (" AND (entries.path = ? COLLATE NOCASE OR entries.path LIKE ? ESCAPE '\\')",
+            (prefix, escaped + escaped_sep + "%"))
+
+
+def _score(name: str, terms: list) -> float:
+    """按匹配质量打分：完全匹配 > 前缀匹配 > 词边界匹配 > 普通子串匹配"""
+    lower = name.lower()
+    stem = os.path.splitext(lower)[0]
+    query = " ".join(terms)
+    if stem == query or lower == query:
+        return 100
+    if lower.startswith(query):
+        return 80
+    position = lower.find(query)
+    if position > 0 and not lower[position - 1].isalnum():
+        return 60
+    if position >= 0:
+        return 50
+    return 40
+
+
+class FileIndex:
+    """
+    基于 SQLite 的文件名索引
+
+    - entries 保存路径、名称、类型、大小和修改时间
+    - names 为 FTS5 trigram 倒排索引，子串查询（LIKE '%xx%'）直接走索引；
+      SQLite 不支持 FTS5 时退化为对 entries.name 的扫描
+    - dir_state 记录每个目录上次列出时的 mtime，增量扫描只重新列出 mtime 变化的目录
+    - 安装了 watchdog 时监听文件变化实时更新，否则定时增量扫描
+    """
+
+    def __init__(self, db_path: str, roots: list, max_depth: int = 12, rescan_interval: float = 600):
+        self.db_path = db_path
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.max_depth = max_depth
+        self.rescan_interval = rescan_interval
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self.fts = False
+        self._started = False
+        self._dirty = set()
+        self._dirty_lock = threading.Lock()
+        self._wake = threading.Event()
+        self.watching = False
+        self.stats = {"scans": 0, "last_scan_ms": 0, "dirs_listed": 0, "queries": 0}
+
+    # ========== 数据库 ==========
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._ensure_schema(conn)
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    parent TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    is_dir INTEGER NOT NULL,
+                    size INTEGER DEFAULT 0,
+                    mtime REAL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_entries_parent ON entries (parent);
+
+                CREATE TABLE IF NOT EXISTS dir_state (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL
+                );
+
+                CREATE TABLE IF NOT EXISTS roots (
+                    path TEXT PRIMARY KEY,
+                    scanned_at REAL
+                );
+            """)
+            try:
+                conn.executescript("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(
+                        name, content='entries', content_rowid='id', tokenize='trigram'
+                    );
+                    CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+                        INSERT INTO names (rowid, name) VALUES (new.id, new.name);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+                        INSERT INTO names (names, rowid, name) VALUES ('delete', old.id, old.name);
+                    END;
+                """)
+                self.fts = True
+            except sqlite3.OperationalError as e:
+                print(f"[索引] SQLite 不支持 FTS5 trigram，使用普通查询: {e}")
+            self._schema_ready = True
+
+    # ========== 扫描 ==========
+
+    def start(self):
+        """启动后台索引线程（重复调用无效）"""
+        if self._started:
+            return
+        self._started = True
+        threading.Thread(target=self._run, name="file-index", daemon=True).start()
+
+    def _run(self):
+        self._start_watching()
+        while True:
+            for root in self.roots:
+                if os.path.isdir(root):
+                    self.scan_root(root)
+            deadline = time.monotonic() + self.rescan_interval
+            while time.monotonic() < deadline:
+                self._wake.wait(WATCH_FLUSH_SECONDS)
+                self._wake.clear()
+                self._flush_dirty()
+
+    def scan_root(self, root: str):
+        """增量扫描一个根目录：mtime 未变的目录不重新列出，只继续检查其子目录"""
+        started = time.perf_counter()
+        self._walk([(root, 0)], descend_unchanged=True)
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO roots (path, scanned_at) VALUES (?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET scanned_at = excluded.scanned_at",
+            (root, time.time())
+        )
+        conn.commit()
+        elapsed = round((time.perf_counter() - started) * 1000)
+        self.stats["scans"] += 1
+        self.stats["last_scan_ms"] = elapsed
+        print(f"[索引] {root} 扫描完成，耗时 {elapsed}ms")
+
+    def _walk(self, queue: list, descend_unchanged: bool):
+        conn = self._conn()
+        processed = 0
+        while queue:
+            path, depth = queue.pop()
+            queue.extend(self._sync_dir(conn, path, depth, descend_unchanged))
+            processed += 1
+            if processed % COMMIT_EVERY == 0:
+                conn.commit()
+        conn.commit()
+
+    def _sync_dir(self, conn: sqlite3.Connection, path: str, depth: int, descend_unchanged: bool) -> list:
+        """让索引中目录的直接子项与磁盘一致，返回需要继续处理的子目录"""
+        try:
+            dir_mtime = os.stat(path).st_mtime
+        except OSError:
+            self._remove_subtree(conn, path)
+            return []
+
+        if depth >= self.max_depth:
+            return []
+
+        row = conn.execute("SELECT mtime FROM dir_state WHERE path = ?", (path,)).fetchone()
+        if row and row["mtime"] == dir_mtime:
+            if not descend_unchanged:
+                return []
+            children = conn.execute(
+                "SELECT path FROM entries WHERE parent = ? AND is_dir = 1", (path,)
+            ).fetchall()
+            return [(child["path"], depth + 1) for child in children]
+
+        current = {}
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_symlink():
+                            continue
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if settings.is_pruned(entry.name) if is_dir else settings.is_ignored(entry.name):
+                            continue
+                        stat = entry.stat(follow_symlinks=False)
+                        current[entry.path] = (entry.name, int(is_dir), 0 if is_dir else stat.st_size, stat.st_mtime)
+                    except OSError:
+                        continue
+        except OSError:
+            # 没有权限等情况，保留已有索引
+            return []
+        self.stats["dirs_listed"] += 1
+
+        indexed = {
+            r["path"]: (r["name"], r["is_dir"], r["size"], r["mtime"])
+            for r in conn.execute("SELECT path, name, is_dir, size, mtime FROM entries WHERE parent = ?", (path,))
+        }
+        for child in indexed.keys() - current.keys():
+            self._remove_subtree(conn, child)
+        for child, info in current.items():
+            old = indexed.get(child)
+            if old == info:
+                continue
+            if old is not None and old[1] != info[1]:
+                # 文件和目录互相替换
+                self._remove_subtree(conn, child)
+                old = None
+            if old is None:
+                conn.execute(
+                    "INSERT INTO entries (path, parent, name, is_dir, size, mtime) VALUES (?, ?, ?, ?, ?, ?)",
+                    (child, path, *info)
+                )
+            else:
+                conn.execute("UPDATE entries SET size = ?, mtime = ? WHERE path = ?", (info[2], info[3], child))
+        conn.execute(
+            "INSERT INTO dir_state (path, mtime) VALUES (?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET mtime = excluded.mtime",
+            (path, dir_mtime)
+        )
+        return [(child, depth + 1) for child, info in current.items() if info[1]]
+
+    @staticmethod
+    def _remove_subtree(conn: sqlite3.Connection, path: str):
+        low, high = _subtree_range(path)
+        for table in ("entries", "dir_state"):
+            conn.execute(f"DELETE FROM {table} WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+
+    def _depth(self, path: str) -> int | None:
+        """路径相对所属根目录的深度，不在任何根目录下时返回 None"""
+        for root in self.roots:
+            if _is_under(path, root):
+                relative = os.path.relpath(path, root)
+                return 0 if relative == "." else len(relative.split(os.sep))
+        return None
+
+    # ========== 实时监听 ==========
+
+    def _start_watching(self):
+        """安装了 watchdog 时监听根目录下的变化（Linux 为 inotify，Windows 为 ReadDirectoryChangesW）"""
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            print(f"[索引] 未安装 watchdog，每 {self.rescan_interval:.0f} 秒增量扫描一次")
+            return
+
+        index = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path:
+                        index.mark_dirty(os.path.dirname(path))
+
+        observer = Observer()
+        for root in self.roots:
+            if os.path.isdir(root):
+                try:
+                    observer.schedule(Handler(), root, recursive=True)
+                except OSError as e:
+                    print(f"[索引] 无法监听 {root}: {e}")
+        observer.daemon = True
+        observer.start()
+        self.watching = True
+
+    def mark_dirty(self, path: str):
+        """标记目录需要重新列出"""
+        with self._dirty_lock:
+            self._dirty.add(path)
+
+    def _flush_dirty(self):
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        queue = []
+        for path in dirty:
+            depth = self._depth(path)
+            if depth is not None and not any(settings.is_pruned(part) for part in path.split(os.sep)):
+                queue.append((path, depth))
+        if queue:
+            # 新建的子目录没有 dir_state，会被继续列出；未变化的子目录不再深入
+            self._walk(queue, descend_unchanged=False)
+
+    # ========== 查询 ==========
+
+    def covers(self, path: str | None = None) -> list:
+        """返回已完成首次扫描、且覆盖 path（不指定时为全部）的根目录"""
+        rows = self._conn().execute("SELECT path FROM roots WHERE scanned_at IS NOT NULL").fetchall()
+        ready = [row["path"] for row in rows if row["path"] in self.roots]
+        if path is None:
+            return ready
+        path = os.path.abspath(path)
+        if any(settings.is_pruned(part) for part in path.split(os.sep)):
+            return []
+        return [root for root in ready if _is_under(path, root)]
+
+    def search(self, query: str, is_dir: bool, within: str | None = None, limit: int = 10) -> list:
+        """
+        按名称查找，返回按匹配质量排序的条目
+
+        先按所有关键词做子串匹配；结果不足时用 trigram 做模糊匹配补充
+        """
+        terms = query.lower().split()
+        if not terms:
+            return []
+        self.stats["queries"] += 1
+        conn = self._conn()
+
+        column = "names.name" if self.fts else "entries.name"
+        source = "names JOIN entries ON entries.id = names.rowid" if self.fts else "entries"
+        where = " AND ".join(f"{column} LIKE ?" for _ in terms)
+        scope, scope_params = _scope(within)
+        rows = conn.execute(
+            f"SELECT entries.* FROM {source} WHERE {where} AND entries.is_dir = ?{scope} LIMIT ?",
+            (*(f"%{term}%" for term in terms), int(is_dir), *scope_params, MAX_CANDIDATES)
+        ).fetchall()
+
+        within_prefix = os.path.normcase(os.path.abspath(within)) if within else None
+        scored = {}
+        for row in rows:
+            lower = row["name"].lower()
+            # LIKE 中的 _ 和 % 是通配符，这里再精确比对一次
+            if not all(term in lower for term in terms):
+                continue
+            if within_prefix and not _has_prefix(os.path.normcase(row["path"]), within_prefix):
+                continue
+            scored[row["path"]] = (_score(row["name"], terms), row)
+
+        if len(scored) < limit and self.fts:
+            for path, item in self._fuzzy(conn, " ".join(terms), is_dir, within).items():
+                scored.setdefault(path, item)
+
+        # 分数相同时，层级浅、最近修改的排在前面
+        ranked = sorted(
+            scored.values(),
+            key=lambda item: (-item[0], item[1]["path"].count(os.sep), -item[1]["mtime"]),
+        )
+        return [dict(row) for _, row in ranked[:limit]]
+
+    def _fuzzy(self, conn: sqlite3.Connection, query: str, is_dir: bool, within: str | None) -> dict:
+        """trigram 召回 + 编辑相似度打分的模糊匹配"""
+        compact = query.replace(" ", "")
+        grams = {compact[i:i + 3] for i in range(len(compact) - 2)}
+        if not grams:
+            return {}
+        match = " OR ".join('"' + gram.replace('"', '""') + '"' for gram in grams)
+        scope, scope_params = _scope(within)
+        try:
+            rows = conn.execute(
+                "SELECT entries.* FROM names JOIN entries ON entries.id = names.rowid "
+                f"WHERE names MATCH ? AND entries.is_dir = ?{scope} ORDER BY rank LIMIT 200",
+                (match, int(is_dir), *scope_params)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return {}
+
+        within_prefix = os.path.normcase(os.path.abspath(within)) if within else None
+        result = {}
+        for row in rows:
+            if within_prefix and not _has_prefix(os.path.normcase(row["path"]), within_prefix):
+                continue
+            stem = os.path.splitext(row["name"].lower())[0]
+            ratio = difflib.SequenceMatcher(None, compact, stem).ratio()
+            if ratio >= 0.6:
+                result[row["path"]] = (ratio * 30, row)
+        return result
+
+    def get_stats(self) -> dict:
+        conn = self._conn()
+        return {
+            **self.stats,
+            "entries": conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+            "roots": self.covers(),
+            "fts": self.fts,
+            "watching": self.watching,
+        }
+
+
+# 全局实例
+file_index = FileIndex(settings.INDEX_PATH, settings.SEARCH_ROOTS, settings.MAX_DEPTH, settings.INDEX_RESCAN_INTERVAL)
@@ -0,0 +1,95 @@
+"""工作线程池 - 阻塞的文件系统和进程操作放到有界线程池中执行，不占用事件循环"""
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from . import settings
+
+
+class WorkerPool:
+    """
+    固定线程数、排队数有上限的线程池
+
+    排队的任务超过 max_queue 时直接返回 503，避免请求无限堆积；
+    统计正在执行、排队中的任务数和排队等待时间，用于判断是否饱和
+    """
+
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"pool-{name}")
+        self._lock = threading.Lock()
+        self.active = 0
+        self.queued = 0
+        self.stats = {"completed": 0, "rejected": 0, "peak_queued": 0, "wait_ms_total": 0.0, "max_wait_ms": 0.0}
+
+    def submit(self, fn, *args, **kwargs) -> asyncio.Future:
+        """提交任务，返回可 await 的 Future；队列已满时抛出 HTTPException(503)"""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise HTTPException(status_code=503, detail=f"服务繁忙（{self.name} 队列已满），请稍后再试")
+            self.queued += 1
+            self.stats["peak_queued"] = max(self.stats["peak_queued"], self.queued)
+        enqueued = time.perf_counter()
+
+        def task():
+            wait_ms = (time.perf_counter() - enqueued) * 1000
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self.stats["wait_ms_total"] += wait_ms
+                self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], wait_ms)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.stats["completed"] += 1
+
+        return asyncio.wrap_future(self._executor.submit(task))
+
+    async def run(self, fn, *args, **kwargs):
+        """在线程池中执行 fn 并等待结果"""
+        return await self.submit(fn, *args, **kwargs)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            started = self.stats["completed"] + self.active
+            return {
+                "workers": self.workers,
+                "active": self.active,
+                "queued": self.queued,
+                "max_queue": self.max_queue,
+                "saturated": self.active >= self.workers and self.queued > 0,
+                "completed": self.stats["completed"],
+                "rejected": self.stats["rejected"],
+                "peak_queued": self.stats["peak_queued"],
+                "avg_wait_ms": round(self.stats["wait_ms_total"] / started, 1) if started else 0,
+                "max_wait_ms": round(self.stats["max_wait_ms"], 1),
+            }
+
+
+# 耗时的遍历、搜索
+scan_pool = WorkerPool("scan", settings.SCAN_WORKERS, settings.SCAN_QUEUE)
+# 打开、读写单个文件等很快完成的阻塞调用
+quick_pool = WorkerPool("quick", settings.QUICK_WORKERS, settings.QUICK_QUEUE)
+
+
+def offload(pool: WorkerPool):
+    """把同步的路由函数包装为在 pool 中执行的 async 函数（保留签名，FastAPI 照常解析参数）"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await pool.submit(fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_stats() -> dict:
+    return {pool.name: pool.get_stats() for pool in (scan_pool, quick_pool)}
@@ -0,0 +1,258 @@
+"""文件读取 - 按字节范围、行范围、开头或结尾读取文本文件，大文件通过 mmap 和稀疏行索引定位"""
+import bisect
+import codecs
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+
+# 编码检测读取的样本大小
+SAMPLE_SIZE = 64 * 1024
+# 行索引每块的字节数：只记录每块开头的行号，定位时在块内查找换行
+BLOCK_SIZE = 64 * 1024
+# 缓存行索引的文件数
+MAX_CACHED_INDEXES = 32
+# UTF-16/32 等换行符不是单字节的编码，超过该大小时不支持按行读取
+MAX_WIDE_FILE = 16 * 1024 * 1024
+
+_BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+
+class BinaryFileError(ValueError):
+    pass
+
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    根据文件开头的样本判断编码：BOM、UTF-8、charset_normalizer（已安装时）、GB18030，
+    都不符合时使用 latin-1；看起来是二进制文件时抛出 BinaryFileError
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if b"\x00" in sample:
+        raise BinaryFileError("文件不是文本文件")
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # 样本末尾截断了多字节字符
+        if e.start >= len(sample) - 3 and e.reason == "unexpected end of data":
+            return "utf-8"
+    try:
+        from charset_normalizer import from_bytes
+        best = from_bytes(sample).best()
+        if best is not None:
+            return best.encoding
+    except ImportError:
+        pass
+    try:
+        sample.decode("gb18030")
+        return "gb18030"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+class LineIndex:
+    """
+    稀疏行索引：block_lines[i] 为第 i 块之前的换行数。
+    按需向后扩展，读取第 N 行只需扫描到第 N 行所在的块
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.block_lines = array("q", [0])
+        self.lock = threading.Lock()
+
+    @property
+    def complete(self) -> bool:
+        return (len(self.block_lines) - 1) * BLOCK_SIZE >= self.size
+
+    def total_lines(self, mm) -> int | None:
+        """总行数（末尾没有换行的最后一行也算一行），索引未扫描完时为 None"""
+        if not self.complete:
+            return None
+        return self.block_lines[-1] + (0 if mm[self.size - 1:self.size] == b"\n" else 1)
+
+    def _extend(self, mm, newlines: int):
+        """扫描到至少包含 newlines 个换行或文件末尾"""
+        while self.block_lines[-1] < newlines and not self.complete:
+            start = (len(self.block_lines) - 1) * BLOCK_SIZE
+            self.block_lines.append(self.block_lines[-1] + mm[start:start + BLOCK_SIZE].count(b"\n"))
+
+    def line_offset(self, mm, line: int) -> int:
+        """第 line 行（从 0 开始）开头的字节偏移，超出文件时返回文件大小"""
+        if line <= 0:
+            return 0
+        with self.lock:
+            self._extend(mm, line)
+            if self.block_lines[-1] < line:
+                return self.size
+            block = bisect.bisect_left(self.block_lines, line) - 1
+        position = block * BLOCK_SIZE
+        end = min(position + BLOCK_SIZE, self.size)
+        for _ in range(line - self.block_lines[block]):
+            position = mm.find(b"\n", position, end) + 1
+        return position
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _line_index(path: str, stat: os.stat_result) -> LineIndex:
+    """按路径缓存行索引，文件大小或修改时间变化时重建"""
+    key = os.path.normcase(os.path.abspath(path))
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            _indexes.move_to_end(key)
+            return cached[1]
+        index = LineIndex(stat.st_size)
+        _indexes[key] = ((stat.st_mtime_ns, stat.st_size), index)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+        return index
+
+
+def _tail_offset(mm, size: int, lines: int) -> int:
+    """最后 lines 行开头的字节偏移（从文件末尾向前查找换行）"""
+    end = size
+    # 末尾的换行不算作一个空行
+    if size and mm[size - 1:size] == b"\n":
+        end -= 1
+    position = end
+    for _ in range(lines):
+        position = mm.rfind(b"\n", 0, position)
+        if position < 0:
+            return 0
+    return position + 1
+
+
+def _clip(mm, start: int, end: int, max_bytes: int, whole_lines: bool) -> int:
+    """把 [start, end) 限制在 max_bytes 内；按行读取时截断在最后一个完整行之后"""
+    if end - start <= max_bytes:
+        return end
+    cut = start + max_bytes
+    if whole_lines:
+        newline = mm.rfind(b"\n", start, cut)
+        if newline >= 0:
+            return newline + 1
+    return cut
+
+
+def _decode(data: bytes, encoding: str) -> str:
+    # 字节范围的边界可能落在多字节字符中间，无法解码的部分替换为 �
+    return data.decode(encoding, errors="replace")
+
+
+def read_text(path: str, mode: str = "", max_bytes: int = 102400, offset: int = 0, length: int = 0,
+              start_line: int = 0, end_line: int = 0, lines: int = 0) -> dict:
+    """
+    读取文本文件的一部分
+
+    mode：
+    - 空：文件不超过 max_bytes 时读取全部，否则同 head
+    - head / tail：开头或结尾的 lines 行（未指定时为不超过 max_bytes 的内容）
+    - lines：第 start_line 到 end_line 行（从 1 开始，包含两端）
+    - bytes：从 offset 开始的 length 字节（length 为 0 时读到 max_bytes）
+
+    返回内容及所读范围；内容超过 max_bytes 时截断并标记 truncated。
+    不是文本文件时抛出 BinaryFileError，参数错误时抛出 ValueError
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    result = {"size": size, "mode": mode or "head"}
+    if size == 0:
+        return {**result, "encoding": "utf-8", "content": "", "offset": 0, "next_offset": 0, "truncated": False}
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        encoding = detect_encoding(mm[:SAMPLE_SIZE])
+        wide = encoding in ("utf-16", "utf-32")
+        if wide and (lines or mode in ("tail", "lines")):
+            if size > MAX_WIDE_FILE:
+                raise ValueError(f"{encoding} 编码的大文件不支持按行读取，请使用 bytes 模式")
+            return {**result, "encoding": encoding,
+                    **_read_wide_lines(mm[:], encoding, mode, max_bytes, start_line, end_line, lines)}
+
+        if mode in ("", "head") and not lines:
+            start, end = 0, size
+        elif mode == "tail":
+            start, end = (_tail_offset(mm, size, lines) if lines else 0), size
+            if end - start > max_bytes:
+                # 结尾的内容超过 max_bytes 时保留最后的部分，从完整的行开始
+                start = end - max_bytes
+                newline = mm.find(b"\n", start - 1, end - 1)
+                start = newline + 1 if newline >= 0 else start
+                result["truncated"] = True
+        elif mode in ("", "head", "lines"):
+            if mode == "lines":
+                if start_line < 1 or (end_line and end_line < start_line):
+                    raise ValueError("start_line 从 1 开始，end_line 不能小于 start_line")
+                first, last = start_line, end_line or start_line + 99
+            else:
+                first, last = 1, lines
+            index = _line_index(path, stat)
+            start = index.line_offset(mm, first - 1)
+            end = index.line_offset(mm, last)
+            result["start_line"] = first
+            total_lines = index.total_lines(mm)
+            if total_lines is not None:
+                result["total_lines"] = total_lines
+        elif mode == "bytes":
+            if offset < 0 or offset > size:
+                raise ValueError(f"offset 超出文件范围（0-{size}）")
+            start, end = offset, min(size, offset + (length or max_bytes))
+        else:
+            raise ValueError(f"不支持的读取模式: {mode}，可选 head、tail、lines、bytes")
+
+        # 按行读取时截断在完整的行之后
+        clipped = _clip(mm, start, end, max_bytes, whole_lines=mode != "bytes" and not wide)
+        data = mm[start:clipped]
+        if encoding == "utf-8-sig" and start > 0:
+            encoding = "utf-8"
+        result.update(
+            encoding=encoding,
+            content=_decode(data, encoding),
+            offset=start,
+            next_offset=clipped,
+            truncated=result.get("truncated", False) or clipped < end,
+        )
+        if "start_line" in result:
+            # 末尾没有换行的最后一行也算一行；超出文件时 end_line 小于 start_line
+            result["end_line"] = result["start_line"] - 1 + data.count(b"\n") + (0 if not data or data.endswith(b"\n") else 1)
+        return result
+
+
+def _read_wide_lines(data: bytes, encoding: str, mode: str, max_bytes: int,
+                     start_line: int, end_line: int, lines: int) -> dict:
+    """UTF-16/32 文件解码后按行读取（仅限较小的文件）"""
+    all_lines = data.decode(encoding, errors="replace").splitlines(keepends=True)
+    if mode == "tail":
+        first = max(len(all_lines) - (lines or len(all_lines)), 0) + 1
+        last = len(all_lines)
+    elif mode == "lines":
+        if start_line < 1 or (end_line and end_line < start_line):
+            raise ValueError("start_line 从 1 开始，end_line 不能小于 start_line")
+        first, last = start_line, end_line or start_line + 99
+    else:
+        first, last = 1, lines
+    selected = all_lines[first - 1:last]
+    content = "".join(selected)
+    truncated = False
+    if len(content) > max_bytes:
+        content, truncated = content[:max_bytes], True
+    return {
+        "content": content,
+        "start_line": first,
+        "end_line": first + max(len(selected) - 1, 0),
+        "total_lines": len(all_lines),
+        "truncated": truncated,
+    }
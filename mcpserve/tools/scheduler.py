@@ -0,0 +1,301 @@
+"""任务调度 - 单线程 + 最小堆的延时/周期任务调度，任务保存在 SQLite 中，重启后恢复"""
+import heapq
+import itertools
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# 错过执行时间后不再补执行的动作（重启后立即关机等不符合预期）
+NO_CATCH_UP_ACTIONS = ("shutdown", "restart", "sleep", "lock")
+
+
+class CronError(ValueError):
+    pass
+
+
+def _parse_field(field: str, low: int, high: int) -> set:
+    """解析 cron 的一个字段，支持 *、*/n、a-b、a-b/n 和逗号分隔"""
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            if not step_text.isdigit() or int(step_text) == 0:
+                raise CronError(f"无效的步长: {field}")
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            if not (start_text.isdigit() and end_text.isdigit()):
+                raise CronError(f"无效的范围: {field}")
+            start, end = int(start_text), int(end_text)
+        elif part.isdigit():
+            start = end = int(part)
+            if step > 1:
+                end = high
+        else:
+            raise CronError(f"无效的字段: {field}")
+        if start < low or end > high or start > end:
+            raise CronError(f"超出范围 {low}-{high}: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class Cron:
+    """五段式 cron 表达式（分 时 日 月 周，周日为 0 或 7）"""
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise CronError("cron 表达式应为 5 段：分 时 日 月 周")
+        self.expression = expression
+        self.minutes = sorted(_parse_field(fields[0], 0, 59))
+        self.hours = sorted(_parse_field(fields[1], 0, 23))
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        weekdays = _parse_field(fields[4], 0, 7)
+        # 转为 datetime.weekday()：周一为 0
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, day: datetime) -> bool:
+        if day.month not in self.months:
+            return False
+        day_ok = day.day in self.days
+        weekday_ok = day.weekday() in self.weekdays
+        # 与标准 cron 一致：日和周都有限制时满足其一即可
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, timestamp: float) -> float | None:
+        """timestamp 之后（不含）的下一次触发时间，一年内没有时返回 None"""
+        start = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        for _ in range(366):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate >= start:
+                            return candidate.timestamp()
+            day += timedelta(days=1)
+        return None
+
+
+class Scheduler:
+    """
+    调度器
+
+    所有任务放在一个按执行时间排序的最小堆中，由一个线程等待最早的任务到期后执行，
+    新增任务 O(log n)；取消时从任务表中删除，堆中的旧条目在弹出时跳过（同样适用于改期）。
+    任务同时写入 SQLite，启动时恢复：错过的执行在 misfire_grace 秒内补执行一次，
+    周期任务错过的多次只补一次
+    """
+
+    def __init__(self, db_path: str, execute, misfire_grace: float = 600, workers: int = 2):
+        self.db_path = db_path
+        self.execute = execute
+        self.misfire_grace = misfire_grace
+        self._conn = None
+        self._heap = []
+        self._tasks = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scheduler-run")
+        self._started = False
+        self.stats = {"executed": 0, "caught_up": 0, "skipped": 0}
+
+    # ========== 持久化 ==========
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    action TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    run_at REAL NOT NULL,
+                    interval REAL,
+                    cron TEXT,
+                    created_at REAL NOT NULL,
+                    last_run REAL
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def _save(self, task: dict):
+        self._db().execute(
+            "INSERT OR REPLACE INTO tasks (id, action, params, run_at, interval, cron, created_at, last_run) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (task["id"], task["action"], json.dumps(task["params"], ensure_ascii=False), task["run_at"],
+             task["interval"], task["cron"], task["created_at"], task["last_run"])
+        )
+        self._conn.commit()
+
+    def _delete(self, task_id: str):
+        self._db().execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        self._conn.commit()
+
+    # ========== 调度 ==========
+
+    def start(self):
+        """恢复保存的任务并启动调度线程（重复调用无效）"""
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+            now = time.time()
+            rows = self._db().execute("SELECT * FROM tasks").fetchall()
+            for row in rows:
+                task = dict(row)
+                task["params"] = json.loads(task["params"])
+                self._tasks[task["id"]] = task
+                if task["run_at"] < now:
+                    self._catch_up(task, now)
+                if task["id"] in self._tasks:
+                    self._push(task)
+            if rows:
+                print(f"[定时任务] 已恢复 {len(self._tasks)} 个任务")
+        threading.Thread(target=self._run, name="scheduler", daemon=True).start()
+
+    def _catch_up(self, task: dict, now: float):
+        """处理停机期间错过的任务：宽限期内立即补执行一次，否则跳过这次执行"""
+        missed = now - task["run_at"]
+        if missed <= self.misfire_grace and task["action"] not in NO_CATCH_UP_ACTIONS:
+            task["run_at"] = now
+            self.stats["caught_up"] += 1
+            print(f"[定时任务 {task['id']}] 错过 {missed:.0f} 秒，立即补执行")
+            return
+        self.stats["skipped"] += 1
+        print(f"[定时任务 {task['id']}] 错过 {missed:.0f} 秒，跳过本次 {task['action']}")
+        next_run = self._next_run(task, now)
+        if next_run is None:
+            del self._tasks[task["id"]]
+            self._delete(task["id"])
+        else:
+            task["run_at"] = next_run
+            self._save(task)
+
+    @staticmethod
+    def _next_run(task: dict, after: float) -> float | None:
+        """周期任务在 after 之后的下一次执行时间，一次性任务返回 None"""
+        if task["cron"]:
+            return Cron(task["cron"]).next_after(after)
+        if task["interval"]:
+            # 跳过错过的多次，对齐到原来的节奏
+            periods = int((after - task["run_at"]) // task["interval"]) + 1
+            return task["run_at"] + max(periods, 1) * task["interval"]
+        return None
+
+    def _push(self, task: dict):
+        heapq.heappush(self._heap, (task["run_at"], next(self._seq), task["id"]))
+        self._cond.notify()
+
+    def _pop_due(self) -> dict | None:
+        """等待并取出下一个到期的任务（调用方持有锁）"""
+        while True:
+            while not self._heap:
+                self._cond.wait()
+            run_at, _, task_id = self._heap[0]
+            task = self._tasks.get(task_id)
+            if task is None or task["run_at"] != run_at:
+                # 已取消或已改期
+                heapq.heappop(self._heap)
+                continue
+            delay = run_at - time.time()
+            if delay > 0:
+                self._cond.wait(delay)
+                continue
+            heapq.heappop(self._heap)
+            return task
+
+    def _run(self):
+        while True:
+            with self._cond:
+                task = self._pop_due()
+                now = time.time()
+                task["last_run"] = now
+                next_run = self._next_run(task, now)
+                if next_run is None:
+                    del self._tasks[task["id"]]
+                    self._delete(task["id"])
+                else:
+                    task["run_at"] = next_run
+                    self._save(task)
+                    self._push(task)
+            self.stats["executed"] += 1
+            self._executor.submit(self._execute, dict(task))
+
+    def _execute(self, task: dict):
+        try:
+            self.execute(task["id"], task["action"], task["params"])
+        except Exception as e:
+            print(f"[定时任务 {task['id']}] 执行失败: {e}")
+
+    # ========== 接口 ==========
+
+    def add(self, action: str, params: dict, delay_seconds: float = 0,
+            interval: float | None = None, cron: str | None = None) -> dict:
+        """新建任务，cron 无效时抛出 CronError"""
+        now = time.time()
+        if cron:
+            # delay_seconds 表示最早从何时开始匹配
+            run_at = Cron(cron).next_after(now + max(delay_seconds, 0))
+            if run_at is None:
+                raise CronError("一年内没有匹配的执行时间")
+        else:
+            run_at = now + (delay_seconds if delay_seconds > 0 or not interval else interval)
+        task = {
+            "id": str(uuid.uuid4())[:8],
+            "action": action,
+            "params": params,
+            "run_at": run_at,
+            "interval": interval or None,
+            "cron": cron or None,
+            "created_at": now,
+            "last_run": None,
+        }
+        self.start()
+        with self._cond:
+            self._tasks[task["id"]] = task
+            self._save(task)
+            self._push(task)
+        return task
+
+    def cancel(self, task_id: str) -> bool:
+        self.start()
+        with self._cond:
+            if self._tasks.pop(task_id, None) is None:
+                return False
+            self._delete(task_id)
+            # 堆中的条目在到期弹出时跳过；取消的任务很多时重建堆，避免堆无限增长
+            if len(self._heap) > 2 * len(self._tasks) + 64:
+                self._heap = [(task["run_at"], next(self._seq), task["id"]) for task in self._tasks.values()]
+                heapq.heapify(self._heap)
+            self._cond.notify()
+            return True
+
+    def list_tasks(self, offset: int = 0, limit: int = 20) -> tuple[list, int]:
+        """按执行时间排序分页，返回 (任务列表, 总数)"""
+        self.start()
+        with self._cond:
+            total = len(self._tasks)
+            tasks = heapq.nsmallest(offset + limit, self._tasks.values(), key=lambda t: t["run_at"])[offset:]
+            return [dict(task) for task in tasks], total
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return {**self.stats, "tasks": len(self._tasks), "heap": len(self._heap)}
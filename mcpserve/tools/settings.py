@@ -0,0 +1,112 @@
+"""搜索配置 - 索引根目录、剪枝规则等，均可通过环境变量覆盖"""
+import fnmatch
+import os
+
+
+def _env_list(name: str, default: list) -> list:
+    """读取逗号分隔的环境变量列表"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _default_roots() -> list:
+    """默认索引根目录：用户目录和其他数据盘（Windows 下含 C 盘，由剪枝规则跳过系统目录）"""
+    home = os.path.expanduser("~")
+    if os.name == "nt":
+        return [home, "C:\\", "D:\\", "E:\\"]
+    return [home]
+
+
+# 文件名索引覆盖的根目录（不存在的目录自动跳过）
+SEARCH_ROOTS = _env_list("MCP_SEARCH_ROOTS", _default_roots())
+
+# 遍历时整棵跳过的目录名（不区分大小写）
+PRUNE_DIRS = {name.lower() for name in _env_list("MCP_SEARCH_PRUNE", [
+    ".git", ".svn", ".hg", "node_modules", "__pycache__", ".venv", "venv", ".tox",
+    ".cache", ".npm", ".gradle", ".m2", ".cargo", ".rustup", ".idea", "site-packages",
+    "$recycle.bin", "system volume information", "windows", "program files",
+    "program files (x86)", "programdata", "appdata",
+])}
+
+# 不收录的文件名通配规则
+IGNORE_PATTERNS = [pattern.lower() for pattern in _env_list("MCP_SEARCH_IGNORE", [
+    "*.tmp", "~$*", "thumbs.db", "desktop.ini", ".ds_store", "*.lnk~",
+])]
+
+# 最大遍历深度（相对根目录）
+MAX_DEPTH = int(os.getenv("MCP_SEARCH_MAX_DEPTH", "12"))
+
+# 实时遍历（无索引时）的并行线程数
+WALK_WORKERS = int(os.getenv("MCP_WALK_WORKERS", "8"))
+# 实时遍历的默认时间预算和上限（秒），超时返回部分结果和续查标记
+SEARCH_TIMEOUT = float(os.getenv("MCP_SEARCH_TIMEOUT", "15"))
+SEARCH_MAX_TIMEOUT = float(os.getenv("MCP_SEARCH_MAX_TIMEOUT", "60"))
+
+# 内容搜索的并行线程数、跳过的大文件（字节）和单次搜索最多读取的字节数
+GREP_WORKERS = int(os.getenv("MCP_GREP_WORKERS", "4"))
+GREP_MAX_FILE_SIZE = int(os.getenv("MCP_GREP_MAX_FILE_SIZE", str(10 * 1024 * 1024)))
+GREP_MAX_BYTES = int(os.getenv("MCP_GREP_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# 工作线程池：scan 执行遍历搜索等耗时操作，quick 执行打开、读写文件等快速的阻塞调用；
+# 排队数超过上限时返回 503
+SCAN_WORKERS = int(os.getenv("MCP_SCAN_WORKERS", "4"))
+SCAN_QUEUE = int(os.getenv("MCP_SCAN_QUEUE", "16"))
+QUICK_WORKERS = int(os.getenv("MCP_QUICK_WORKERS", "8"))
+QUICK_QUEUE = int(os.getenv("MCP_QUICK_QUEUE", "64"))
+
+# 文件名索引
+INDEX_ENABLED = os.getenv("MCP_INDEX_ENABLED", "true").lower() == "true"
+INDEX_PATH = os.getenv("MCP_INDEX_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "file_index.db"))
+# 定时增量扫描间隔（秒），安装了 watchdog 时文件变化会实时更新
+INDEX_RESCAN_INTERVAL = float(os.getenv("MCP_INDEX_RESCAN_INTERVAL", "600"))
+
+
+def _default_app_roots() -> list:
+    """默认应用目录：Windows 为开始菜单、桌面和安装目录；其他系统为 .desktop 文件目录和 PATH"""
+    if os.name == "nt":
+        return [
+            r"%ProgramData%\Microsoft\Windows\Start Menu\Programs",
+            r"%AppData%\Microsoft\Windows\Start Menu\Programs",
+            r"%UserProfile%\Desktop",
+            r"%LocalAppData%\Programs",
+            r"%ProgramFiles%",
+            r"%ProgramFiles(x86)%",
+        ]
+    return [
+        "~/.local/share/applications",
+        "~/.local/share/flatpak/exports/share/applications",
+        "/usr/share/applications",
+        "/usr/local/share/applications",
+        "/var/lib/flatpak/exports/share/applications",
+        "/var/lib/snapd/desktop/applications",
+        *os.getenv("PATH", "").split(os.pathsep),
+    ]
+
+
+# 应用目录扫描的根目录（靠前的优先），不存在的目录自动跳过
+APP_ROOTS = _env_list("MCP_APP_ROOTS", _default_app_roots())
+# 应用目录最大扫描深度、后台增量刷新间隔（秒）和保存位置
+APP_SCAN_DEPTH = int(os.getenv("MCP_APP_SCAN_DEPTH", "4"))
+APP_REFRESH_INTERVAL = float(os.getenv("MCP_APP_REFRESH_INTERVAL", "300"))
+APP_CATALOG_PATH = os.getenv("MCP_APP_CATALOG_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "app_catalog.json"))
+
+
+# 定时任务
+SCHEDULER_DB_PATH = os.getenv("MCP_SCHEDULER_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "scheduler.db"))
+# 服务停机期间错过的任务，在该秒数内的启动后补执行，否则跳过
+SCHEDULER_MISFIRE_GRACE = float(os.getenv("MCP_SCHEDULER_MISFIRE_GRACE", "600"))
+# 重复任务的最小间隔（秒）
+SCHEDULER_MIN_INTERVAL = int(os.getenv("MCP_SCHEDULER_MIN_INTERVAL", "10"))
+
+
+def is_pruned(dir_name: str) -> bool:
+    """目录是否整棵跳过"""
+    return dir_name.lower() in PRUNE_DIRS
+
+
+def is_ignored(file_name: str) -> bool:
+    """文件是否不收录"""
+    name = file_name.lower()
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in IGNORE_PATTERNS)
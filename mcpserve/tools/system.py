@@ -3,16 +3,19 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import datetime
 import platform
+import shutil
 import subprocess
+import sys
 import os
-import glob
-import threading
-import uuid
+
+from . import settings
+from .catalog import app_catalog
+from .pools import offload, quick_pool
+from .scheduler import CronError, Scheduler
 
 router = APIRouter(prefix="/system", tags=["系统"])
 
-# 存储定时任务
-scheduled_tasks = {}
+SUPPORTED_ACTIONS = ["open_app", "shutdown", "restart", "sleep", "lock", "message"]
 
 
 class OpenAppRequest(BaseModel):
@@ -21,87 +24,48 @@ class OpenAppRequest(BaseModel):
 
 class DelayedTaskRequest(BaseModel):
     action: str
-    delay_seconds: int
+    delay_seconds: int = 0
     params: dict = {}
+    interval_seconds: int = 0  # 大于 0 时每隔该秒数重复执行
+    cron: str = ""  # cron 表达式（分 时 日 月 周），按表达式重复执行
 
 
 def find_application(app_name: str) -> str | None:
-    """智能查找应用程序路径"""
-    app_lower = app_name.lower()
-    
-    # 系统内置应用
-    system_apps = {
-        "notepad": "notepad.exe", "记事本": "notepad.exe",
-        "calculator": "calc.exe", "计算器": "calc.exe",
-        "explorer": "explorer.exe", "资源管理器": "explorer.exe",
-        "cmd": "cmd.exe", "命令提示符": "cmd.exe",
-        "powershell": "powershell.exe",
-        "paint": "mspaint.exe", "画图": "mspaint.exe",
-        "snipping": "snippingtool.exe", "截图": "snippingtool.exe",
-    }
-    if app_lower in system_apps:
-        return system_apps[app_lower]
-    
-    # 关键词映射（包含中英文）
-    keywords = {
-        "微信": ["微信", "wechat", "weixin"], "wechat": ["微信", "wechat", "weixin"],
-        "qq": ["qq", "tencent"], "chrome": ["chrome", "google"],
-        "edge": ["msedge", "edge"], "firefox": ["firefox", "mozilla"],
-        "vscode": ["code", "vscode"], "idea": ["idea", "intellij"],
-        "pycharm": ["pycharm"], "钉钉": ["钉钉", "dingtalk"], 
-        "飞书": ["飞书", "feishu", "lark"], "feishu": ["飞书", "feishu", "lark"],
-        "网易云": ["网易云", "cloudmusic", "netease"], "spotify": ["spotify"],
-        "steam": ["steam"], "discord": ["discord"], "telegram": ["telegram"],
-        "word": ["winword", "word"], "excel": ["excel"],
-        "ppt": ["powerpnt", "powerpoint"], "outlook": ["outlook"],
-    }
-    
-    # 搜索关键词：优先用原始输入名称
-    search_keywords = keywords.get(app_lower, [app_name, app_lower])
-    
-    # 优先搜索开始菜单（最快）
-    start_menu_paths = [
-        os.path.expandvars(r"%ProgramData%\Microsoft\Windows\Start Menu\Programs"),
-        os.path.expandvars(r"%AppData%\Microsoft\Windows\Start Menu\Programs"),
-    ]
-    for base_path in start_menu_paths:
-        if not os.path.exists(base_path):
-            continue
-        for keyword in search_keywords:
-            pattern = os.path.join(base_path, "**", f"*{keyword}*.lnk")
-            for match in glob.glob(pattern, recursive=True):
-                return match
-    
-    # 搜索桌面快捷方式
-    desktop = os.path.expandvars(r"%UserProfile%\Desktop")
-    if os.path.exists(desktop):
-        for keyword in search_keywords:
-            pattern = os.path.join(desktop, f"*{keyword}*.lnk")
-            for match in glob.glob(pattern):
-                return match
-    
-    # 最后搜索常用安装目录（限制深度）
-    quick_paths = [
-        os.path.expandvars(r"%LocalAppData%\Programs"),
-        os.path.expandvars(r"%ProgramFiles%"),
-        os.path.expandvars(r"%ProgramFiles(x86)%"),
-    ]
-    for base_path in quick_paths:
-        if not os.path.exists(base_path):
-            continue
-        for keyword in search_keywords:
-            # 只搜索两层深度
-            for subdir in os.listdir(base_path):
-                subpath = os.path.join(base_path, subdir)
-                if not os.path.isdir(subpath):
-                    continue
-                if keyword.lower() in subdir.lower():
-                    # 找到匹配目录，搜索其中的exe
-                    for f in glob.glob(os.path.join(subpath, "**", "*.exe"), recursive=True):
-                        if "unins" not in f.lower() and "update" not in f.lower():
-                            return f
-    
-    return None
+    """智能查找应用程序路径（查应用目录，不遍历文件系统）"""
+    return app_catalog.find(app_name)
+
+
+def launch_application(executable: str):
+    """
+    按平台启动应用目录中找到的入口：Windows 用 start；macOS 用 open；
+    其他系统中 .desktop 文件用 gio launch（没有时用 gtk-launch 按文件名启动），可执行文件直接运行
+    """
+    if os.name == "nt":
+        subprocess.Popen(f'start "" "{executable}"', shell=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return
+    if sys.platform == "darwin":
+        command = ["open", executable]
+    elif executable.endswith(".desktop"):
+        # xdg-open 会用编辑器打开 .desktop 文件，而不是启动其中的程序
+        if shutil.which("gio"):
+            command = ["gio", "launch", executable]
+        elif shutil.which("gtk-launch"):
+            command = ["gtk-launch", os.path.basename(executable)]
+        else:
+            raise RuntimeError("缺少 gio 或 gtk-launch，无法启动 .desktop 应用")
+    else:
+        command = [executable]
+    # 新会话中运行，服务退出时不会随之结束
+    subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def warm_up():
+    """恢复定时任务，加载应用目录并在后台增量刷新，返回可查找的应用名称数"""
+    scheduler.start()
+    app_catalog.start()
+    return app_catalog.get_stats()["names"]
 
 
 def execute_delayed_action(task_id: str, action: str, params: dict):
@@ -111,8 +75,7 @@ def execute_delayed_action(task_id: str, action: str, params: dict):
             app_name = params.get("app_name", "")
             executable = find_application(app_name)
             if executable:
-                subprocess.Popen(f'start "" "{executable}"', shell=True,
-                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                launch_application(executable)
                 print(f"[定时任务 {task_id}] 已打开: {app_name}")
             else:
                 print(f"[定时任务 {task_id}] 找不到应用: {app_name}")
@@ -131,8 +94,13 @@ def execute_delayed_action(task_id: str, action: str, params: dict):
             print(f"[定时任务 {task_id}] 已显示消息: {msg}")
     except Exception as e:
         print(f"[定时任务 {task_id}] 执行失败: {e}")
-    finally:
-        scheduled_tasks.pop(task_id, None)
+
+
+scheduler = Scheduler(settings.SCHEDULER_DB_PATH, execute_delayed_action, settings.SCHEDULER_MISFIRE_GRACE)
+
+
+def _format_time(timestamp: float | None) -> str | None:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S") if timestamp else None
 
 
 @router.get("/time")
@@ -151,7 +119,8 @@ async def get_system_time():
 
 
 @router.post("/open-app")
-async def open_application(request: OpenAppRequest):
+@offload(quick_pool)
+def open_application(request: OpenAppRequest):
     """智能打开应用程序"""
     executable = find_application(request.app_name)
     
@@ -163,66 +132,71 @@ async def open_application(request: OpenAppRequest):
         }
     
     try:
-        subprocess.Popen(f'start "" "{executable}"', shell=True,
-            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        launch_application(executable)
         return {"success": True, "message": f"已启动: {request.app_name}", "path": executable}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"启动失败: {str(e)}")
 
 
 @router.post("/delay")
-async def create_delayed_task(request: DelayedTaskRequest):
-    """创建延时任务"""
-    task_id = str(uuid.uuid4())[:8]
-    
-    supported_actions = ["open_app", "shutdown", "restart", "sleep", "lock", "message"]
-    if request.action not in supported_actions:
+@offload(quick_pool)
+def create_delayed_task(request: DelayedTaskRequest):
+    """创建延时任务，可按固定间隔或 cron 表达式重复执行"""
+    if request.action not in SUPPORTED_ACTIONS:
         return {
             "success": False,
             "message": f"不支持的动作: {request.action}",
-            "supported_actions": supported_actions
+            "supported_actions": SUPPORTED_ACTIONS
         }
-    
-    timer = threading.Timer(
-        request.delay_seconds,
-        execute_delayed_action,
-        args=[task_id, request.action, request.params]
-    )
-    timer.start()
-    
-    scheduled_tasks[task_id] = {
-        "action": request.action,
-        "params": request.params,
-        "delay_seconds": request.delay_seconds,
-        "created_at": datetime.now().strftime("%H:%M:%S"),
-        "timer": timer
-    }
-    
+    if 0 < request.interval_seconds < settings.SCHEDULER_MIN_INTERVAL:
+        return {"success": False, "message": f"重复间隔不能小于 {settings.SCHEDULER_MIN_INTERVAL} 秒"}
+
+    try:
+        task = scheduler.add(request.action, request.params, request.delay_seconds,
+                             request.interval_seconds or None, request.cron or None)
+    except CronError as e:
+        return {"success": False, "message": f"cron 表达式无效: {e}"}
+
+    if request.cron:
+        message = f"已创建定时任务，按 {request.cron} 重复执行 {request.action}"
+    elif request.interval_seconds:
+        message = f"已创建定时任务，每 {request.interval_seconds} 秒执行一次 {request.action}"
+    else:
+        message = f"已创建定时任务，将在 {request.delay_seconds} 秒后执行 {request.action}"
     return {
         "success": True,
-        "task_id": task_id,
-        "message": f"已创建定时任务，将在 {request.delay_seconds} 秒后执行 {request.action}"
+        "task_id": task["id"],
+        "run_at": _format_time(task["run_at"]),
+        "message": message
     }
 
 
 @router.delete("/delay/{task_id}")
-async def cancel_delayed_task(task_id: str):
+@offload(quick_pool)
+def cancel_delayed_task(task_id: str):
     """取消延时任务"""
-    if task_id not in scheduled_tasks:
+    if not scheduler.cancel(task_id):
         return {"success": False, "message": f"任务 {task_id} 不存在"}
-    
-    task = scheduled_tasks.pop(task_id)
-    task["timer"].cancel()
     return {"success": True, "message": f"已取消任务 {task_id}"}
 
 
 @router.get("/delay")
-async def list_delayed_tasks():
-    """列出所有延时任务"""
-    tasks = [{
-        "task_id": tid,
-        "action": t["action"],
-        "params": t["params"],
-        "created_at": t["created_at"]
-    } for tid, t in scheduled_tasks.items()]
-    return {"tasks": tasks}
+@offload(quick_pool)
+def list_delayed_tasks(offset: int = 0, limit: int = 20):
+    """按执行时间列出延时任务（分页）"""
+    limit = max(1, min(limit, 100))
+    tasks, total = scheduler.list_tasks(max(offset, 0), limit)
+    return {
+        "tasks": [{
+            "task_id": t["id"],
+            "action": t["action"],
+            "params": t["params"],
+            "created_at": _format_time(t["created_at"]),
+            "run_at": _format_time(t["run_at"]),
+            "interval_seconds": t["interval"],
+            "cron": t["cron"]
+        } for t in tasks],
+        "total": total,
+        "offset": offset,
+        "limit": limit
+    }
@@ -0,0 +1,266 @@
+"""目录遍历 - 基于 os.scandir 的并行广度优先遍历，用于没有索引时的实时搜索"""
+import asyncio
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+from . import settings
+from .pools import scan_pool
+
+# 遍历线程池（各次搜索共用）
+_pool = ThreadPoolExecutor(max_workers=settings.WALK_WORKERS, thread_name_prefix="walk")
+
+# 每列出多少个条目检查一次是否需要停止
+CHECK_EVERY = 256
+# 续查标记保留时间（秒）和最多保留数量
+CURSOR_TTL = 300
+MAX_CURSORS = 100
+# 流式搜索进度事件的最小间隔（秒）
+PROGRESS_INTERVAL = 0.5
+
+_cursors = OrderedDict()
+_cursors_lock = threading.Lock()
+
+
+class WalkState:
+    """一次搜索的遍历进度，超时或凑够结果后可凭续查标记从断点继续"""
+
+    def __init__(self, roots: list, name: str, is_dir: bool, max_depth: int):
+        self.query = name.lower()
+        self.is_dir = is_dir
+        self.max_depth = max_depth
+        # 待列出的 (目录, 深度)，按深度排列
+        self.pending = []
+        # 同一目录只遍历一次（默认搜索路径中桌面等目录也在用户目录下）
+        self.visited = set()
+        # 已找到但超出本次 max_results 的结果，续查时优先返回
+        self.overflow = []
+        for root in roots:
+            self._add(root, 0)
+
+    def _add(self, path: str, depth: int):
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in self.visited and os.path.isdir(path):
+            self.visited.add(key)
+            self.pending.append((path, depth))
+
+    @property
+    def done(self) -> bool:
+        return not self.pending and not self.overflow
+
+
+def _scan_dir(path: str, query: str, is_dir: bool, stop: threading.Event) -> tuple[list, list] | None:
+    """列出一个目录，返回 (匹配的条目, 需要继续遍历的子目录)；中途被停止时返回 None"""
+    matches, subdirs = [], []
+    if stop.is_set():
+        return None
+    try:
+        with os.scandir(path) as it:
+            for count, entry in enumerate(it, 1):
+                if count % CHECK_EVERY == 0 and stop.is_set():
+                    # 未列完的目录整个留到续查时重新列出
+                    return None
+                try:
+                    # DirEntry 的类型信息来自目录列表本身，不需要额外 stat
+                    entry_is_dir = entry.is_dir(follow_symlinks=False)
+                    if entry_is_dir:
+                        if settings.is_pruned(entry.name):
+                            continue
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif settings.is_ignored(entry.name):
+                        continue
+                    if entry_is_dir == is_dir and query in entry.name.lower():
+                        # Windows 下 stat 信息随目录列表一起返回，Linux 下只对匹配项 stat
+                        stat = entry.stat(follow_symlinks=False)
+                        matches.append({
+                            "path": entry.path,
+                            "name": entry.name,
+                            "size": 0 if is_dir else stat.st_size,
+                            "mtime": stat.st_mtime,
+                        })
+                except OSError:
+                    continue
+    except OSError:
+        # 没有权限、目录已删除等
+        pass
+    return matches, subdirs
+
+
+def run(state: WalkState, max_results: int, deadline: float | None = None,
+        cancel: threading.Event | None = None, on_progress=None) -> list:
+    """
+    继续遍历 state，返回本次找到的结果
+
+    逐层并行列出目录，浅层的结果排在前面；凑够 max_results、到达 deadline（monotonic 时间）
+    或 cancel 被设置时停止，未列完的目录留在 state.pending 中。
+    on_progress(新结果, 已列出的目录数) 在每列完一个目录后调用，新结果不超过 max_results
+    """
+    results = state.overflow[:max_results]
+    state.overflow = state.overflow[max_results:]
+    scanned_dirs = 0
+    if on_progress is not None and results:
+        on_progress(list(results), scanned_dirs)
+    # 取消时正在列目录的线程也会停止
+    stop = cancel if cancel is not None else threading.Event()
+
+    def should_stop() -> bool:
+        if len(results) >= max_results or (deadline is not None and time.monotonic() >= deadline):
+            stop.set()
+        return stop.is_set()
+
+    # 到达截止时间时由定时器通知正在列目录的线程停止（每次搜索一个定时器）
+    timer = None
+    if deadline is not None and state.pending:
+        timer = threading.Timer(max(deadline - time.monotonic(), 0), stop.set)
+        timer.daemon = True
+        timer.start()
+    try:
+        while state.pending and not should_stop():
+            depth = state.pending[0][1]
+            level = [item for item in state.pending if item[1] == depth]
+            state.pending = state.pending[len(level):]
+            if depth >= state.max_depth:
+                continue
+
+            unfinished = []
+            # map 按提交顺序返回，同一层内的结果顺序稳定
+            scanned = _pool.map(lambda path: _scan_dir(path, state.query, state.is_dir, stop),
+                                [path for path, _ in level])
+            for (path, _), result in zip(level, scanned):
+                if result is None:
+                    unfinished.append((path, depth))
+                    continue
+                matches, subdirs = result
+                before = len(results)
+                results.extend(matches)
+                for subdir in subdirs:
+                    state._add(subdir, depth + 1)
+                scanned_dirs += 1
+                if on_progress is not None:
+                    on_progress(results[before:max_results], scanned_dirs)
+                should_stop()
+            state.pending = unfinished + state.pending
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+    state.overflow = results[max_results:] + state.overflow
+    return results[:max_results]
+
+
+# ========== 续查标记 ==========
+
+def save_cursor(state: WalkState) -> str:
+    """保存未完成的遍历，返回续查标记"""
+    token = secrets.token_urlsafe(12)
+    with _cursors_lock:
+        _cursors[token] = (state, time.monotonic() + CURSOR_TTL)
+        while len(_cursors) > MAX_CURSORS:
+            _cursors.popitem(last=False)
+    return token
+
+
+def take_cursor(token: str) -> WalkState | None:
+    """取出续查标记对应的遍历进度（一次性），过期或不存在时返回 None"""
+    with _cursors_lock:
+        item = _cursors.pop(token, None)
+    if item is None or item[1] < time.monotonic():
+        return None
+    return item[0]
+
+
+def _prepare(roots: list, name: str, is_dir: bool, timeout: float, cursor: str) -> tuple[WalkState | None, float]:
+    """新建或按续查标记取回遍历进度，返回 (进度, 截止时间)；timeout 不大于 0 时使用默认预算"""
+    state = take_cursor(cursor) if cursor else WalkState(roots, name, is_dir, settings.MAX_DEPTH)
+    budget = min(timeout, settings.SEARCH_MAX_TIMEOUT) if timeout > 0 else settings.SEARCH_TIMEOUT
+    return state, time.monotonic() + budget
+
+
+def _finish(state: WalkState) -> dict:
+    truncated = not state.done
+    return {"truncated": truncated, "cursor": save_cursor(state) if truncated else ""}
+
+
+async def search(http_request, roots: list, name: str, is_dir: bool, max_results: int,
+                 timeout: float, cursor: str = "") -> dict | None:
+    """
+    带时间预算的搜索：在 scan 线程池中遍历，超时返回已找到的部分结果和续查标记；
+    客户端断开或请求被取消时停止遍历
+
+    返回 {"results", "truncated", "cursor"}，续查标记无效时返回 None
+    """
+    state, deadline = _prepare(roots, name, is_dir, timeout, cursor)
+    if state is None:
+        return None
+
+    cancel = threading.Event()
+    future = scan_pool.submit(run, state, max_results, deadline, cancel)
+    try:
+        while True:
+            done, _ = await asyncio.wait({future}, timeout=0.2)
+            if done:
+                break
+            if http_request is not None and await http_request.is_disconnected():
+                cancel.set()
+                print(f"[搜索] 客户端已断开，停止搜索: {name}")
+                return {"results": [], "truncated": True, "cursor": ""}
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+
+    return {"results": future.result(), **_finish(state)}
+
+
+async def stream(roots: list, name: str, is_dir: bool, max_results: int,
+                 timeout: float, cursor: str = ""):
+    """
+    与 search 相同的搜索，边遍历边产出事件：
+    {"type": "item", "data": 条目}、{"type": "progress", "scanned_dirs", "found"}（至多每 PROGRESS_INTERVAL 秒一次），
+    最后为 {"type": "end", "truncated", "cursor"}；续查标记无效时只产出 {"type": "error"}。
+    客户端断开时生成器被关闭，遍历随之停止
+    """
+    state, deadline = _prepare(roots, name, is_dir, timeout, cursor)
+    if state is None:
+        yield {"type": "error", "message": "续查标记已过期，请重新搜索"}
+        return
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    def on_progress(matches: list, scanned_dirs: int):
+        loop.call_soon_threadsafe(queue.put_nowait, (matches, scanned_dirs))
+
+    cancel = threading.Event()
+    try:
+        future = scan_pool.submit(run, state, max_results, deadline, cancel, on_progress)
+    except HTTPException as e:
+        yield {"type": "error", "message": e.detail}
+        return
+    future.add_done_callback(lambda _: queue.put_nowait(None))
+    found = 0
+    reported = time.monotonic()
+    try:
+        while (item := await queue.get()) is not None:
+            matches, scanned_dirs = item
+            for match in matches:
+                found += 1
+                yield {"type": "item", "data": match}
+            if time.monotonic() - reported >= PROGRESS_INTERVAL:
+                reported = time.monotonic()
+                yield {"type": "progress", "scanned_dirs": scanned_dirs, "found": found}
+        future.result()
+    except (GeneratorExit, asyncio.CancelledError):
+        # 客户端断开时响应体生成器被关闭
+        print(f"[搜索] 客户端已断开，停止搜索: {name}")
+        raise
+    finally:
+        # 出错或被关闭时停止仍在进行的遍历
+        if not future.done():
+            cancel.set()
+    yield {"type": "end", **_finish(state)}
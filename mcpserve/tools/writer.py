@@ -0,0 +1,283 @@
+"""文件写入 - 原子写入（临时文件 + fsync + 重命名）、按偏移续传的分块上传，同一路径的写入互斥"""
+import os
+import secrets
+import threading
+import time
+import weakref
+
+# 分块上传未完成时保留的时间（秒）和最多同时进行的数量
+UPLOAD_TTL = 3600
+MAX_UPLOADS = 32
+# 流式上传时攒够多少字节写入一次
+STREAM_BUFFER = 1024 * 1024
+
+# 同一路径的写入在进程内串行；不同进程之间靠临时文件名唯一（O_EXCL）和原子重命名保证不会写出半个文件
+_path_locks = weakref.WeakValueDictionary()
+_path_locks_lock = threading.Lock()
+
+
+class OffsetMismatchError(ValueError):
+    """追加或续传的偏移与文件当前大小不一致，size 为当前大小，可从该位置重新发送"""
+
+    def __init__(self, message: str, size: int):
+        super().__init__(message)
+        self.size = size
+
+
+def _key(path: str) -> str:
+    # 按解析符号链接后的真实路径加锁，经由链接和直接写目标文件的写入共用同一把锁
+    return os.path.normcase(os.path.realpath(path))
+
+
+def path_lock(path: str) -> threading.Lock:
+    """同一文件共用的锁（不再使用时自动回收）"""
+    key = _key(path)
+    with _path_locks_lock:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _path_locks[key] = lock
+        return lock
+
+
+def _open_parent(path: str, opener):
+    """调用 opener()，父目录不存在时创建后重试一次（避免每次写入前先检查目录）"""
+    try:
+        return opener()
+    except FileNotFoundError:
+        parent = os.path.dirname(path)
+        if not parent:
+            raise
+        os.makedirs(parent, exist_ok=True)
+        return opener()
+
+
+def _fsync_dir(path: str):
+    """重命名后同步父目录，保证断电后新的目录项也已落盘（Windows 不支持打开目录，跳过）"""
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _resolve(path: str, exclusive: bool) -> str:
+    """
+    覆盖时写入符号链接指向的文件，而不是把链接本身替换成普通文件。
+    exclusive 时不解析：链接已存在（即使指向不存在的文件）就视为目标已存在，与 open(path, "x") 一致
+    """
+    return path if exclusive else os.path.realpath(path)
+
+
+def _temp_file(path: str) -> tuple[int, str]:
+    """
+    在目标所在目录创建唯一的临时文件（同一文件系统内才能原子重命名）。
+    以 0o666 创建并由 umask 过滤，新文件的权限与 open(path, "w") 一致
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    while True:
+        tmp_path = os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp")
+        try:
+            return _open_parent(path, lambda: os.open(tmp_path, flags, 0o666)), tmp_path
+        except FileExistsError:
+            continue
+
+
+def _preallocate(fd: int, size: int):
+    """预先分配磁盘空间，减少大文件写入时的碎片；不支持时忽略"""
+    if size <= 0:
+        return
+    try:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+    except OSError:
+        pass
+
+
+def _copy_owner(tmp_path: str, path: str):
+    """
+    覆盖已有文件时保留原文件的权限，以及尽量保留所有者和属组（通常只有 root 能改所有者，
+    失败时新文件属于当前用户）。替换的是目录项，指向原文件的其他硬链接仍是旧内容
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return
+    if hasattr(os, "chown"):
+        try:
+            os.chown(tmp_path, stat.st_uid, stat.st_gid)
+        except OSError:
+            pass
+    # 在 chown 之后设置，chown 会清除 setuid/setgid 位
+    os.chmod(tmp_path, stat.st_mode & 0o7777)
+
+
+def _commit(tmp_path: str, path: str, exclusive: bool):
+    """把已写完并 fsync 的临时文件放到目标位置；exclusive 时目标已存在则抛出 FileExistsError"""
+    if exclusive:
+        try:
+            # 硬链接在目标已存在时失败，实现"不存在才创建"的原子操作
+            os.link(tmp_path, path)
+        except FileExistsError:
+            raise
+        except OSError:
+            # 文件系统不支持硬链接（如 FAT）时退化为检查后重命名，仍在路径锁内
+            if os.path.lexists(path):
+                raise FileExistsError(path)
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+    else:
+        _copy_owner(tmp_path, path)
+        os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+def write_atomic(path: str, data: bytes, exclusive: bool = False) -> int:
+    """
+    原子写入：写到同目录的临时文件并 fsync，再重命名为目标文件。
+    中途失败或崩溃时目标文件保持原样；exclusive 时目标已存在则抛出 FileExistsError。
+    覆盖符号链接时写入链接指向的文件。返回写入的字节数
+    """
+    path = _resolve(path, exclusive)
+    with path_lock(path):
+        fd, tmp_path = _temp_file(path)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            _commit(tmp_path, path, exclusive)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+    return len(data)
+
+
+def write_direct(path: str, data: bytes, append: bool = False, offset: int = -1) -> int:
+    """
+    直接写入（不经过临时文件），返回写入后的文件大小。
+    追加时 offset 不小于 0 则要求文件当前大小等于 offset，否则抛出 OffsetMismatchError，
+    用于断点续写：重复发送同一块不会写入两次
+    """
+    # 与 write_atomic 一样写入符号链接指向的文件
+    path = _resolve(path, False)
+    flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+    flags |= os.O_APPEND if append else os.O_TRUNC
+    with path_lock(path):
+        fd = _open_parent(path, lambda: os.open(path, flags, 0o666))
+        try:
+            if append and offset >= 0:
+                size = os.fstat(fd).st_size
+                if size != offset:
+                    raise OffsetMismatchError(f"偏移不一致：文件当前大小为 {size}，请求的偏移为 {offset}", size)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            return os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+
+
+# ========== 分块上传 ==========
+
+class Upload:
+    """一次分块上传：内容先写到临时文件，完成时原子替换目标文件"""
+
+    def __init__(self, path: str, total_size: int, exclusive: bool):
+        self.id = secrets.token_urlsafe(12)
+        self.path = _resolve(path, exclusive)
+        self.exclusive = exclusive
+        self.received = 0
+        self.lock = threading.Lock()
+        self.expires = time.monotonic() + UPLOAD_TTL
+        fd, self.tmp_path = _temp_file(self.path)
+        _preallocate(fd, total_size)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, offset: int, data: bytes) -> int:
+        """在 offset 处写入一块，返回已接收的字节数；offset 与已接收的大小不一致时抛出 OffsetMismatchError"""
+        with self.lock:
+            if offset != self.received:
+                raise OffsetMismatchError(f"偏移不一致：已接收 {self.received} 字节，请求的偏移为 {offset}",
+                                          self.received)
+            self.file.write(data)
+            self.received += len(data)
+            self.expires = time.monotonic() + UPLOAD_TTL
+            return self.received
+
+    def finish(self) -> int:
+        """截掉预分配多出的部分，fsync 后放到目标位置，返回文件大小"""
+        with self.lock:
+            self.file.truncate(self.received)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            with path_lock(self.path):
+                _commit(self.tmp_path, self.path, self.exclusive)
+            return self.received
+
+    def abort(self):
+        with self.lock:
+            self.file.close()
+            try:
+                os.remove(self.tmp_path)
+            except OSError:
+                pass
+
+
+_uploads = {}
+_uploads_lock = threading.Lock()
+
+
+def _expire_uploads():
+    """清理过期的上传（调用方持有 _uploads_lock）"""
+    now = time.monotonic()
+    for upload_id in [key for key, upload in _uploads.items() if upload.expires < now]:
+        _uploads.pop(upload_id).abort()
+
+
+def start_upload(path: str, total_size: int = 0, exclusive: bool = False) -> Upload:
+    """开始分块上传；total_size 大于 0 时预先分配空间"""
+    with _uploads_lock:
+        _expire_uploads()
+        if len(_uploads) >= MAX_UPLOADS:
+            raise ValueError("进行中的上传过多，请稍后再试")
+        upload = Upload(path, total_size, exclusive)
+        _uploads[upload.id] = upload
+    return upload
+
+
+def get_upload(upload_id: str) -> Upload | None:
+    with _uploads_lock:
+        _expire_uploads()
+        return _uploads.get(upload_id)
+
+
+def finish_upload(upload: Upload) -> int:
+    with _uploads_lock:
+        _uploads.pop(upload.id, None)
+    try:
+        return upload.finish()
+    except BaseException:
+        upload.abort()
+        raise
+
+
+def abort_upload(upload: Upload):
+    with _uploads_lock:
+        _uploads.pop(upload.id, None)
+    upload.abort()